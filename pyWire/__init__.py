@@ -19,22 +19,65 @@
         step 3: start sniffing and processing packets
             myCap.apply_on_packets(myCallback , args = myArguments)
         
+        Or pull the packets instead of using a callback:
+            for pkt in myCap.packets(packet_count = 100):
+                # do stuff here
+            pkt = myCap.next_packet()
+            myCap.close()  # stop sniffing before the capture ended
+        
+        Or poll the capture from an event loop (select), without blocking:
+            myCap.start_polling()
+            select.select([myCap , mySocket] , [] , [])
+            packets = myCap.poll_packets()  # list of the ready packets, None when the capture ended
+        
     Capture options:
         Live captures can have a capture filter in bpf format.
         only packets that match the bpf will be captured.
+        File captures can have a bpf filter as well, it is evaluated in python on the packets headers
+        (common primitives only - host, net, port, portrange, proto...), and only matching packets are dissected.
         
         Both live and File captures can have display filter (wireshark format)
         only packets the pass the display filter will be passed to the callback.
         
+        Captures can have layers - list of protocols (eg: ['ip' , 'tcp' , 'http']), so tshark outputs
+        only these layers of each packet, which is faster when the other layers are not needed.
+        
+        Captures can be filtered by predicates over fields and protocols - myCap.where(...), see
+        pyWire.capture.query. The predicates are passed to tshark as display filter when possible:
+            myCap.where(pyWire.Field('udp.port') == 53 , pyWire.Protocol('dns') , lambda pkt: ...)
+        
+        Captures can have decoder='json', so tshark outputs JSON instead of PDML, which is faster to parse
+        (requires tshark 2.2 or newer). The packets are compact, and their fields have no raw values.
+        
         apply_on_packets can receive optional arguments to limit the sniffer:
             timeout - limit amount of time to sniff (seconds).
             packet_count - limit number of packets to capture.
+            lazy - create the fields of each layer only when first accessed.
+            compact - keep packets in compact form, for keeping many packets in memory.
+            workers - (file captures) number of tshark processes to dissect the file in parallel.
+            pool - pyWire.CallbackPool, to run the callback in worker threads or processes.
+            fields - list of field names (eg: ['ip.src', 'dns.qry.name']), to get only these fields of each
+                     packet as a record (namedtuple) instead of a packet object - much faster.
+        
+        apply_on_batches passes the fields of many packets at once, as columns (NumPy arrays), for vectorized
+        processing: myCap.apply_on_batches(myBatchCallback , ['ip.src' , 'ip.len'] , batch_size = 10000)
+        
+        File captures can read only part of the file - start_time, end_time and frame_range.
+        an index of the file is saved next to it (<file>.pwidx), so the packets are found without reading the file.
         
     More stuff:
         pyWire.PcapFile
-            Create, Read and Write Pcap files.
+            Create, Read and Write Pcap files (pcap and pcapng formats).
             You can save packets from your capture in pcap files.
         
+        pyWire.PcapStats
+            Packets and bytes per second, size histogram and gaps of a pcap file,
+            computed from the packets headers only, without tshark (requires NumPy).
+        
+        pyWire.compile_path('dns.qry.name' , ...)
+            Compiled extractor of fields by their wireshark names, for fast access to many fields per packet.
+            path(pkt) is list of the values of all the occurrences (tuple of lists for several paths).
+        
         pyWire.LiveCapture.GetInterfaces()
             Return a list of local available interfaces.
             You can sniff on those interfaces, referencing them by their number.
@@ -49,10 +92,14 @@
 
 
 from pyWire.capture.fileformats.PcapFile import PcapFile
+from pyWire.capture.fileformats import PcapStats
 from pyWire.capture.live_capture import LiveCapture, GetSamplePackets
 from pyWire.capture.file_capture import FileCapture
 from pyWire.capture.callbacks import Callback
 from pyWire.capture.inmem_capture import InMemCapture, InMemFilterPackets
+from pyWire.capture.callback_pool import CallbackPool
+from pyWire.packet.field_path import compile_path
+from pyWire.capture.query import Field, Protocol
 
 ####
 # Not implemented Yet
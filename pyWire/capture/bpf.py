@@ -0,0 +1,401 @@
+'''
+Capture filters (BPF / tcpdump syntax) evaluated in python on the raw packets of a pcap file, so only the
+matching packets are fed to tshark (see FileCapture bpf_filter).
+
+The common primitives are supported:
+    [ip|ip6|arp] [src|dst] host ADDR        ipv4 or ipv6 address (names are not resolved)
+    [ip|ip6|arp] [src|dst] net ADDR/LEN     or net ADDR mask MASK for ipv4
+    ether [src|dst] host MAC
+    [tcp|udp|sctp] [src|dst] port PORT      number or service name
+    [tcp|udp|sctp] [src|dst] portrange FIRST-LAST
+    [ip|ip6] proto PROTO                    number or name (eg: ip proto \\tcp)
+    ip, ip6, arp, tcp, udp, sctp, icmp, icmp6
+    less LEN, greater LEN
+combined with and (&&), or (||), not (!) and parentheses. As in libpcap, not has the highest precedence, and
+and or have the same precedence, from left to right (a or b and c is (a or b) and c).
+A value after and\\or without qualifiers reuses the qualifiers of the previous primitive (eg: port 53 or 80).
+Other primitives (eg: vlan, mpls, byte offsets as tcp[13]) and host names raise BpfFilterError.
+Unlike libpcap, VLAN tags are skipped, so ip also matches ip in vlan, and the transport layer of ipv6 is found
+after its extension headers.
+'''
+import binascii
+import socket
+import struct
+
+from pyWire.capture.fileformats.PcapFile import PcapFile
+from pyWire.capture.fileformats.PcapIndex import FrameSelection
+from pyWire.capture.sharding import _GetNetworkLayer, LINKTYPE_ETHERNET, ETHERTYPE_IPV4, ETHERTYPE_IPV6, \
+    IPV6_EXTENSION_HEADERS, IPV6_FRAGMENT_HEADER
+
+ETHERTYPE_ARP = 0x0806
+
+# ip protocols by name
+IP_PROTOCOLS = {'icmp' : 1 , 'igmp' : 2 , 'tcp' : 6 , 'udp' : 17 , 'gre' : 47 , 'esp' : 50 , 'ah' : 51 ,
+                'icmp6' : 58 , 'sctp' : 132}
+_PORT_PROTOCOLS = ('tcp' , 'udp' , 'sctp')
+_ADDRESS_PROTOCOLS = ('ip' , 'ip6' , 'arp')
+_PROTOCOL_QUALIFIERS = ('ether' ,) + _ADDRESS_PROTOCOLS + tuple(IP_PROTOCOLS)
+_DIRECTIONS = ('src' , 'dst')
+_TYPES = ('host' , 'net' , 'port' , 'portrange' , 'proto')
+_OPERATORS = {'and' : 'and' , '&&' : 'and' , 'or' : 'or' , '||' : 'or' , 'not' : 'not' , '!' : 'not'}
+# primitives of libpcap which are not supported, so they are never taken as values of the previous primitive
+_UNSUPPORTED = ('vlan' , 'mpls' , 'pppoed' , 'pppoes' , 'geneve' , 'gateway' , 'broadcast' , 'multicast' , 'len' ,
+                'inbound' , 'outbound' , 'ifname' , 'on' , 'rnr' , 'rulenum' , 'reason' , 'rset' , 'srnr' ,
+                'subrulenum' , 'action' , 'wlan' , 'type' , 'subtype' , 'dir' , 'atalk' , 'decnet' , 'iso' ,
+                'stp' , 'ipx' , 'netbeui' , 'rarp' , 'fddi' , 'tr' , 'ppp' , 'slip' , 'link' , 'radio')
+
+# the filters use only the headers
+_HEADERS_BYTES = 256
+
+class BpfFilterError(ValueError):
+    pass
+
+class PacketHeaders(object):
+    '''
+    The headers of a raw packet which the filters check.
+        family      - 4 (ip), 6 (ip6), 'arp' or None
+        src, dst    - the addresses of the family (as int), None if not known
+        protocol    - ip protocol (of ipv6 - after its extension headers), None if not ip
+        sport, dport - ports of tcp, udp and sctp (None in fragments after the first one)
+        ethSrc, ethDst - ethernet addresses (raw bytes), None if not ethernet
+        length      - the original length of the packet
+    '''
+    __slots__ = ('family' , 'src' , 'dst' , 'protocol' , 'sport' , 'dport' , 'ethSrc' , 'ethDst' , 'length')
+
+    def __init__(self , data , linkType , length):
+        self.family = self.src = self.dst = self.protocol = self.sport = self.dport = None
+        self.ethSrc = self.ethDst = None
+        self.length = length
+        if linkType == LINKTYPE_ETHERNET and len(data) >= 14:
+            self.ethDst , self.ethSrc = data[0:6] , data[6:12]
+        etherType , offset = _GetNetworkLayer(data , linkType)
+        if etherType == ETHERTYPE_IPV4:
+            if len(data) < offset + 20:
+                return
+            versionAndLength , flagsAndOffset , protocol = struct.unpack_from('>B5xH1xB' , data , offset)
+            self.family = 4
+            self.src , self.dst = struct.unpack_from('>II' , data , offset + 12)
+            self.protocol = protocol
+            firstFragment = (flagsAndOffset & 0x1fff) == 0
+            transportOffset = offset + (versionAndLength & 0xf) * 4
+        elif etherType == ETHERTYPE_IPV6:
+            if len(data) < offset + 40:
+                return
+            protocol = struct.unpack_from('>B' , data , offset + 6)[0]
+            self.family = 6
+            self.src = _BytesToInt(data[offset + 8:offset + 24])
+            self.dst = _BytesToInt(data[offset + 24:offset + 40])
+            transportOffset = offset + 40
+            firstFragment = True
+            while protocol in IPV6_EXTENSION_HEADERS + (IPV6_FRAGMENT_HEADER ,) and \
+                    len(data) >= transportOffset + 8:
+                if protocol == IPV6_FRAGMENT_HEADER:
+                    firstFragment = (struct.unpack_from('>H' , data , transportOffset + 2)[0] & 0xfff8) == 0
+                    protocol = struct.unpack_from('>B' , data , transportOffset)[0]
+                    transportOffset += 8
+                else:
+                    protocol , length = struct.unpack_from('>BB' , data , transportOffset)
+                    transportOffset += (length + 1) * 8
+            self.protocol = protocol
+        elif etherType == ETHERTYPE_ARP:
+            # ethernet and ipv4 arp - the sender and target protocol addresses
+            if len(data) < offset + 28:
+                return
+            self.family = 'arp'
+            self.src = struct.unpack_from('>I' , data , offset + 14)[0]
+            self.dst = struct.unpack_from('>I' , data , offset + 24)[0]
+            return
+        else:
+            return
+        if firstFragment and self.protocol in (6 , 17 , 132) and len(data) >= transportOffset + 4:
+            self.sport , self.dport = struct.unpack_from('>HH' , data , transportOffset)
+
+class BpfFilter(object):
+    '''
+    A compiled capture filter, see the module documentation for the supported syntax.
+    Raise BpfFilterError if the filter is not valid or not supported.
+    '''
+    def __init__(self , expression):
+        self.expression = expression
+        self._tokens = _Tokenize(expression)
+        self._position = 0
+        self._lastQualifiers = None
+        if not self._tokens:
+            self._match = lambda headers: True
+            return
+        self._match = self._ParseExpression()
+        if self._position != len(self._tokens):
+            self._Error('unexpected %s' % self._tokens[self._position])
+
+    def Match(self , data , linkType , length = None):
+        '''
+        return whether a raw packet (its bytes from the link layer) matches the filter.
+        length - the original length of the packet (default is the length of data).
+        '''
+        if length is None:
+            length = len(data)
+        return self._match(PacketHeaders(data[:_HEADERS_BYTES] , linkType , length))
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__ , self.expression)
+
+    # parsing, each method returns a function of PacketHeaders
+
+    def _Error(self , message):
+        raise BpfFilterError('Unsupported capture filter "%s": %s' % (self.expression , message))
+
+    def _Peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return None
+
+    def _Next(self):
+        token = self._Peek()
+        if token is None:
+            self._Error('unexpected end')
+        self._position += 1
+        return token
+
+    def _ParseExpression(self):
+        # and and or have the same precedence, from left to right
+        match = self._ParseNot()
+        while _OPERATORS.get(self._Peek()) in ('and' , 'or'):
+            operator = _OPERATORS[self._Next()]
+            left , right = match , self._ParseNot()
+            if operator == 'and':
+                match = lambda headers , left = left , right = right: left(headers) and right(headers)
+            else:
+                match = lambda headers , left = left , right = right: left(headers) or right(headers)
+        return match
+
+    def _ParseNot(self):
+        token = self._Peek()
+        if _OPERATORS.get(token) == 'not':
+            self._Next()
+            match = self._ParseNot()
+            return lambda headers: not match(headers)
+        if token == '(':
+            self._Next()
+            match = self._ParseExpression()
+            if self._Next() != ')':
+                self._Error('missing )')
+            return match
+        return self._ParsePrimitive()
+
+    def _ParsePrimitive(self):
+        token = self._Next()
+        if token in _UNSUPPORTED or '[' in token:
+            self._Error('%s is not supported' % token)
+        if token in ('less' , 'greater'):
+            length = _ParseInt(self._Next() , self)
+            if token == 'less':
+                return lambda headers: headers.length <= length
+            return lambda headers: headers.length >= length
+        proto = direction = primitiveType = None
+        if token in _PROTOCOL_QUALIFIERS:
+            proto , token = token , self._Peek()
+            if token in _DIRECTIONS or token in _TYPES:
+                self._Next()
+            elif proto != 'ether':
+                return _MakeProtocolMatch(proto)
+        if token in _DIRECTIONS:
+            direction , token = token , self._Peek()
+            if token in _TYPES:
+                self._Next()
+            else:
+                token = 'host'
+        if token in _TYPES:
+            primitiveType = token
+        elif proto is None:
+            # a value which reuses the qualifiers of the previous primitive
+            if self._lastQualifiers is None:
+                self._Error('unknown %s' % token)
+            proto , direction , primitiveType = self._lastQualifiers
+            return self._MakePrimitive(proto , direction , primitiveType , token)
+        else:
+            self._Error('unknown %s' % token)
+        self._lastQualifiers = (proto , direction , primitiveType)
+        value = self._Next()
+        if primitiveType == 'net' and self._Peek() == 'mask':
+            self._Next()
+            return self._MakeNetMatch(proto , direction , primitiveType , value , self._Next())
+        return self._MakePrimitive(proto , direction , primitiveType , value)
+
+    def _MakePrimitive(self , proto , direction , primitiveType , value):
+        if primitiveType == 'host' and proto == 'ether':
+            address = _ParseMac(value , self)
+            return _MakeAddressMatch(direction , lambda headers: (headers.ethSrc , headers.ethDst) ,
+                                     lambda address_: address_ == address)
+        if primitiveType in ('host' , 'net'):
+            if proto not in (None ,) + _ADDRESS_PROTOCOLS:
+                self._Error('%s %s' % (proto , primitiveType))
+            return self._MakeNetMatch(proto , direction , primitiveType , value)
+        if primitiveType in ('port' , 'portrange'):
+            if proto not in (None ,) + _PORT_PROTOCOLS:
+                self._Error('%s %s' % (proto , primitiveType))
+            if primitiveType == 'port':
+                first = last = _ParsePort(value , self)
+            else:
+                if value.count('-') != 1:
+                    self._Error('port range %s' % value)
+                first , last = [_ParsePort(port , self) for port in value.split('-')]
+                if first > last:
+                    self._Error('port range %s' % value)
+            protocols = (IP_PROTOCOLS[proto] ,) if proto else (6 , 17 , 132)
+            portMatch = _MakeAddressMatch(direction , lambda headers: (headers.sport , headers.dport) ,
+                                          lambda port: port is not None and first <= port <= last)
+            return lambda headers: headers.protocol in protocols and portMatch(headers)
+        if primitiveType == 'proto':
+            if proto not in (None , 'ip' , 'ip6'):
+                self._Error('%s proto' % proto)
+            value = value.lstrip('\\')
+            protocol = IP_PROTOCOLS.get(value)
+            if protocol is None:
+                protocol = _ParseInt(value , self)
+            families = {None : (4 , 6) , 'ip' : (4 ,) , 'ip6' : (6 ,)}[proto]
+            return lambda headers: headers.family in families and headers.protocol == protocol
+        self._Error(primitiveType)
+
+    def _MakeNetMatch(self , proto , direction , primitiveType , value , mask = None):
+        address , prefix = value , None
+        if mask is not None:
+            if ':' in value or '/' in value:
+                self._Error('net %s mask %s' % (value , mask))
+            try:
+                mask , maskText = struct.unpack('>I' , socket.inet_aton(mask))[0] , mask
+            except socket.error:
+                self._Error('mask %s' % mask)
+            if len(maskText.split('.')) != 4:
+                self._Error('mask %s' % maskText)
+            # the address is given in full
+            prefix = 32
+        elif primitiveType == 'net' and '/' in value:
+            address , prefix = value.split('/' , 1)
+            prefix = _ParseInt(prefix , self)
+        if ':' in address:
+            family , bits = 6 , 128
+            try:
+                address = _BytesToInt(socket.inet_pton(socket.AF_INET6 , address))
+            except (socket.error , ValueError):
+                self._Error('address %s' % value)
+        else:
+            family , bits = 4 , 32
+            parts = address.split('.')
+            if primitiveType == 'net' and prefix is None:
+                # net 10.1 is 10.1.0.0/16
+                prefix = 8 * len(parts)
+                parts += ['0'] * (4 - len(parts))
+            try:
+                address = struct.unpack('>I' , socket.inet_aton('.'.join(parts)))[0]
+            except socket.error:
+                self._Error('address %s (host names are not supported)' % value)
+            if len(parts) != 4:
+                self._Error('address %s' % value)
+        if mask is None:
+            if prefix is None:
+                prefix = bits
+            if not 0 <= prefix <= bits:
+                self._Error('prefix of %s' % value)
+            mask = ((1 << bits) - 1) ^ ((1 << (bits - prefix)) - 1)
+        network = address & mask
+        if family == 4:
+            families = {None : (4 , 'arp') , 'ip' : (4 ,) , 'arp' : ('arp' ,)}.get(proto)
+        else:
+            families = {None : (6 ,) , 'ip6' : (6 ,)}.get(proto)
+        if families is None:
+            self._Error('%s %s %s' % (proto , primitiveType , value))
+        addressMatch = _MakeAddressMatch(direction , lambda headers: (headers.src , headers.dst) ,
+                                         lambda address_: address_ & mask == network)
+        return lambda headers: headers.family in families and addressMatch(headers)
+
+def _MakeAddressMatch(direction , getAddresses , matchAddress):
+    '''
+    return function of headers, which matches the source, destination or either address\\port of the packet.
+    '''
+    if direction == 'src':
+        return lambda headers: _MatchNotNone(matchAddress , getAddresses(headers)[0])
+    if direction == 'dst':
+        return lambda headers: _MatchNotNone(matchAddress , getAddresses(headers)[1])
+    def MatchEither(headers):
+        source , destination = getAddresses(headers)
+        return _MatchNotNone(matchAddress , source) or _MatchNotNone(matchAddress , destination)
+    return MatchEither
+
+def _MatchNotNone(matchAddress , address):
+    return address is not None and matchAddress(address)
+
+def _MakeProtocolMatch(proto):
+    if proto == 'ip':
+        return lambda headers: headers.family == 4
+    if proto == 'ip6':
+        return lambda headers: headers.family == 6
+    if proto == 'arp':
+        return lambda headers: headers.family == 'arp'
+    protocol = IP_PROTOCOLS[proto]
+    return lambda headers: headers.protocol == protocol
+
+def _Tokenize(expression):
+    for char in '()':
+        expression = expression.replace(char , ' %s ' % char)
+    tokens = []
+    for token in expression.split():
+        # ! may be attached to the next token
+        while token.startswith('!') and token != '!':
+            tokens.append('!')
+            token = token[1:]
+        tokens.append(token.lower())
+    return tokens
+
+def _ParseInt(value , bpfFilter):
+    try:
+        return int(value , 0)
+    except ValueError:
+        bpfFilter._Error('number %s' % value)
+
+def _ParsePort(value , bpfFilter):
+    if value.isdigit():
+        return int(value)
+    try:
+        return socket.getservbyname(value)
+    except socket.error:
+        bpfFilter._Error('port %s' % value)
+
+def _ParseMac(value , bpfFilter):
+    parts = value.replace('-' , ':').split(':')
+    if len(parts) != 6:
+        bpfFilter._Error('ethernet address %s' % value)
+    try:
+        return struct.pack('>6B' , *[int(part , 16) for part in parts])
+    except (ValueError , struct.error):
+        bpfFilter._Error('ethernet address %s' % value)
+
+def _BytesToInt(data):
+    return int(binascii.hexlify(data) , 16)
+
+def FilterFrames(pcapPath , selection , bpfFilter):
+    '''
+    return FrameSelection of the selected frames of a pcap file which match the given BpfFilter.
+    Supports only pcap files, raise ValueError for pcapng files.
+    '''
+    with open(pcapPath , 'rb') as pcapHandle:
+        if pcapHandle.read(4) == PcapFile.PCAPNG_SHB_MAGIC:
+            raise ValueError('bpf_filter supports only pcap files, %s is pcapng' % pcapPath)
+    filtered = FrameSelection()
+    selectedFrames = selection.IterateFrames()
+    nextSelected = next(selectedFrames , None)
+    pcapFile = PcapFile(pcapPath)
+    frameNumber = 0
+    linkType = None
+    match = bpfFilter._match
+    for data , tsSec , tsUsec , lenData , origLenData , offset in pcapFile.ReadPacketsMapped():
+        frameNumber += 1
+        if nextSelected is None:
+            break
+        if frameNumber < nextSelected:
+            continue
+        if linkType is None:
+            linkType = pcapFile.GetLinkType()
+        if match(PacketHeaders(data[:_HEADERS_BYTES] , linkType , origLenData)):
+            filtered.Append(frameNumber)
+        nextSelected = next(selectedFrames , None)
+    return filtered
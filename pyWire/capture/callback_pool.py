@@ -0,0 +1,175 @@
+import multiprocessing
+import threading
+import traceback
+import Queue
+
+from pyWire.capture.capture import GetFromQueue
+
+class CallbackPoolError(Exception):
+    pass
+
+# sequence number of the output which holds the state of a worker
+_STATE = -1
+
+class CallbackPool(object):
+    '''
+    Run the callback of apply_on_packets in worker threads or processes, instead of the thread which
+    reads tshark output - so a heavy callback does not stall tshark, and CPU bound callbacks can use
+    more than one core (with processes).
+
+    Usage:
+        def MyCallback(pkt , state):
+            state[pkt.highest_layer] = state.get(pkt.highest_layer , 0) + 1
+
+        pool = CallbackPool(workers = 8 , processes = True , init_state = lambda args: {} , reduce_state = MergeCounts)
+        cap.apply_on_packets(MyCallback , pool = pool)
+        print pool.result
+    '''
+    def __init__(self , workers = 4 , processes = False , ordered = True , max_in_flight = 1000 ,
+                 init_state = None , reduce_state = None , result_callback = None):
+        '''
+        workers - number of worker threads or processes.
+        processes - use processes instead of threads. The packets are sent to the workers in compact form
+            (apply_on_packets uses compact=True). With processes, the states and the callback results must be
+            picklable, and on Windows the callback and init_state as well (module level functions).
+        ordered - pass the results to result_callback in the order of the packets, otherwise as soon as ready.
+        max_in_flight - max packets which were passed to the workers and not finished yet. When reached,
+            reading tshark output waits for the workers.
+        init_state - called once by each worker as init_state(args), the returned state is passed to the
+            callback instead of args.
+        reduce_state - called at the end as reduce_state(list of the states of all the workers),
+            the returned value is kept in pool.result.
+        result_callback - called in the capture thread with the returned value of every callback (except None).
+        '''
+        self.workers = workers
+        self.processes = processes
+        self.ordered = ordered
+        self.max_in_flight = max_in_flight
+        self.init_state = init_state
+        self.reduce_state = reduce_state
+        self.result_callback = result_callback
+        self.states = None
+        self.result = None
+        self._workers = []
+
+    def Start(self , packet_callback , args):
+        '''
+        start the workers, return a function to use as the packets callback (called with (packet , args)).
+        '''
+        if self.processes:
+            self._inQueue = multiprocessing.Queue()
+            self._outQueue = multiprocessing.Queue()
+            workerClass = multiprocessing.Process
+        else:
+            self._inQueue = Queue.Queue()
+            self._outQueue = Queue.Queue()
+            workerClass = threading.Thread
+        self._submitted = 0
+        self._completed = 0
+        self._nextSequence = 0
+        self._pendingResults = {}
+        self.states = []
+        self.result = None
+
+        workerArgs = (self._inQueue , self._outQueue , packet_callback , args , self.init_state)
+        self._workers = [workerClass(target = _WorkerLoop , args = workerArgs) for i in xrange(self.workers)]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+        return self._Submit
+
+    def Finish(self):
+        '''
+        wait for all the packets to be finished, stop the workers and reduce their states.
+        '''
+        while self._completed < self._submitted:
+            self._HandleOutput(self._GetOutput())
+        for worker in self._workers:
+            self._inQueue.put(None)
+        while len(self.states) < len(self._workers):
+            self._HandleOutput(self._GetOutput())
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        if self.reduce_state is not None:
+            self.result = self.reduce_state(self.states)
+
+    def Close(self):
+        '''
+        stop the workers without waiting for the packets (after an error).
+        '''
+        for worker in self._workers:
+            if self.processes:
+                worker.terminate()
+            else:
+                self._inQueue.put(None)
+        self._workers = []
+
+    def _Submit(self , packet , args = None):
+        while self._submitted - self._completed >= self.max_in_flight:
+            self._HandleOutput(self._GetOutput())
+        self._inQueue.put((self._submitted , packet))
+        self._submitted += 1
+        # handle the results which are ready, without waiting
+        while True:
+            try:
+                output = self._outQueue.get(False)
+            except Queue.Empty:
+                return
+            self._HandleOutput(output)
+
+    def _GetOutput(self):
+        output = GetFromQueue(self._outQueue)
+        while output is None:
+            if self.processes and not all(worker.is_alive() for worker in self._workers):
+                raise CallbackPoolError('Callback worker process exited unexpectedly')
+            output = GetFromQueue(self._outQueue)
+        return output
+
+    def _HandleOutput(self , output):
+        sequence , result , error = output
+        if error is not None:
+            raise CallbackPoolError('Callback failed in worker:\n' + error)
+        if sequence == _STATE:
+            self.states.append(result)
+            return
+        self._completed += 1
+        if not self.ordered:
+            self._PassResult(result)
+            return
+        self._pendingResults[sequence] = result
+        while self._nextSequence in self._pendingResults:
+            self._PassResult(self._pendingResults.pop(self._nextSequence))
+            self._nextSequence += 1
+
+    def _PassResult(self , result):
+        if result is not None and self.result_callback is not None:
+            self.result_callback(result)
+
+    def __repr__(self):
+        return '<%s %d %s>' % (self.__class__.__name__, self.workers, 'processes' if self.processes else 'threads')
+
+def _WorkerLoop(inQueue , outQueue , packet_callback , args , init_state):
+    '''
+    The loop of a worker thread or process. Output tuples are (sequence , result , error).
+    '''
+    state = args
+    initError = None
+    if init_state is not None:
+        try:
+            state = init_state(args)
+        except Exception:
+            initError = traceback.format_exc()
+
+    item = inQueue.get()
+    while item is not None:
+        sequence , packet = item
+        if initError is not None:
+            outQueue.put((sequence , None , initError))
+        else:
+            try:
+                outQueue.put((sequence , packet_callback(packet , state) , None))
+            except Exception:
+                outQueue.put((sequence , None , traceback.format_exc()))
+        item = inQueue.get()
+    outQueue.put((_STATE , state , None))
@@ -1,9 +1,16 @@
 # most of the code here is from pyshark\Capture\capture.py
+import errno
+import os
 import subprocess
+import Queue
+from threading import Thread
 
 from pyWire.tshark.tshark import get_tshark_path, get_tshark_version
-from pyWire.tshark.tshark_xml import packet_from_xml_packet
-from pyWire.tshark.tshark_report import parse_tshark_fields
+from pyWire.tshark.decoders import get_decoder
+from pyWire.tshark.tshark_fields import FieldsStreamParser, get_fields_parameters
+from pyWire.tshark.tshark_report import get_tshark_fields_type
+from pyWire.capture.columns import ColumnsBatcher
+from pyWire.capture.query import And, MakePredicate
 # for getting version of tshark
 from distutils.version import LooseVersion
 
@@ -11,16 +18,31 @@ class Capture(object):
     """
     Base class for packet captures.
     """
-    DEFAULT_BATCH_SIZE = 4096
+    DEFAULT_BATCH_SIZE = 1024 * 1024
+    DEFAULT_COLUMNS_BATCH_SIZE = 10000
     SUPPORTED_ENCRYPTION_STANDARDS = ['wep', 'wpa-pwk', 'wpa-psk']
     
-    def __init__(self, display_filter=None, decryption_key=None, encryption_type='wpa-pwd'):
+    def __init__(self, display_filter=None, decryption_key=None, encryption_type='wpa-pwd', layers=None,
+                 decoder=None):
         '''
         initialize the capture object.
+        layers - protocols which tshark outputs (see get_parameters), None for all. Requires tshark 2.2 or newer,
+        and can not be used with fields (ValueError is raised when tshark is started).
+        decoder - decoder of the tshark output, name ('pdml' or 'json') or object (see pyWire.tshark.decoders).
         '''
         self.display_filter = display_filter
+        self.layers = layers
+        self.decoder = get_decoder(decoder)
         self.running_processes = set()
         self.fields_type = None
+        self.lazy = False
+        self.compact = False
+        self.fields = None
+        self._packets_iterator = None
+        self._poller = None
+        self.where_predicate = None
+        self._where_filter = None
+        self._where_remainder = None
 
         if encryption_type and encryption_type.lower() in self.SUPPORTED_ENCRYPTION_STANDARDS:
             self.encryption = (decryption_key, encryption_type.lower())
@@ -28,7 +50,8 @@ class Capture(object):
             raise UnknownEncyptionStandardException("Only the following standards are supported: %s."
                                                     % ', '.join(self.SUPPORTED_ENCRYPTION_STANDARDS))
         
-    def apply_on_packets(self, packet_callback, timeout=None , packet_count = None ,args = None, parse_types=False):
+    def apply_on_packets(self, packet_callback, timeout=None , packet_count = None ,args = None, parse_types=False,
+                         lazy=False, compact=False, pool=None, fields=None):
         """
         Runs through all packets and calls the given callback (a function) with each one as it is read.
         If the capture is infinite (i.e. a live capture), it will run forever, otherwise it will complete after all
@@ -40,27 +63,208 @@ class Capture(object):
         capture.apply_on_packets(print_callback)
 
         If a timeout is given, raises a Timeout error if not complete before the timeout (in seconds)
+
+        If lazy is True, the fields of each layer are created only when they are first accessed (or iterated, or
+        printed). Much faster for callbacks which access only a few fields of each packet.
+
+        If compact is True, the layers and fields of each packet are kept in flat arrays (see pyWire.packet.compact),
+        which use a fraction of the memory. Recommended when keeping many packets (eg: Callback.CB_AddPacketToList).
+
+        If pool is given (see pyWire.capture.callback_pool.CallbackPool), the callback is run by its worker
+        threads or processes, and apply_on_packets returns after all the packets were handled.
+
+        If fields is given (list of field names, eg: ['ip.src', 'dns.qry.name']), tshark prints only these fields
+        instead of PDML, and the callback gets a record of each packet instead of a packet object - a namedtuple of
+        frame_number, timestamp and the fields, with '_' instead of '.' (eg: record.ip_src). A field which is
+        missing in the packet is None, and a field with several occurrences is a list of values.
+        With parse_types the values are converted by the field type, otherwise they are strings.
+        Much faster than dissecting whole packets. The raw bytes are not kept.
+        """
+        # packets are sent to worker processes in compact form, which is picklable
+        compact = compact or (pool is not None and pool.processes)
+        packets = self._generate_packets(timeout, packet_count, parse_types, lazy, compact, fields)
+        try:
+            self._deliver_packets(packets, packet_callback, args, pool)
+        finally:
+            # stops tshark when the callback raised
+            packets.close()
+
+    def packets(self, timeout=None, packet_count=None, parse_types=False, lazy=False, compact=False, fields=None):
+        """
+        Returns a generator of the packets, for pulling them instead of passing a callback (see apply_on_packets for
+        the options).
+
+        Example usage:
+        for pkt in capture.packets(packet_count=100):
+            print pkt
+
+        tshark runs only while the generator is consumed - packets are dissected in batches of the data available
+        from tshark, and tshark blocks when the reader is slower. tshark (and dumpcap) are stopped when the
+        generator ends, is closed, or is garbage collected, or by capture.close().
+        The generator is also the one which next_packet continues.
+        """
+        self.close()
+        self._packets_iterator = self._generate_packets(timeout, packet_count, parse_types, lazy, compact, fields)
+        return self._packets_iterator
+
+    def next_packet(self):
+        """
+        Returns the next packet of the generator of the last packets() call (one with the default options is
+        started if needed), or None when the capture ended.
+        """
+        if self._packets_iterator is None:
+            self.packets()
+        return next(self._packets_iterator, None)
+
+    def start_polling(self, timeout=None, packet_count=None, parse_types=False, lazy=False, compact=False,
+                      fields=None):
         """
+        Starts the capture without reading it, for event loops which wait on many captures and sockets at once
+        (see apply_on_packets for the options). The capture has fileno(), so it can be passed to select, and
+        poll_packets() reads the packets which are ready without blocking.
+
+        Example usage:
+        capture.start_polling()
+        while True:
+            readable, writable, errors = select.select([capture, server_socket], [], [])
+            if capture in readable:
+                packets = capture.poll_packets()
+                if packets is None:
+                    break
+                ...
+
+        tshark reads from a single packets source (parallel interfaces and file workers are not used).
+        Not supported on Windows, where pipes can not be polled.
+        """
+        self.close()
         self._timeout = timeout
         self._packet_count = packet_count
-        self._packetsSource = self.GetPacketsSource()
-        
-        self._packetsSource.StartPacketsSource()
-        tshark_process = self._get_tshark_process()
+        self._SetPacketOptions(lazy, compact, fields)
+        if parse_types:
+            self.fields_type = get_tshark_fields_type()
+        self.packets_captured = 0
+        self._poller = TSharkPoller(self)
+
+    def fileno(self):
+        """
+        Returns the descriptor which is readable when poll_packets has something to return (see start_polling).
+        """
+        return self._poller.fileno()
+
+    def poll_packets(self):
+        """
+        Returns list of the packets which are ready (may be empty), without blocking, or None when the capture
+        ended - then the capture is closed (see start_polling).
+        """
+        if self._poller is None:
+            return None
+        if self._packet_count and self.packets_captured >= self._packet_count:
+            self.close()
+            return None
+        packets = self._poller.ReadPackets()
+        if packets is None:
+            self.close()
+            return None
+        if self._where_remainder is not None:
+            packets = [packet for packet in packets if self._where_remainder.Match(packet)]
+        self.packets_captured += len(packets)
+        if self._packet_count and self.packets_captured >= self._packet_count:
+            packets = packets[:len(packets) - (self.packets_captured - self._packet_count)]
+            self.packets_captured = self._packet_count
+            # the descriptor becomes readable, so the caller polls again and gets None
+            self._poller.Interrupt()
+        return packets
+
+    def close(self):
+        """
+        Stops the generator of the last packets() call, or the polling, and their tshark and dumpcap processes.
+        """
+        if self._packets_iterator is not None:
+            self._packets_iterator.close()
+            self._packets_iterator = None
+        if self._poller is not None:
+            self._poller.Stop()
+            self._poller = None
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _generate_packets(self, timeout, packet_count, parse_types, lazy, compact, fields):
+        """
+        A generator of up to packet_count packets of the capture, with the given options.
+        """
+        self._timeout = timeout
+        self._packet_count = packet_count
+        self._SetPacketOptions(lazy, compact, fields)
         if parse_types:
-            self.fields_type = parse_tshark_fields()
-        
+            self.fields_type = get_tshark_fields_type()
+
+        packets = self._iterate_packets()
+        remainder = self._where_remainder
+        try:
+            self.packets_captured = 0
+            for packet in packets:
+                if remainder is not None and not remainder.Match(packet):
+                    continue
+                self.packets_captured += 1
+                yield packet
+
+                if packet_count and self.packets_captured >= packet_count:
+                    break
+        finally:
+            packets.close()
+
+    def _iterate_packets(self):
+        """
+        A generator of the packets of the capture, which stops all the processes it started when it is closed.
+        Captures which dissect the packets otherwise override it.
+        """
+        self._packetsSource = self.GetPacketsSource()
+        self._packetsSource.StartPacketsSource()
         try:
-            self._go_through_packets_from_fd(tshark_process.stdout, packet_callback, args,
-                                                        packet_count=packet_count)
+            tshark_process = self._get_tshark_process()
         except:
+            self._packetsSource.ClosePacketsSource()
             raise
+
+        try:
+            for packet in self._get_packet_with_raw_from_stream(tshark_process.stdout):
+                yield packet
         finally:
             self._cleanup_subprocess(tshark_process)
+            self.running_processes.discard(tshark_process)
             print tshark_process.stderr.read()
             self._packetsSource.ClosePacketsSource()
-            
+
+    def apply_on_batches(self, batch_callback, fields, batch_size=DEFAULT_COLUMNS_BATCH_SIZE, timeout=None,
+                         packet_count=None, args=None, parse_types=True, use_numpy=True, **options):
+        """
+        Like apply_on_packets with fields, but the callback is called with batches of batch_size packets as columns
+        (the last batch may be smaller) - a namedtuple of frame_number, timestamp and the fields (named as in the
+        records), where each one is an array of the values of all the packets in the batch.
+
+        Example usage:
+        def count_dns_callback(batch, args):
+            args['dns'] += numpy.count_nonzero(batch.udp_dstport == 53)
+        capture.apply_on_batches(count_dns_callback, ['udp.dstport'], args=counts)
+
+        The columns are NumPy arrays (array.array or list without NumPy, or if use_numpy is False), typed by the
+        values: integers are int64, booleans are bool, numbers with missing values are float64 with NaN, and
+        anything else (strings, lists of several occurrences) is an array of objects. A field which occurs more
+        than once in a packet (eg: udp.port, which is both ports) is a list in that packet, so its column is an
+        array of objects.
+        The type is decided for each batch by its values, so the column of the same field may be int64 in one
+        batch, float64 in a batch with missing values, and objects in a batch with several occurrences.
+        options are passed to apply_on_packets (eg: workers of FileCapture).
+        """
+        batcher = ColumnsBatcher(fields, batch_size, batch_callback, args, use_numpy)
+        self.apply_on_packets(batcher.AddRecord, timeout=timeout, packet_count=packet_count,
+                              parse_types=parse_types, fields=fields, **options)
+        batcher.Flush()
+
     def GetPacketsSource(self):
         '''
         This function should return PacketsSource object, which should implement:
@@ -71,67 +275,139 @@ class Capture(object):
         '''
         raise NotImplementedError()
                     
-    def _go_through_packets_from_fd(self, fd, packet_callback, args = None , packet_count=None):
+    def where(self, *predicates):
         """
-        A coroutine which goes through a stream and calls a given callback for each XML packet seen in it.
+        Passes only the packets which match all the given predicates (see pyWire.capture.query) - Predicate objects,
+        display filter strings or python functions of the packet. Returns the capture, so calls can be chained.
+
+        The predicates which can be written as a display filter are added to the display filter of tshark,
+        the rest are evaluated on the packets, which are then created in lazy mode (unless compact), so only the
+        fields which the predicates access are created.
+        Example:
+            cap.where(Field('udp.port') == 53, lambda pkt: len(pkt.GetLayers('ip')) > 1)
         """
-        self.packets_captured = 0
-        data = ''
-        for packet, data in self._get_packet_from_stream(fd, data):
-            if packet:
-                self.packets_captured += 1
-                packetNum = int(packet.geninfo.num.val_)
-                packet.hasRaw = True
-                packet.raw = self._packetsSource.GetNextRawPacket(packetNum)
-                packet_callback(packet , args)
+        predicate = self.where_predicate
+        for new_predicate in predicates:
+            new_predicate = MakePredicate(new_predicate)
+            predicate = new_predicate if predicate is None else And(predicate, new_predicate)
+        display_filter, remainder = predicate.Split() if predicate is not None else (None, None)
+        if remainder is not None and not remainder.CanMatch():
+            raise ValueError('Display filter strings can only be combined with and: %r' % remainder)
+        self.where_predicate = predicate
+        self._where_filter = display_filter
+        self._where_remainder = remainder
+        return self
 
-            if packet_count and self.packets_captured >= packet_count:
-                break
+    def _get_display_filter(self):
+        """
+        Returns the display filter of tshark - the display filter of the capture, and of its where predicates.
+        """
+        if not self._where_filter:
+            return self.display_filter
+        if not self.display_filter:
+            return self._where_filter
+        return '(%s) && (%s)' % (self.display_filter, self._where_filter)
+
+    def _get_stop_count(self):
+        """
+        Returns the number of packets after which tshark (or dumpcap) stops, None to not stop them.
+        When where predicates are evaluated on the packets, packet_count is only counted by _generate_packets
+        and poll_packets, since the packets after the first packet_count may pass the predicates.
+        """
+        if self._where_remainder is not None:
+            return None
+        return self._packet_count
+
+    def _SetPacketOptions(self, lazy, compact, fields=None):
+        if fields and self._where_remainder is not None:
+            raise ValueError('The where predicates %r can not be evaluated on fields records' % self._where_remainder)
+        # the remaining where predicates access only some fields of every packet
+        self.lazy = lazy or (self._where_remainder is not None and not compact)
+        self.compact = compact
+        self.fields = tuple(fields) if fields else None
+
+    def _get_packet_with_raw_from_stream(self, stream):
+        for packet in self._get_packet_from_stream(stream):
+            yield self._set_packet_source(packet)
+
+    def _set_packet_source(self, packet):
+        """
+        Sets the frame number of the packet in the packets source, and its raw bytes. Returns the packet.
+        """
+        # tshark numbers the frames it was fed, which may be only part of the source
+        packetNum = self._packetsSource.GetFrameNumber(packet.frame_number)
+        if self.fields:
+            # records are immutable, and have no raw bytes
+            if packetNum != packet.frame_number:
+                packet = packet._replace(frame_number=packetNum)
+            self._packetsSource.ReleaseRawPackets(packetNum)
+            return packet
+        packet.frame_number = packetNum
+        packet.hasRaw = True
+        packet.raw = self._packetsSource.GetNextRawPacket(packetNum)
+        return packet
+
+    def _deliver_packets(self, packets, packet_callback, args = None , pool=None):
+        """
+        Call the callback (or pass to the callback pool) with each of the given packets.
+        """
+        if pool is not None:
+            packet_callback = pool.Start(packet_callback, args)
+        try:
+            for packet in packets:
+                packet_callback(packet , args)
+            if pool is not None:
+                pool.Finish()
+                pool = None
+        finally:
+            if pool is not None:
+                pool.Close()
     
-    def _get_packet_from_stream(self, stream, existing_data):
+    def _get_packet_from_stream(self, stream):
         """
-        A coroutine which returns a single packet if it can be read from the given StreamReader.
-        :return a tuple of (packet, remaining_data). The packet will be None if there was not enough XML data to create
-        a packet. remaining_data is the leftover data which was not enough to create a packet from.
-        :raises EOFError if EOF was reached.
+        A generator which returns the packets read from the given tshark stdout stream (records when using fields).
+        The output is parsed incrementally by the decoder's parser, so every packet is returned as soon as it
+        was completed (for PDML, its closing tag was read).
         """
+        fd = stream.fileno()
+        parser = self._get_output_parser()
         while (True):
-            # Read data until we get a packet, and yield it.
-            new_data = stream.read(self.DEFAULT_BATCH_SIZE)
+            # os.read returns whatever is available, so live captures are not delayed by the big batch size
+            new_data = os.read(fd, self.DEFAULT_BATCH_SIZE)
             if new_data == '':
                 break
-            existing_data += new_data
-            packet, existing_data = self._extract_tag_from_data(existing_data)
-            
-            if packet:
-                packet = packet_from_xml_packet(packet, self.fields_type)
-                yield (packet, existing_data)
-            else:
-                yield (None, existing_data)
-
-    @staticmethod
-    def _extract_tag_from_data(data, tag_name='packet'):
-        """
-        Gets data containing a (part of) tshark xml.
-        If the given tag is found in it, returns the tag data and the remaining data.
-        Otherwise returns None and the same data.
-
-        :param data: string of a partial tshark xml.
-        :return: a tuple of (tag, data). tag will be None if none is found.
-        """
-        opening_tag, closing_tag = b'<%s>' % tag_name, b'</%s>' % tag_name
-        tag_end = data.find(closing_tag)
-        if tag_end != -1:
-            tag_end += len(closing_tag)
-            tag_start = data.find(opening_tag)
-            return data[tag_start:tag_end], data[tag_end:]
-        return None, data
+            for output_item in parser.feed(new_data):
+                yield self._packet_from_output(output_item)
+
+        for output_item in parser.close():
+            yield self._packet_from_output(output_item)
+
+    def _get_output_parser(self):
+        """
+        Returns a parser of the tshark output - of the decoder, or the fields records.
+        """
+        if self.fields:
+            return FieldsStreamParser(self.fields, self.fields_type)
+        return self.decoder.CreateParser()
+
+    def _packet_from_output(self, output_item):
+        if self.fields:
+            return output_item
+        return self.decoder.MakePacket(output_item, self.fields_type, self.lazy, self.compact)
+
+    def _get_output_parameters(self):
+        """
+        Returns the tshark parameters of the output format.
+        """
+        if self.fields:
+            return get_fields_parameters(self.fields)
+        return self.decoder.GetParameters()
     
     def _get_tshark_process(self):
         """
         Returns a new tshark process with previously-set parameters.
         """
-        parameters = [get_tshark_path(), '-T', 'pdml' ,'-i','-','-l'] + self.get_parameters()
+        parameters = [get_tshark_path()] + self._get_output_parameters() + ['-i','-','-l'] + self.get_parameters()
         print parameters
         tshark_process = subprocess.Popen(parameters , 
                             stdin  = self._packetsSource.GetPacketsFeeder(),
@@ -155,10 +431,20 @@ class Capture(object):
             display_filter_flag = '-R'
 
         params = []
-        if self.display_filter:
-            params += [display_filter_flag, self.display_filter]
-        if self._packet_count:
-            params += ['-c', str(self._packet_count)]
+        display_filter = self._get_display_filter()
+        if display_filter:
+            params += [display_filter_flag, display_filter]
+        if self.layers:
+            if self.fields:
+                raise ValueError('layers can not be used with fields, the fields records have only the given fields')
+            if LooseVersion(tshark_version) < LooseVersion("2.2.0"):
+                raise ValueError('layers requires tshark 2.2 or newer (found %s)' % tshark_version)
+            # only these protocols and their subtrees are written (geninfo is always written)
+            layers = list(self.layers) + [layer for layer in self.decoder.REQUIRED_LAYERS if layer not in self.layers]
+            params += ['-J', ' '.join(layers)]
+        stop_count = self._get_stop_count()
+        if stop_count:
+            params += ['-c', str(stop_count)]
         if self._timeout:
             params += ['-a', 'duration:' + str(self._timeout)]
         if all(self.encryption):
@@ -193,10 +479,201 @@ class PacketsSource(object):
         
     def GetNextRawPacket(self , packetNumber = None):
         raise NotImplementedError()
+
+    def GetFrameNumber(self , tsharkFrameNumber):
+        '''
+        return the frame number in the source of the given tshark frame number.
+        '''
+        return tsharkFrameNumber
+
+    def ReleaseRawPackets(self , packetNumber):
+        '''
+        called instead of GetNextRawPacket when the raw packets are not needed (fields records).
+        sources which buffer the raw packets should drop them up to packetNumber.
+        '''
+        pass
         
     def ClosePacketsSource(self):
         pass
        
+def CreatePipe():
+    '''
+    Create a pipe, return tuple of descriptors (read , write).
+    The write end is not inherited by child processes, so a tshark reading from the pipe gets EOF when it is closed.
+    '''
+    readFd , writeFd = os.pipe()
+    try:
+        import fcntl
+        fcntl.fcntl(writeFd , fcntl.F_SETFD , fcntl.fcntl(writeFd , fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+    except ImportError:
+        pass
+    return readFd , writeFd
+
+def SetNonBlocking(fd):
+    '''
+    Set the descriptor to non blocking mode, so reading it returns EAGAIN instead of waiting.
+    '''
+    try:
+        import fcntl
+    except ImportError:
+        raise NotImplementedError('Non blocking pipes are not supported on this platform')
+    fcntl.fcntl(fd , fcntl.F_SETFL , fcntl.fcntl(fd , fcntl.F_GETFL) | os.O_NONBLOCK)
+
+class TSharkPoller(object):
+    '''
+    tshark process of a capture, which output is read without blocking (see Capture.start_polling).
+    '''
+    def __init__(self , capture):
+        self._capture = capture
+        self._packetsSource = capture._packetsSource = capture.GetPacketsSource()
+        self._packetsSource.StartPacketsSource()
+        try:
+            self._tshark_process = capture._get_tshark_process()
+        except:
+            self._packetsSource.ClosePacketsSource()
+            raise
+        self._fd = self._tshark_process.stdout.fileno()
+        SetNonBlocking(self._fd)
+        self._parser = capture._get_output_parser()
+
+    def fileno(self):
+        return self._fd
+
+    def ReadPackets(self):
+        '''
+        return list of the packets completed by the tshark output which is available (reads it once, so each
+        call parses at most Capture.DEFAULT_BATCH_SIZE bytes), or None if tshark ended.
+        '''
+        if self._tshark_process is None:
+            return None
+        try:
+            data = os.read(self._fd , Capture.DEFAULT_BATCH_SIZE)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN , errno.EWOULDBLOCK):
+                return []
+            raise
+        if data == '':
+            # the raw packets are taken before the packets source is closed
+            packets = self._GetPackets(self._parser.close())
+            self.Stop()
+            return packets or None
+        return self._GetPackets(self._parser.feed(data))
+
+    def _GetPackets(self , outputItems):
+        capture = self._capture
+        return [capture._set_packet_source(capture._packet_from_output(item)) for item in outputItems]
+
+    def Interrupt(self):
+        '''
+        kill tshark, so its output ends.
+        '''
+        if self._tshark_process is not None:
+            self._tshark_process.kill()
+
+    def Stop(self):
+        if self._tshark_process is not None:
+            self._capture._cleanup_subprocess(self._tshark_process)
+            self._capture.running_processes.discard(self._tshark_process)
+            self._tshark_process = None
+            self._packetsSource.ClosePacketsSource()
+
+class CapturePipeline(Capture):
+    '''
+    tshark process reading from a packets source, and a thread which dissects its output - one of several
+    pipelines of a capture which runs tshark processes in parallel.
+    The packets are put in a queue as tuples (pipeline index , packet), followed by (pipeline index , None)
+    when tshark ends.
+    '''
+    def __init__(self , capture , packetsSource , pipelineIndex):
+        '''
+        capture - the capture which runs the pipeline, its display filter and options are used.
+        '''
+        decryption_key , encryption_type = capture.encryption
+        super(CapturePipeline, self).__init__(display_filter=capture._get_display_filter(),
+                                              decryption_key=decryption_key, encryption_type=encryption_type,
+                                              layers=capture.layers, decoder=capture.decoder)
+        self._capture = capture
+        self._packetsSource = packetsSource
+        self.pipelineIndex = pipelineIndex
+        self._tshark_process = None
+        self._packetsQueue = None
+        self._error = None
+        self._stopped = False
+
+    def Start(self , packetsQueue):
+        capture = self._capture
+        self._timeout = capture._timeout
+        self._packet_count = capture._get_stop_count()
+        self.lazy = capture.lazy
+        self.compact = capture.compact
+        self.fields = capture.fields
+        self.fields_type = capture.fields_type
+        self._packetsQueue = packetsQueue
+
+        self._packetsSource.StartPacketsSource()
+        self._tshark_process = self._get_tshark_process()
+        readThread = Thread(target = self._ReadWorker)
+        readThread.daemon = True
+        readThread.start()
+
+    def PreparePacket(self , packet):
+        '''
+        called by the reading thread with each packet, before it is put in the queue.
+        '''
+        pass
+
+    def _ReadWorker(self):
+        try:
+            for packet in self._get_packet_with_raw_from_stream(self._tshark_process.stdout):
+                self.PreparePacket(packet)
+                self._Put(packet)
+        except Exception as e:
+            if not self._stopped:
+                self._error = e
+        finally:
+            self._Put(None)
+
+    def _Put(self , packet):
+        # the queue may be bounded, and nobody reads it after the pipeline was stopped
+        while not self._stopped:
+            try:
+                self._packetsQueue.put((self.pipelineIndex , packet) , True , POLL_INTERVAL)
+                return
+            except Queue.Full:
+                continue
+
+    def RaiseError(self):
+        '''
+        raise the error of the reading thread, if any.
+        '''
+        if self._error is not None:
+            raise self._error
+
+    def Stop(self):
+        self._stopped = True
+        if self._tshark_process is not None:
+            self._cleanup_subprocess(self._tshark_process)
+            self.running_processes.discard(self._tshark_process)
+            self._tshark_process = None
+        if self._packetsSource is not None:
+            self._packetsSource.ClosePacketsSource()
+            self._packetsSource = None
+
+    def __repr__(self):
+        return '<%s %d>' % (self.__class__.__name__, self.pipelineIndex)
+
+POLL_INTERVAL = 1
+
+def GetFromQueue(packetsQueue , timeout = POLL_INTERVAL):
+    '''
+    return item from the queue, or None after timeout.
+    Waits at most POLL_INTERVAL each time, so KeyboardInterrupt is not blocked.
+    '''
+    try:
+        return packetsQueue.get(True , min(timeout , POLL_INTERVAL))
+    except Queue.Empty:
+        return None
+
 class TSharkCrashException(Exception):
     pass
 
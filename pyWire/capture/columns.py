@@ -0,0 +1,78 @@
+'''
+Batches of fields records as columns (see Capture.apply_on_batches).
+The columns are NumPy arrays when NumPy is installed, otherwise array.array (or list) objects.
+'''
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from pyWire.tshark.tshark_fields import get_record_class
+
+NoneType = type(None)
+_NAN = float('nan')
+_INT_TYPES = set([int , long])
+_NUMBER_TYPES = set([int , long , float , NoneType])
+
+class ColumnsBatcher(object):
+    '''
+    Collects fields records, and passes every batchSize of them to the callback as a batch of columns -
+    a namedtuple like the records, where each attribute is the column of all the records of the batch
+    (eg: batch.ip_len[i] is the ip.len of the i'th packet in the batch).
+    '''
+    def __init__(self , fields , batchSize , batchCallback , args = None , useNumpy = True):
+        self.batchSize = batchSize
+        self._batchClass = get_record_class(fields)
+        self._batchCallback = batchCallback
+        self._args = args
+        self._useNumpy = useNumpy and np is not None
+        self._records = []
+        self.batches = 0
+
+    def AddRecord(self , record , args = None):
+        '''
+        callback of apply_on_packets.
+        '''
+        self._records.append(record)
+        if len(self._records) >= self.batchSize:
+            self.Flush()
+
+    def Flush(self):
+        '''
+        pass the collected records to the callback, if any.
+        '''
+        if not self._records:
+            return
+        records = self._records
+        self._records = []
+        columns = [MakeColumn(values , self._useNumpy) for values in zip(*records)]
+        self.batches += 1
+        self._batchCallback(self._batchClass._make(columns) , self._args)
+
+def MakeColumn(values , useNumpy = True):
+    '''
+    Return a column of the given values, by their types:
+        all int             - int64 array
+        all bool            - bool array (array('B') without NumPy)
+        int, float, None    - float64 array, None is NaN
+        anything else       - array of objects (list without NumPy), eg: strings, or lists of several occurrences
+    '''
+    types = set(map(type , values))
+    try:
+        if types and types <= _INT_TYPES:
+            return np.array(values , dtype = np.int64) if useNumpy else array('l' , values)
+        if types == set([bool]):
+            return np.array(values , dtype = np.bool_) if useNumpy else array('B' , values)
+        if types <= _NUMBER_TYPES and (float in types or (types & _INT_TYPES and NoneType in types)):
+            values = [_NAN if value is None else value for value in values]
+            return np.array(values , dtype = np.float64) if useNumpy else array('d' , values)
+    except OverflowError:
+        # integers larger than 64 bits (or C long without NumPy)
+        pass
+    if useNumpy:
+        column = np.empty(len(values) , dtype = object)
+        column[:] = values
+        return column
+    return list(values)
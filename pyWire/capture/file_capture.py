@@ -1,5 +1,15 @@
-from pyWire.capture.capture import Capture, PacketsSource
+import errno
+import heapq
+import os
+import Queue
+from threading import Thread
+
+from pyWire.capture.capture import Capture, PacketsSource, CreatePipe, CapturePipeline, GetFromQueue
+from pyWire.capture.sharding import ShardByFlow
+from pyWire.capture.bpf import BpfFilter, FilterFrames
+from pyWire.capture.raw_store import FileRawStore
 from pyWire.capture.fileformats.PcapFile import PcapFile
+from pyWire.capture.fileformats.PcapIndex import PcapIndex
 
 class FileCapture(Capture):
     """
@@ -7,25 +17,140 @@ class FileCapture(Capture):
     """
 
     def __init__(self, input_file=None, display_filter=None, 
-                 decryption_key=None, encryption_type='wpa-pwk'):
+                 decryption_key=None, encryption_type='wpa-pwk',
+                 start_time=None, end_time=None, frame_range=None, save_index=True, layers=None,
+                 decoder=None, bpf_filter=None):
         """
         Creates a packet capture object by reading from file.
 
         :param keep_packets: Whether to keep packets after reading them via next(). Used to conserve memory when reading
         large caps (can only be used along with the "lazy" option!)
         :param input_file: File path of the capture (PCAP, PCAPNG)
-        :param bpf_filter: A BPF (tcpdump) filter to apply on the cap before reading.
+        :param bpf_filter: A BPF (tcpdump) filter to apply on the cap before reading. It is evaluated in python on
+        the headers of the packets in the file (see pyWire.capture.bpf for the supported primitives), and only the
+        matching packets are fed to tshark. packet.frame_number is the number of the packet in the whole file.
+        Supports only pcap files.
         :param display_filter: A display (wireshark) filter to apply on the cap before reading it.
         :param only_summaries: Only produce packet summaries, much faster but includes very little information.
         :param decryption_key: Optional key used to encrypt and decrypt captured traffic.
         :param encryption_type: Standard of encryption used in captured traffic (must be either 'WEP', 'WPA-PWD', or
         'WPA-PWK'. Defaults to WPA-PWK).
+        :param start_time: Read only packets captured at or after this time (seconds since epoch, or datetime).
+        :param end_time: Read only packets captured before this time (seconds since epoch, or datetime).
+        :param frame_range: Read only packets in this tuple of (first , last) frame numbers, both included.
+        When any of start_time, end_time or frame_range is given, an index of the file (see PcapIndex) is used
+        to find the packets, and only their bytes are fed to tshark. packet.frame_number is the number of
+        the packet in the whole file.
+        :param save_index: Save the index next to the file, so it is built only once.
+        :param layers: Dissect only these protocols (eg: ['ip', 'tcp', 'http']), the other layers are not in the
+        packets. The frame layer is kept only if it is listed. Requires tshark 2.2 or newer, and can not be used with
+        fields (raises ValueError).
+        :param decoder: Format of tshark output and its decoder - 'pdml' (default) or 'json' (faster to parse,
+        requires tshark 2.2 or newer). JSON packets are always compact, and their fields have no raw value.
         """
         super(FileCapture, self).__init__(display_filter=display_filter,
-                                          decryption_key=decryption_key, encryption_type=encryption_type)
+                                          decryption_key=decryption_key, encryption_type=encryption_type,
+                                          layers=layers, decoder=decoder)
         self.input_filename = input_file
         if not isinstance(input_file, basestring):
             self.input_filename = input_file.name
+        self.start_time = start_time
+        self.end_time = end_time
+        self.frame_range = frame_range
+        self.save_index = save_index
+        self.bpf_filter = bpf_filter
+        # compiled here, so an unsupported filter fails before reading
+        self._bpf = BpfFilter(bpf_filter) if bpf_filter else None
+        self.workers = None
+        self.shard_by_flow = False
+
+    # packets dissected ahead of the callback, by each tshark process of apply_on_packets with workers
+    PIPELINE_QUEUE_SIZE = 10000
+    # consecutive frames fed to the same tshark process of apply_on_packets with workers - the chunks are dealt
+    # to the processes in turn, and must be smaller than PIPELINE_QUEUE_SIZE, so every process dissects its next
+    # chunks while the packets of the other processes are passed to the callback
+    PIPELINE_CHUNK_SIZE = 1000
+
+    def apply_on_packets(self, packet_callback, timeout=None , packet_count = None ,args = None, parse_types=False,
+                         lazy=False, compact=False, pool=None, fields=None, workers=None, shard_by_flow=False):
+        """
+        See Capture.apply_on_packets.
+
+        If workers is given, the file is split between that many tshark processes, which run in parallel.
+        The packets are passed to the callback in the order of the file, with their frame number in the file.
+        By default the file is split to chunks of PIPELINE_CHUNK_SIZE consecutive packets, which are dealt to the
+        tshark processes in turn, so state which tshark keeps between packets (eg: tcp reassembly) is lost at the
+        start of each chunk, and relative times and tcp.stream numbers are not those of the whole file.
+        If shard_by_flow is True, the packets are split by their flow (ip addresses, protocol and ports) instead,
+        so each flow is dissected by a single tshark process.
+        Supports only pcap files.
+        """
+        self.workers = workers
+        self.shard_by_flow = shard_by_flow
+        super(FileCapture, self).apply_on_packets(packet_callback, timeout, packet_count, args, parse_types, lazy,
+                                                  compact, pool, fields)
+
+    def packets(self, timeout=None, packet_count=None, parse_types=False, lazy=False, compact=False, fields=None,
+                workers=None, shard_by_flow=False):
+        """
+        See Capture.packets, and FileCapture.apply_on_packets for workers and shard_by_flow.
+        """
+        self.workers = workers
+        self.shard_by_flow = shard_by_flow
+        return super(FileCapture, self).packets(timeout, packet_count, parse_types, lazy, compact, fields)
+
+    def _iterate_packets(self):
+        if not self.workers or self.workers < 2:
+            return super(FileCapture, self)._iterate_packets()
+        return self._IteratePipelines(self.workers , self.shard_by_flow)
+
+    def _IteratePipelines(self , workers , shard_by_flow):
+        index = PcapIndex.Load(self.input_filename , save = self.save_index)
+        selection = self._SelectFrames(index)
+        if shard_by_flow:
+            parts = ShardByFlow(self.input_filename , selection , workers)
+        else:
+            parts = selection.SplitInterleaved(workers , FileCapture.PIPELINE_CHUNK_SIZE)
+
+        pipelines = []
+        try:
+            packetsQueues = []
+            for part in parts:
+                pipeline = CapturePipeline(self , FilePacketsSource(self.input_filename , part , index) , len(pipelines))
+                pipelines.append(pipeline)
+                packetsQueues.append(Queue.Queue(FileCapture.PIPELINE_QUEUE_SIZE))
+                pipeline.Start(packetsQueues[-1])
+
+            for packet in FileCapture._IterateInOrder(packetsQueues , pipelines):
+                yield packet
+        finally:
+            for pipeline in pipelines:
+                pipeline.Stop()
+
+    @staticmethod
+    def _IterateInOrder(packetsQueues , pipelines):
+        '''
+        k-way merge of the packets of the pipelines by their frame number (each pipeline is ordered).
+        '''
+        heap = []
+        for pipelineIndex in xrange(len(pipelines)):
+            FileCapture._PushNextPacket(heap , packetsQueues , pipelines , pipelineIndex)
+        while heap:
+            frameNumber , pipelineIndex , packet = heapq.heappop(heap)
+            yield packet
+            FileCapture._PushNextPacket(heap , packetsQueues , pipelines , pipelineIndex)
+
+    @staticmethod
+    def _PushNextPacket(heap , packetsQueues , pipelines , pipelineIndex):
+        item = GetFromQueue(packetsQueues[pipelineIndex])
+        while item is None:
+            item = GetFromQueue(packetsQueues[pipelineIndex])
+        packet = item[1]
+        if packet is None:
+            # tshark ended
+            pipelines[pipelineIndex].RaiseError()
+            return
+        heapq.heappush(heap , (packet.frame_number , pipelineIndex , packet))
 
     def GetPacketsSource(self):
         '''
@@ -35,7 +160,19 @@ class FileCapture(Capture):
             GetNextRawPacket
             ClosePacketsSource
         '''
-        return FilePacketsSource(self.input_filename)
+        if self.start_time is None and self.end_time is None and self.frame_range is None and self._bpf is None:
+            return FilePacketsSource(self.input_filename)
+        index = PcapIndex.Load(self.input_filename , save = self.save_index)
+        return FilePacketsSource(self.input_filename , self._SelectFrames(index) , index)
+
+    def _SelectFrames(self , index):
+        '''
+        return FrameSelection of the frames to read - in the time and frame ranges, which match the bpf filter.
+        '''
+        selection = index.SelectFrames(self.start_time , self.end_time , self.frame_range)
+        if self._bpf is not None:
+            selection = FilterFrames(self.input_filename , selection , self._bpf)
+        return selection
             
     # def get_parameters(self):
         # return super(FileCapture, self).get_parameters(packet_count=packet_count) + ['-r', self.input_filename]
@@ -44,31 +181,77 @@ class FileCapture(Capture):
         return '<%s %s>' % (self.__class__.__name__, self.input_filename)
         
 class FilePacketsSource(PacketsSource):
-    def __init__(self , pcapFilePath):
+    _CHUNK_SIZE = 1024 * 1024
+    def __init__(self , pcapFilePath , selection = None , index = None):
+        '''
+        selection - FrameSelection of the frames to feed tshark, None for the whole file.
+        index - PcapIndex of the file, required when selection is given.
+        '''
         self.pcapFilePath = pcapFilePath
+        self._selection = selection
+        self._index = index
         self._feeder = None
-        self._pcapFile = None
+        self._rawStore = None
+        self._feedThread = None
         
     def StartPacketsSource(self):
-        self._feeder = open(self.pcapFilePath , 'rb')
-        self._pcapFile = PcapFile(self.pcapFilePath)
-        self._pktGen = self._pcapFile.ReadPackets()
+        if self._selection is None:
+            self._feeder = open(self.pcapFilePath , 'rb')
+        else:
+            readFd , writeFd = CreatePipe()
+            self._feeder = os.fdopen(readFd , 'rb')
+            args = (self.pcapFilePath , self._selection , self._index , writeFd)
+            self._feedThread = Thread(target = FilePacketsSource._FeedWorker , args = args)
+            self._feedThread.daemon = True
+            self._feedThread.start()
+        self._rawStore = FileRawStore(self.pcapFilePath , self._index)
         self._curPktNum = 0
+
+    @staticmethod
+    def _FeedWorker(pcapFilePath , selection , index , writeFd):
+        '''
+        This thread writes the global header of the file, and then the byte ranges of the selected frames.
+        '''
+        try:
+            with open(pcapFilePath , 'rb') as pcapFile:
+                _WriteAll(writeFd , pcapFile.read(PcapFile.GLOBAL_HEADER_SIZE))
+                for first , last in selection.IterateRuns():
+                    offset = index.GetOffset(first)
+                    end = index.GetOffset(last) + index.GetRecordSize(last)
+                    pcapFile.seek(offset)
+                    while offset < end:
+                        data = pcapFile.read(min(FilePacketsSource._CHUNK_SIZE , end - offset))
+                        if data == '':
+                            return
+                        _WriteAll(writeFd , data)
+                        offset += len(data)
+        except OSError as e:
+            # tshark exited before reading everything (eg: packet_count)
+            if e.errno != errno.EPIPE:
+                raise
+        finally:
+            os.close(writeFd)   # will stop tshark feed
         
     def GetNextRawPacket(self , packetNumber = None):
         if packetNumber is None:
-            self._curPktNum += 1
-            return self._pktGen.next().raw
-        else:
-            while self._curPktNum < packetNumber:
-                curRawPkt = self._pktGen.next().raw
-                self._curPktNum += 1
-            return curRawPkt
+            packetNumber = self._curPktNum + 1
+        self._curPktNum = packetNumber
+        return self._rawStore.GetRawPacket(packetNumber)
+
+    def GetFrameNumber(self , tsharkFrameNumber):
+        if self._selection is None:
+            return tsharkFrameNumber
+        return self._selection.GetFrameNumber(tsharkFrameNumber)
         
     def ClosePacketsSource(self):
         if self._feeder:
             self._feeder.close()
             self._feeder = None
-        if self._pcapFile:
-            self._pcapFile.Close()
-            self._pcapFile = None
\ No newline at end of file
+        if self._rawStore:
+            self._rawStore.Close()
+            self._rawStore = None
+
+def _WriteAll(fd , data):
+    while data:
+        written = os.write(fd , data)
+        data = data[written:]
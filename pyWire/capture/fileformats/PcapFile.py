@@ -1,5 +1,7 @@
 import struct
 import os
+import mmap
+from bisect import bisect_right
 
 class PcapFile(object):
     # see wiki.wiresharl.org/Development/LibpcapFileFormat
@@ -16,17 +18,69 @@ class PcapFile(object):
             DWORD   snaplen     \xff\xff\x00\x00    max length of captured packets saved in bytes (larger will be truncated)
             DWORD   network     \x01\x00\x00\x00    data link type
     '''
+    # see pcapng specification (github.com/pcapng/pcapng)
+    PCAPNG_SHB_MAGIC = '\x0a\x0d\x0d\x0a'
+    PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+    PCAPNG_SECTION_HEADER = 0x0a0d0d0a
+    PCAPNG_INTERFACE_DESCRIPTION = 0x00000001
+    PCAPNG_PACKET = 0x00000002      # obsolete
+    PCAPNG_SIMPLE_PACKET = 0x00000003
+    PCAPNG_ENHANCED_PACKET = 0x00000006
+    PCAPNG_OPTION_END = 0
+    PCAPNG_OPTION_IF_NAME = 2
+    PCAPNG_OPTION_IF_TSRESOL = 9
+    '''
+        pcapng file is a list of blocks, each block:
+            DWORD   blockType
+            DWORD   blockTotalLength    length of the whole block, including this and the trailing length
+            ...     blockBody           padded to 4 bytes
+            DWORD   blockTotalLength
+        The file starts with a section header block, and the packets refer to the interface description
+        blocks before them (of the same section) by their index.
+    '''
     
-    def __init__(self , path):
+    def __init__(self , path , pcapng = False):
+        '''
+            path - path to file, file or pipe descriptor, or file object.
+            pcapng - write in pcapng format (reading detects the format of the file).
+        '''
         self._path = path
         self._handle = None
+        self._map = None
+        self._pcapng = False
+        self._writePcapng = pcapng
+        self._writeInterfaces = []
     
-    def WritePacket(self , thePacket):
+    def WritePacket(self , thePacket , interfaceId = None):
+        '''
+            Write packet object. In pcapng format, interfaceId is the interface of the packet (see AddInterface),
+            default is the interface the packet was captured on, if known.
+        '''
+        sec , microSec = PcapFile.GetPacketTimestamp(thePacket)
+        if interfaceId is None and thePacket.interface_captured is not None:
+            interfaceId = int(thePacket.interface_captured)
+        self._WritePacket( thePacket.GetRaw(), sec , microSec , interfaceId)
+
+    def AddInterface(self , linkType = 1 , snaplen = 0xffff , name = None):
+        '''
+            pcapng only: add interface, return its id for WritePacket.
+            If no interface is added, all packets are written on a single ethernet interface.
+        '''
+        self._writeInterfaces.append(PcapFile.GetPcapngInterfaceBlock(linkType , snaplen , name))
+        if self._handle is not None:
+            self._handle.write(self._writeInterfaces[-1])
+        return len(self._writeInterfaces) - 1
+
+    @staticmethod
+    def GetPacketTimestamp(thePacket):
+        '''
+            return the capture time of a packet object, as tuple (seconds , microseconds)
+        '''
         sec =  thePacket.sniff_timestamp.split('.')[0]
         microSec = thePacket.sniff_time.microsecond
-        self._WritePacket( thePacket.GetRaw(),int(sec) , microSec)
+        return (int(sec) , microSec)
     
-    def _WritePacket(self , packetData , timestampSec , timestampMicrosec):
+    def _WritePacket(self , packetData , timestampSec , timestampMicrosec , interfaceId = None):
         '''
             Each packet has:
             packet header:
@@ -37,41 +91,433 @@ class PcapFile(object):
             packet data:
                 incl_len    bytes
         '''
+        if self._writePcapng:
+            self._WritePcapngPacket(packetData , timestampSec , timestampMicrosec , interfaceId)
+            return
         if self._handle is None:
             self._Open('wb')
             self._handle.write(PcapFile.GLOBAL_HEADER)
 
+        self._handle.write(PcapFile.GetPacketRecord(packetData , timestampSec , timestampMicrosec))
+
+    def _WritePcapngPacket(self , packetData , timestampSec , timestampMicrosec , interfaceId):
+        if self._handle is None:
+            self._Open('wb')
+            self._handle.write(PcapFile.GetPcapngSectionHeader())
+            if not self._writeInterfaces:
+                self._writeInterfaces.append(PcapFile.GetPcapngInterfaceBlock())
+            for interfaceBlock in self._writeInterfaces:
+                self._handle.write(interfaceBlock)
+        if interfaceId is None or interfaceId >= len(self._writeInterfaces):
+            interfaceId = 0
+        self._handle.write(PcapFile.GetPcapngPacketBlock(packetData , timestampSec , timestampMicrosec , interfaceId))
+
+    @staticmethod
+    def GetPcapngSectionHeader():
+        '''
+            return section header block (little endian, version 1.0, unknown section length).
+        '''
+        body = struct.pack('<IHHq' , PcapFile.PCAPNG_BYTE_ORDER_MAGIC , 1 , 0 , -1)
+        return PcapFile._GetPcapngBlock(PcapFile.PCAPNG_SECTION_HEADER , body)
+
+    @staticmethod
+    def GetPcapngInterfaceBlock(linkType = 1 , snaplen = 0xffff , name = None):
+        '''
+            return interface description block. timestamps are in microseconds (the default resolution).
+        '''
+        body = struct.pack('<HHI' , linkType , 0 , snaplen)
+        if name:
+            body += PcapFile._GetPcapngOption(PcapFile.PCAPNG_OPTION_IF_NAME , name)
+            body += PcapFile._GetPcapngOption(PcapFile.PCAPNG_OPTION_END , '')
+        return PcapFile._GetPcapngBlock(PcapFile.PCAPNG_INTERFACE_DESCRIPTION , body)
+
+    @staticmethod
+    def GetPcapngPacketBlock(packetData , timestampSec , timestampMicrosec , interfaceId = 0 , origLen = None):
+        '''
+            return enhanced packet block of the packet.
+        '''
+        lenData = len(packetData)
+        if origLen is None:
+            origLen = lenData
+        timestamp = timestampSec * 1000000 + timestampMicrosec
+        body = struct.pack('<IIIII' , interfaceId , timestamp >> 32 , timestamp & 0xffffffff , lenData , origLen)
+        return PcapFile._GetPcapngBlock(PcapFile.PCAPNG_ENHANCED_PACKET , body + PcapFile._Pad(packetData))
+
+    @staticmethod
+    def _GetPcapngBlock(blockType , body):
+        blockLength = 12 + len(body)
+        return struct.pack('<II' , blockType , blockLength) + body + struct.pack('<I' , blockLength)
+
+    @staticmethod
+    def _GetPcapngOption(code , value):
+        return struct.pack('<HH' , code , len(value)) + PcapFile._Pad(value)
+
+    @staticmethod
+    def _Pad(data):
+        return data + '\x00' * (-len(data) % 4)
+
+    @staticmethod
+    def GetPacketRecord(packetData , timestampSec , timestampMicrosec):
+        '''
+            return the packet header and data, as written in the file after the global header.
+        '''
         packetBuffer = ''
         lenData = len(packetData)
         if lenData > 0xffff:
             raise Exception('Could not save whole packet, too big')
         packetBuffer += struct.pack('IIII',timestampSec,timestampMicrosec,lenData,lenData)
         packetBuffer += packetData
-        
-        self._handle.write(packetBuffer)
+        return packetBuffer
         
     def Close(self):
         if self._handle is not None:
             self._handle.close()
         self._handle = None
+        if self._map is not None:
+            self._map.close()
+        self._map = None
         
     def ReadPackets(self):
+        '''
+            Read the packets of pcap or pcapng file, yield RawPacket for each one.
+            The file is only read forward, so it may be a pipe.
+        '''
         self._Open()
+        magic = self._handle.read(4)
+        if magic == PcapFile.PCAPNG_SHB_MAGIC:
+            for rawPacket in self._ReadPcapngPackets(magic):
+                yield rawPacket
+            self.Close()
+            return
         # read and parse global header
-        self._ParseGlobalHeader(self._handle.read(self.GLOBAL_HEADER_SIZE))
+        self._ParseGlobalHeader(magic + self._handle.read(self.GLOBAL_HEADER_SIZE - 4))
         
         # read packet header
+        offset = self.GLOBAL_HEADER_SIZE
         packetHeader = self._handle.read(PcapFile.PACKET_HEADER_SIZE)
         while (packetHeader is not None) and (packetHeader != ''):
             timestampSec,timestampMicrosec,lenData,origLenData = self._ParsePacketHeader(packetHeader)
             packetData = self._handle.read(lenData)
-            yield RawPacket(packetData , timestampSec,timestampMicrosec,lenData,origLenData)
+            yield RawPacket(packetData , timestampSec,timestampMicrosec,lenData,origLenData , offset ,
+                            linkType = self._network)
             
             # next packet header
+            offset += PcapFile.PACKET_HEADER_SIZE + lenData
             packetHeader = self._handle.read(PcapFile.PACKET_HEADER_SIZE)
             
         self.Close()
 
+    def ReadPacketHeaders(self):
+        '''
+            Same as ReadPackets, but read only the packets headers (the raw bytes will be None).
+            The packets data is skipped, so the handle must be seekable.
+        '''
+        self._Open()
+        magic = self._handle.read(4)
+        if magic == PcapFile.PCAPNG_SHB_MAGIC:
+            self._StartPcapng()
+            rawPacket = self._ReadPcapngPacketAt(0 , False)
+            while rawPacket is not None:
+                yield rawPacket
+                rawPacket = self._ReadPcapngPacketAt(rawPacket.offset + rawPacket.recordLength , False)
+            self.Close()
+            return
+        self._ParseGlobalHeader(magic + self._handle.read(self.GLOBAL_HEADER_SIZE - 4))
+        
+        offset = self.GLOBAL_HEADER_SIZE
+        packetHeader = self._handle.read(PcapFile.PACKET_HEADER_SIZE)
+        while len(packetHeader) == PcapFile.PACKET_HEADER_SIZE:
+            timestampSec,timestampMicrosec,lenData,origLenData = self._ParsePacketHeader(packetHeader)
+            yield RawPacket(None , timestampSec,timestampMicrosec,lenData,origLenData , offset)
+            
+            offset += PcapFile.PACKET_HEADER_SIZE + lenData
+            self._handle.seek(offset)
+            packetHeader = self._handle.read(PcapFile.PACKET_HEADER_SIZE)
+            
+        self.Close()
+
+    def ReadPacketsMapped(self):
+        '''
+            Same as ReadPackets, but the file is memory mapped, and no object is created and no data
+            is copied for each packet.
+            yield tuples (data , timestampSec , timestampMicrosec , lenData , origLenData , offset), where data
+            is a buffer of the packet bytes in the map (use str(data) to keep a copy).
+            The buffers are valid only until the generator ends.
+            Supports only pcap files.
+        '''
+        theMap = self._MapFile()
+        if self._pcapng:
+            theMap.close()
+            raise Exception('Mapped reading of pcapng files is not supported, use ReadPackets')
+        try:
+            unpackHeader = self._packetHeaderStruct.unpack_from
+            headerSize = PcapFile.PACKET_HEADER_SIZE
+            fileSize = len(theMap)
+            offset = self.GLOBAL_HEADER_SIZE
+            while offset + headerSize <= fileSize:
+                timestampSec,timestampMicrosec,lenData,origLenData = unpackHeader(theMap , offset)
+                yield (buffer(theMap , offset + headerSize , lenData) ,
+                       timestampSec , timestampMicrosec , lenData , origLenData , offset)
+                offset += headerSize + lenData
+        finally:
+            theMap.close()
+
+    def Map(self):
+        '''
+            Memory map the file, so ReadPacketAt and ReadPacketHeaderAt read from the map,
+            without a system call for each packet. The map is closed by Close.
+        '''
+        if self._map is None:
+            self._map = self._MapFile()
+            if self._pcapng:
+                self._ScanPcapngBlocks(0)
+
+    def ReadPacketAt(self , offset):
+        '''
+            Read the packet which its header starts at the given offset of the file.
+            Return None at the end of the file.
+            In pcapng files, the offset is of a block, and the first packet block from it is read.
+            Can not be used along with ReadPackets.
+        '''
+        if self._map is None and self._handle is None:
+            self._OpenForRandomAccess()
+        if self._pcapng:
+            return self._ReadPcapngPacketAt(offset , True)
+        rawPacket = self.ReadPacketHeaderAt(offset)
+        if rawPacket is not None:
+            if self._map is not None:
+                start = offset + PcapFile.PACKET_HEADER_SIZE
+                rawPacket.raw = self._map[start:start + rawPacket.lenData]
+            else:
+                rawPacket.raw = self._handle.read(rawPacket.lenData)
+        return rawPacket
+
+    def ReadPacketHeaderAt(self , offset):
+        '''
+            Same as ReadPacketAt, but read only the packet header (the raw bytes will be None).
+        '''
+        if self._map is None and self._handle is None:
+            self._OpenForRandomAccess()
+        if self._pcapng:
+            return self._ReadPcapngPacketAt(offset , False)
+        packetHeader = self._ReadAt(offset , PcapFile.PACKET_HEADER_SIZE)
+        if len(packetHeader) < PcapFile.PACKET_HEADER_SIZE:
+            return None
+        timestampSec,timestampMicrosec,lenData,origLenData = self._ParsePacketHeader(packetHeader)
+        return RawPacket(None , timestampSec,timestampMicrosec,lenData,origLenData , offset ,
+                         linkType = self._network)
+
+    def GetLinkType(self):
+        '''
+            return the data link type of the packets (pcap only). The file must be mapped or read.
+        '''
+        return self._network
+
+    def GetFirstPacketOffset(self):
+        '''
+            return the offset of the first packet in the file (pcapng: of the first block),
+            for ReadPacketAt. The file must be mapped or opened for reading.
+        '''
+        if self._map is None and self._handle is None:
+            self._OpenForRandomAccess()
+        if self._pcapng:
+            return 0
+        return PcapFile.GLOBAL_HEADER_SIZE
+
+    def _OpenForRandomAccess(self):
+        self._Open()
+        magic = self._handle.read(4)
+        if magic == PcapFile.PCAPNG_SHB_MAGIC:
+            self._StartPcapng()
+            self._ScanPcapngBlocks(0)
+        else:
+            self._ParseGlobalHeader(magic + self._handle.read(self.GLOBAL_HEADER_SIZE - 4))
+
+    def _ReadAt(self , offset , size):
+        if self._map is not None:
+            return self._map[offset:offset + size]
+        self._handle.seek(offset)
+        return self._handle.read(size)
+
+    def _StartPcapng(self):
+        self._pcapng = True
+        # offsets of the sections, and (endian , interfaces) of each section
+        self._sectionOffsets = []
+        self._sections = []
+        self._interfaces = []
+        # the section header and interface description blocks before this offset were parsed
+        self._scannedOffset = 0
+
+    def _ReadPcapngPackets(self , magic):
+        '''
+            yield RawPacket for each packet block of pcapng stream, which its first 4 bytes were read.
+        '''
+        self._StartPcapng()
+        offset = 0
+        block = self._ReadPcapngBlock(self._handle.read , magic + self._handle.read(4))
+        while block is not None:
+            blockType , body , blockLength = block
+            rawPacket = self._ParsePcapngBlock(blockType , body , offset , blockLength , True)
+            if rawPacket is not None:
+                yield rawPacket
+            offset += blockLength
+            block = self._ReadPcapngBlock(self._handle.read)
+
+    def _ReadPcapngPacketAt(self , offset , withData):
+        '''
+            return RawPacket of the first packet block at or after the given offset, None at the end of the file.
+        '''
+        while True:
+            # the block is parsed using the byte order and interfaces of its section
+            self._ScanPcapngBlocks(offset)
+            sectionIndex = bisect_right(self._sectionOffsets , offset) - 1
+            if sectionIndex < 0:
+                return None
+            self._endian , self._interfaces = self._sections[sectionIndex]
+            block = self._ReadPcapngBlock(self._GetReader(offset))
+            if block is None:
+                return None
+            blockType , body , blockLength = block
+            if blockType not in (PcapFile.PCAPNG_SECTION_HEADER , PcapFile.PCAPNG_INTERFACE_DESCRIPTION):
+                # these blocks were parsed by the scan
+                rawPacket = self._ParsePcapngBlock(blockType , body , offset , blockLength , withData)
+                if rawPacket is not None:
+                    return rawPacket
+            offset += blockLength
+
+    def _ScanPcapngBlocks(self , offset):
+        '''
+            parse the section header and interface description blocks up to the given offset (included),
+            the other blocks are skipped by their length.
+        '''
+        position = self._scannedOffset
+        if self._sections:
+            # the scan continues in the last section that was scanned
+            self._endian , self._interfaces = self._sections[-1]
+        while position <= offset:
+            blockHeader = self._ReadAt(position , 8)
+            if len(blockHeader) < 8:
+                break
+            if blockHeader[:4] != PcapFile.PCAPNG_SHB_MAGIC:
+                blockType , blockLength = struct.unpack(self._endian + 'II' , blockHeader)
+                if blockLength < 12:
+                    raise Exception('Corrupted pcapng block!')
+                if blockType != PcapFile.PCAPNG_INTERFACE_DESCRIPTION:
+                    position += blockLength
+                    continue
+            block = self._ReadPcapngBlock(self._GetReader(position))
+            if block is None:
+                break
+            blockType , body , blockLength = block
+            self._ParsePcapngBlock(blockType , body , position , blockLength , False)
+            position += blockLength
+        self._scannedOffset = max(self._scannedOffset , position)
+
+    def _GetReader(self , offset):
+        '''
+            return a read function, which reads the file from the given offset forward.
+        '''
+        position = [offset]
+        def ReadNext(size):
+            data = self._ReadAt(position[0] , size)
+            position[0] += len(data)
+            return data
+        return ReadNext
+
+    def _ReadPcapngBlock(self , read , blockHeader = None):
+        '''
+            Read pcapng block using the given read function.
+            Return tuple (blockType , body , blockLength), or None at the end of the file.
+        '''
+        if blockHeader is None:
+            blockHeader = read(8)
+        if len(blockHeader) < 8:
+            return None
+        if blockHeader[:4] == PcapFile.PCAPNG_SHB_MAGIC:
+            # new section, the byte order magic dictates its endian
+            byteOrder = read(4)
+            if len(byteOrder) < 4:
+                return None
+            if struct.unpack('<I' , byteOrder)[0] == PcapFile.PCAPNG_BYTE_ORDER_MAGIC:
+                self._endian = '<'
+            elif struct.unpack('>I' , byteOrder)[0] == PcapFile.PCAPNG_BYTE_ORDER_MAGIC:
+                self._endian = '>'
+            else:
+                raise Exception('Not a pcapng file!')
+            blockType , blockLength = struct.unpack(self._endian + 'II' , blockHeader)
+            body = byteOrder + read(blockLength - 12)
+        else:
+            blockType , blockLength = struct.unpack(self._endian + 'II' , blockHeader)
+            if blockLength < 12:
+                raise Exception('Corrupted pcapng block!')
+            body = read(blockLength - 8)
+        if len(body) < blockLength - 8:
+            # truncated file
+            return None
+        return (blockType , body[:-4] , blockLength)
+
+    def _ParsePcapngBlock(self , blockType , body , offset , blockLength , withData):
+        '''
+            Parse pcapng block, return RawPacket if it is a packet block, otherwise None.
+        '''
+        endian = self._endian
+        if blockType == PcapFile.PCAPNG_ENHANCED_PACKET:
+            interfaceId , timestampHigh , timestampLow , lenData , origLenData = struct.unpack_from(endian + 'IIIII' , body)
+            dataStart = 20
+        elif blockType == PcapFile.PCAPNG_SIMPLE_PACKET:
+            interfaceId , timestampHigh , timestampLow = 0 , 0 , 0
+            origLenData = struct.unpack_from(endian + 'I' , body)[0]
+            lenData = min(origLenData , len(body) - 4)
+            if self._interfaces and self._interfaces[0][1]:
+                lenData = min(lenData , self._interfaces[0][1])
+            dataStart = 4
+        elif blockType == PcapFile.PCAPNG_PACKET:
+            interfaceId , drops , timestampHigh , timestampLow , lenData , origLenData = struct.unpack_from(endian + 'HHIIII' , body)
+            dataStart = 20
+        elif blockType == PcapFile.PCAPNG_INTERFACE_DESCRIPTION:
+            self._interfaces.append(self._ParsePcapngInterface(body))
+            return None
+        elif blockType == PcapFile.PCAPNG_SECTION_HEADER:
+            # interfaces are numbered per section
+            self._interfaces = []
+            if not self._sectionOffsets or offset > self._sectionOffsets[-1]:
+                self._sectionOffsets.append(offset)
+                self._sections.append((self._endian , self._interfaces))
+            return None
+        else:
+            return None
+
+        if interfaceId < len(self._interfaces):
+            linkType , snaplen , unitsPerSecond = self._interfaces[interfaceId]
+        else:
+            linkType , unitsPerSecond = None , 1000000
+        timestamp = (timestampHigh << 32) | timestampLow
+        timestampSec = timestamp // unitsPerSecond
+        timestampMicrosec = (timestamp % unitsPerSecond) * 1000000 // unitsPerSecond
+        packetData = body[dataStart:dataStart + lenData] if withData else None
+        return RawPacket(packetData , timestampSec,timestampMicrosec,lenData,origLenData , offset ,
+                         interfaceId , linkType , blockLength)
+
+    def _ParsePcapngInterface(self , body):
+        '''
+            return tuple (linkType , snaplen , timestamp units per second) of interface description block body.
+        '''
+        linkType , reserved , snaplen = struct.unpack_from(self._endian + 'HHI' , body)
+        unitsPerSecond = 1000000
+        position = 8
+        while position + 4 <= len(body):
+            code , length = struct.unpack_from(self._endian + 'HH' , body , position)
+            if code == PcapFile.PCAPNG_OPTION_END:
+                break
+            if code == PcapFile.PCAPNG_OPTION_IF_TSRESOL and length >= 1:
+                resolution = ord(body[position + 4])
+                if resolution & 0x80:
+                    unitsPerSecond = 2 ** (resolution & 0x7f)
+                else:
+                    unitsPerSecond = 10 ** resolution
+            position += 4 + length + (-length % 4)
+        return (linkType , snaplen , unitsPerSecond)
+
     def _Open(self , mode = 'rb'):
         if self._handle is not None:
             raise Exception('Trying to open while already open!')
@@ -85,6 +531,22 @@ class PcapFile(object):
         #else:
         #    raise Exception('Unsupported descriptor was given')
 
+    def _MapFile(self):
+        '''
+            Map the whole file to memory (read only) and parse its global header. Return the map.
+        '''
+        if type(self._path) is str:
+            with open(self._path , 'rb') as handle:
+                theMap = mmap.mmap(handle.fileno() , 0 , access = mmap.ACCESS_READ)
+        else:
+            fileno = self._path if type(self._path) is int else self._path.fileno()
+            theMap = mmap.mmap(fileno , 0 , access = mmap.ACCESS_READ)
+        if theMap[:4] == PcapFile.PCAPNG_SHB_MAGIC:
+            self._StartPcapng()
+        else:
+            self._ParseGlobalHeader(theMap[:self.GLOBAL_HEADER_SIZE])
+        return theMap
+
     def _ParseGlobalHeader(self, theHeader):
         magic = theHeader[:4]
         theHeader = theHeader[4:]
@@ -100,6 +562,8 @@ class PcapFile(object):
             
         format = self._endian + 'HHIIII'
         majorV, minorV, thiszone, sigfigs, snaplen, network = struct.unpack(format,theHeader)
+        # compiled once, used for every packet header
+        self._packetHeaderStruct = struct.Struct(self._endian + 'IIII')
         self._version = (majorV, minorV)
         self._zone = thiszone
         self._sigfigs = sigfigs
@@ -107,16 +571,23 @@ class PcapFile(object):
         self._network = network
         
     def _ParsePacketHeader(self , thePacketHeader):
-        format = self._endian + 'IIII'
-        timestampSec,timestampMicrosec,lenData,origLenData = struct.unpack(format,thePacketHeader)
+        timestampSec,timestampMicrosec,lenData,origLenData = self._packetHeaderStruct.unpack(thePacketHeader)
         return (timestampSec,timestampMicrosec,lenData,origLenData)
     
     
     
 class RawPacket(object):
-    def __init__(self , packetData , timestampSec,timestampMicrosec,lenData,origLenData):
+    def __init__(self , packetData , timestampSec,timestampMicrosec,lenData,origLenData , offset = None ,
+                 interfaceId = 0 , linkType = None , recordLength = None):
         self.raw = packetData
         self.captureTimestampSec = timestampSec
         self.captureTimestampMicrosec = timestampMicrosec
         self.lenData = lenData
-        self.origLenData = origLenData
\ No newline at end of file
+        self.origLenData = origLenData
+        self.offset = offset    # offset of the packet header (pcapng: block) in the file
+        self.interfaceId = interfaceId
+        self.linkType = linkType
+        # size of the packet in the file, including its header
+        if recordLength is None:
+            recordLength = PcapFile.PACKET_HEADER_SIZE + lenData
+        self.recordLength = recordLength
\ No newline at end of file
@@ -0,0 +1,291 @@
+import os
+import struct
+import sys
+import tempfile
+import time
+import datetime
+from array import array
+from bisect import bisect_right
+
+from pyWire.capture.fileformats.PcapFile import PcapFile
+
+class PcapIndex(object):
+    '''
+    Index of the packets of a pcap file - the offset, timestamp and length of each packet,
+    kept in fixed width arrays (frame number i is at index i-1).
+    The index is saved next to the pcap file (pcap path + INDEX_SUFFIX), and is built again
+    when the pcap file size or modification time changes.
+
+    Index file format (little endian):
+        8s      magic           INDEX_MAGIC
+        Q       pcapSize        size of the indexed pcap file
+        d       pcapMtime       modification time of the indexed pcap file
+        Q       count           number of packets
+        B       isSorted        1 if the timestamps are not decreasing
+        d[count] offsets        offset of each packet header in the pcap (double, to support files over 4GB)
+        I[count] tsSec          timestamp seconds
+        I[count] tsUsec         timestamp microseconds
+        I[count] inclLen        number of bytes of packet saved in the file
+        I[count] origLen        actual length of packet
+    '''
+    INDEX_SUFFIX = '.pwidx'
+    INDEX_MAGIC = 'PWIDX001'
+    _HEADER = struct.Struct('<8sQdQB')
+    _ARRAYS = (('offsets' , 'd') , ('tsSec' , 'I') , ('tsUsec' , 'I') , ('inclLen' , 'I') , ('origLen' , 'I'))
+
+    def __init__(self):
+        for arrayName , typeCode in PcapIndex._ARRAYS:
+            setattr(self , arrayName , array(typeCode))
+        self.isSorted = True
+
+    @staticmethod
+    def Load(pcapPath , indexPath = None , save = True):
+        '''
+        Return the index of the given pcap file.
+        The index is read from indexPath (default is next to the pcap file) if it is up to date,
+        otherwise it is built, and saved if save is True (failing to save is ignored).
+        '''
+        if indexPath is None:
+            indexPath = pcapPath + PcapIndex.INDEX_SUFFIX
+        pcapStat = os.stat(pcapPath)
+        index = PcapIndex._Read(indexPath , pcapStat)
+        if index is None:
+            index = PcapIndex.Build(pcapPath)
+            if save:
+                try:
+                    index._Write(indexPath , pcapStat)
+                except (IOError , OSError):
+                    pass
+        return index
+
+    @staticmethod
+    def Build(pcapPath):
+        '''
+        Build the index of the given pcap file, by reading all the packets headers.
+        '''
+        index = PcapIndex()
+        lastTime = (0 , 0)
+        for data , tsSec , tsUsec , lenData , origLenData , offset in PcapFile(pcapPath).ReadPacketsMapped():
+            index.offsets.append(offset)
+            index.tsSec.append(tsSec)
+            index.tsUsec.append(tsUsec)
+            index.inclLen.append(lenData)
+            index.origLen.append(origLenData)
+            packetTime = (tsSec , tsUsec)
+            if packetTime < lastTime:
+                index.isSorted = False
+            lastTime = packetTime
+        return index
+
+    @staticmethod
+    def _Read(indexPath , pcapStat):
+        try:
+            with open(indexPath , 'rb') as indexFile:
+                header = indexFile.read(PcapIndex._HEADER.size)
+                if len(header) < PcapIndex._HEADER.size:
+                    return None
+                magic , pcapSize , pcapMtime , count , isSorted = PcapIndex._HEADER.unpack(header)
+                if magic != PcapIndex.INDEX_MAGIC or pcapSize != pcapStat.st_size or pcapMtime != pcapStat.st_mtime:
+                    return None
+                index = PcapIndex()
+                index.isSorted = bool(isSorted)
+                for arrayName , typeCode in PcapIndex._ARRAYS:
+                    theArray = getattr(index , arrayName)
+                    theArray.fromfile(indexFile , count)
+                    if sys.byteorder == 'big':
+                        theArray.byteswap()
+                return index
+        except (IOError , EOFError , struct.error):
+            return None
+
+    def _Write(self , indexPath , pcapStat):
+        # write to a temporary file first, so a partial index is never read. its name is unique, so processes
+        # which index the same file do not write to the same temporary file
+        fd , tmpPath = tempfile.mkstemp(prefix = os.path.basename(indexPath) + '.' , suffix = '.tmp' ,
+                                        dir = os.path.dirname(os.path.abspath(indexPath)))
+        try:
+            with os.fdopen(fd , 'wb') as indexFile:
+                indexFile.write(PcapIndex._HEADER.pack(PcapIndex.INDEX_MAGIC , pcapStat.st_size , pcapStat.st_mtime ,
+                                                       len(self) , int(self.isSorted)))
+                for arrayName , typeCode in PcapIndex._ARRAYS:
+                    theArray = getattr(self , arrayName)
+                    if sys.byteorder == 'big':
+                        theArray = array(typeCode , theArray)
+                        theArray.byteswap()
+                    theArray.tofile(indexFile)
+            # mkstemp creates the file readable only by its owner
+            os.chmod(tmpPath , 0o644)
+            if os.name == 'nt' and os.path.exists(indexPath):
+                # rename replaces the existing index atomically, except on windows
+                os.remove(indexPath)
+            os.rename(tmpPath , indexPath)
+        except:
+            os.remove(tmpPath)
+            raise
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def GetOffset(self , frameNumber):
+        ''' return the offset of the packet header in the pcap file '''
+        return int(self.offsets[frameNumber - 1])
+
+    def GetRecordSize(self , frameNumber):
+        ''' return the size of the packet in the pcap file, including its header '''
+        return PcapFile.PACKET_HEADER_SIZE + self.inclLen[frameNumber - 1]
+
+    def GetTime(self , frameNumber):
+        ''' return the timestamp of the packet (seconds since epoch, as float) '''
+        return self.tsSec[frameNumber - 1] + self.tsUsec[frameNumber - 1] / 1000000.0
+
+    def SelectFrames(self , start_time = None , end_time = None , frame_range = None):
+        '''
+        Return FrameSelection of the packets captured in [start_time , end_time), and in frame_range.
+        start_time, end_time - seconds since epoch (float), or datetime objects (local time).
+        frame_range - tuple of (first , last) frame numbers, both included. either may be None.
+        '''
+        first , last = 1 , len(self)
+        if frame_range is not None:
+            if frame_range[0] is not None:
+                first = max(first , frame_range[0])
+            if frame_range[1] is not None:
+                last = min(last , frame_range[1])
+        if start_time is None and end_time is None:
+            return FrameSelection([(first , last)] if first <= last else [])
+
+        startKey = _TimeKey(start_time)
+        endKey = _TimeKey(end_time)
+        if self.isSorted:
+            # binary search on the timestamps
+            if startKey is not None:
+                first = max(first , self._BisectTime(startKey) + 1)
+            if endKey is not None:
+                last = min(last , self._BisectTime(endKey))
+            return FrameSelection([(first , last)] if first <= last else [])
+
+        selection = FrameSelection()
+        tsSec , tsUsec = self.tsSec , self.tsUsec
+        for frameNumber in xrange(first , last + 1):
+            packetKey = (tsSec[frameNumber - 1] , tsUsec[frameNumber - 1])
+            if (startKey is None or packetKey >= startKey) and (endKey is None or packetKey < endKey):
+                selection.Append(frameNumber)
+        return selection
+
+    def _BisectTime(self , timeKey):
+        ''' return the number of packets captured before timeKey (the index must be sorted) '''
+        tsSec , tsUsec = self.tsSec , self.tsUsec
+        low , high = 0 , len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if (tsSec[middle] , tsUsec[middle]) < timeKey:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+def _TimeKey(theTime):
+    '''
+    return tuple (seconds , microseconds) of a time given as seconds since epoch or datetime (local time).
+    '''
+    if theTime is None:
+        return None
+    if isinstance(theTime , datetime.datetime):
+        return (int(time.mktime(theTime.timetuple())) , theTime.microsecond)
+    seconds = int(theTime)
+    return (seconds , int(round((theTime - seconds) * 1000000)))
+
+class FrameSelection(object):
+    '''
+    Ordered set of frame numbers, kept as runs of consecutive frames.
+    The i'th frame of the selection (starting from 1) is the frame numbered i by tshark, when only
+    the selected frames are fed to it.
+    '''
+    def __init__(self , runs = None):
+        self._runs = []         # list of [first , last]
+        self._runStarts = []    # number of selected frames before each run
+        self._count = 0
+        for first , last in (runs or []):
+            self.AppendRun(first , last)
+
+    def Append(self , frameNumber):
+        '''
+        add a frame, which must be after all the frames in the selection.
+        '''
+        if self._runs and self._runs[-1][1] + 1 == frameNumber:
+            self._runs[-1][1] = frameNumber
+            self._count += 1
+        else:
+            self.AppendRun(frameNumber , frameNumber)
+
+    def AppendRun(self , first , last):
+        '''
+        add the frames first..last (included), which must be after all the frames in the selection.
+        '''
+        self._runs.append([first , last])
+        self._runStarts.append(self._count)
+        self._count += last - first + 1
+
+    def __len__(self):
+        return self._count
+
+    def GetFrameNumber(self , selectionNumber):
+        '''
+        return the frame number of the i'th selected frame (starts from 1).
+        '''
+        runIndex = bisect_right(self._runStarts , selectionNumber - 1) - 1
+        return self._runs[runIndex][0] + (selectionNumber - 1 - self._runStarts[runIndex])
+
+    def IterateRuns(self):
+        '''
+        iterate over tuples (first , last) of the runs of consecutive frames.
+        '''
+        for first , last in self._runs:
+            yield (first , last)
+
+    def IterateFrames(self):
+        '''
+        iterate over the selected frame numbers.
+        '''
+        for first , last in self._runs:
+            for frameNumber in xrange(first , last + 1):
+                yield frameNumber
+
+    def Split(self , count):
+        '''
+        split to at most count selections of consecutive frames, of about the same size.
+        return list of FrameSelection.
+        '''
+        parts = []
+        partSize = max(1 , -(-self._count // count))
+        part = FrameSelection()
+        for first , last in self._runs:
+            while first <= last:
+                taken = min(last - first + 1 , partSize - len(part))
+                part.AppendRun(first , first + taken - 1)
+                first += taken
+                if len(part) == partSize:
+                    parts.append(part)
+                    part = FrameSelection()
+        if len(part) > 0:
+            parts.append(part)
+        return parts
+
+    def SplitInterleaved(self , count , chunkSize):
+        '''
+        split to chunks of chunkSize consecutive frames, which are dealt to at most count selections
+        in turn (chunk i goes to selection i % count).
+        return list of FrameSelection.
+        '''
+        parts = [FrameSelection() for i in xrange(count)]
+        chunkIndex = 0
+        chunkTaken = 0
+        for first , last in self._runs:
+            while first <= last:
+                taken = min(last - first + 1 , chunkSize - chunkTaken)
+                parts[chunkIndex % count].AppendRun(first , first + taken - 1)
+                first += taken
+                chunkTaken += taken
+                if chunkTaken == chunkSize:
+                    chunkIndex += 1
+                    chunkTaken = 0
+        return [part for part in parts if len(part) > 0]
@@ -0,0 +1,104 @@
+'''
+    PcapStats
+
+    Volume and timing statistics of a pcap file, computed from the packets headers only (no tshark).
+    The headers are scanned once into a NumPy structured array (see ScanPcapHeaders), which all
+    the other functions receive.
+
+    Requires NumPy.
+'''
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from pyWire.capture.fileformats.PcapIndex import PcapIndex
+
+HEADERS_DTYPE = [('ts_sec' , '<u4') , ('ts_usec' , '<u4') , ('incl_len' , '<u4') , ('orig_len' , '<u4') ,
+                 ('offset' , '<u8')]
+
+def _RequireNumpy():
+    if np is None:
+        raise ImportError('PcapStats requires NumPy (pip install numpy)')
+
+def ScanPcapHeaders(pcapPath , save_index = False):
+    '''
+    Return NumPy structured array of the headers of all the packets in the file, with the fields
+    ts_sec, ts_usec, incl_len, orig_len and offset (element i is frame number i+1).
+    The headers are taken from the index of the file (see PcapIndex), which is built if needed.
+    By default nothing is written - if save_index is True the index is saved next to the file, so the
+    next scan reads only the index.
+    '''
+    _RequireNumpy()
+    index = PcapIndex.Load(pcapPath , save = save_index)
+    headers = np.empty(len(index) , dtype = HEADERS_DTYPE)
+    if len(index) == 0:
+        return headers
+    # the index arrays are copied in bulk, not packet by packet
+    headers['ts_sec'] = np.frombuffer(index.tsSec , dtype = np.uint32)
+    headers['ts_usec'] = np.frombuffer(index.tsUsec , dtype = np.uint32)
+    headers['incl_len'] = np.frombuffer(index.inclLen , dtype = np.uint32)
+    headers['orig_len'] = np.frombuffer(index.origLen , dtype = np.uint32)
+    headers['offset'] = np.frombuffer(index.offsets , dtype = np.float64)
+    return headers
+
+def GetTimes(headers):
+    '''
+    Return array of the packets timestamps (seconds since epoch, as float).
+    '''
+    _RequireNumpy()
+    return headers['ts_sec'] + headers['ts_usec'] / 1000000.0
+
+def GetRatePerSecond(headers):
+    '''
+    Return tuple of arrays (seconds , packets , bytes) - the number of packets and bytes (original length)
+    captured in each second, from the first second to the last one (including empty seconds).
+    '''
+    _RequireNumpy()
+    if len(headers) == 0:
+        return (np.zeros(0 , np.int64) , np.zeros(0 , np.int64) , np.zeros(0 , np.int64))
+    firstSecond = int(headers['ts_sec'].min())
+    bins = (headers['ts_sec'] - firstSecond).astype(np.int64)
+    packets = np.bincount(bins)
+    byteCounts = np.bincount(bins , weights = headers['orig_len']).astype(np.int64)
+    seconds = np.arange(firstSecond , firstSecond + len(packets))
+    return (seconds , packets , byteCounts)
+
+def GetSizeHistogram(headers , bins = (0 , 64 , 128 , 256 , 512 , 1024 , 1518 , 9000 , 65536)):
+    '''
+    Return tuple of arrays (counts , bin edges) - histogram of the packets sizes (original length).
+    bins - number of bins, or sequence of bin edges (default is common ethernet size ranges).
+    '''
+    _RequireNumpy()
+    return np.histogram(headers['orig_len'] , bins = bins)
+
+def FindGaps(headers , min_gap):
+    '''
+    Return tuple of arrays (frame numbers , gaps) - the frames that were captured more than min_gap seconds
+    after the previous frame, and the time (seconds) between them.
+    '''
+    _RequireNumpy()
+    deltas = np.diff(GetTimes(headers))
+    gapIndices = np.flatnonzero(deltas > min_gap)
+    # delta i is between frame i+1 and frame i+2
+    return (gapIndices + 2 , deltas[gapIndices])
+
+def GetSummary(headers):
+    '''
+    Return dictionary of the totals of the capture: packets, bytes, captured_bytes, start_time, end_time,
+    duration, packets_per_second and bytes_per_second (averages over the duration).
+    '''
+    _RequireNumpy()
+    summary = {'packets' : len(headers) ,
+               'bytes' : int(headers['orig_len'].sum()) ,
+               'captured_bytes' : int(headers['incl_len'].sum())}
+    if len(headers) == 0:
+        return summary
+    times = GetTimes(headers)
+    summary['start_time'] = float(times.min())
+    summary['end_time'] = float(times.max())
+    summary['duration'] = summary['end_time'] - summary['start_time']
+    if summary['duration'] > 0:
+        summary['packets_per_second'] = summary['packets'] / summary['duration']
+        summary['bytes_per_second'] = summary['bytes'] / summary['duration']
+    return summary
@@ -1,11 +1,10 @@
 import time
-import tempfile
-import os
 
 from pyWire.packet.packet import Packet
-from pyWire.capture.file_capture import FileCapture
+from pyWire.capture.capture import Capture
 from pyWire.capture.fileformats.PcapFile import PcapFile
 from pyWire.capture.callbacks import Callback
+from pyWire.capture.tshark_worker import GetTSharkWorker
 
 class LinkTypes(object):
     NULL = 0
@@ -14,50 +13,83 @@ class LinkTypes(object):
     PPP = 9
     IEEE802_11 = 105
 
-class InMemCapture(FileCapture):
+class InMemCapture(Capture):
     """"
     A class representing a capture read from memory - list of packets.
-    It does use temporary file though.
+    The packets are dissected by a tshark worker, which is shared by all the in-mem captures with the
+    same display filter and options (see pyWire.capture.tshark_worker).
+    By default the tshark process of the worker keeps its state between the in-mem captures (see shared_state).
     """
     def __init__(self, packet_list, display_filter=None,
-                  decryption_key=None, encryption_type='wpa-pwk'):
+                  decryption_key=None, encryption_type='wpa-pwk', layers=None,
+                  decoder=None, shared_state=True):
         """
         Creates a new in-mem capture, a capture capable of receiving binary packets and parsing them using tshark.
-        Currently opens a new instance of tshark for every packet buffer,
-        so it is very slow -- try inserting more than one packet at a time if possible.
-        
+        The packets are written directly to the tshark process of the worker of the display filter and options,
+        which is started ahead for the next capture.
+
         :param packet_list: The packets list. May contain packet objects or raw bytes of packets as strings.
         :param display_filter: Display (wireshark) filter to use.
         :param decryption_key: Key used to encrypt and decrypt captured traffic.
         :param encryption_type: Standard of encryption used in captured traffic (must be either 'WEP', 'WPA-PWD',
         or 'WPA-PWK'. Defaults to WPA-PWK).
+        :param layers: Dissect only these protocols (eg: ['ip', 'tcp', 'http']), the other layers are not in the
+        packets. The frame layer is kept only if it is listed. Requires tshark 2.2 or newer, and can not be used with
+        fields (raises ValueError).
+        :param decoder: Format of tshark output and its decoder - 'pdml' (default) or 'json' (faster to parse,
+        requires tshark 2.2 or newer). JSON packets are always compact, and their fields have no raw value.
+        :param shared_state: Dissect by a single long lived tshark process (default), which keeps its state between
+        the in-mem captures with the same options, as if they were one capture - so tcp analysis (retransmissions,
+        duplicate acks), reassembly, tcp.stream numbers, relative times and geninfo.num continue from the previous
+        captures. packet.frame_number is always the number in the capture. If False, tshark is restarted after
+        every capture, so each capture is dissected with clean state, as if it was a file of its own - at the cost
+        of a tshark start for every capture.
         """
-        theTmpFile = tempfile.NamedTemporaryFile(prefix = 'pyWire_InMem_tmp_')
-        self.tmpFileName = theTmpFile.name
-        del(theTmpFile)
-        thePcapFile = PcapFile(self.tmpFileName)
+        super(InMemCapture, self).__init__(display_filter=display_filter,
+                                           decryption_key=decryption_key, encryption_type=encryption_type,
+                                           layers=layers, decoder=decoder)
+        self._decryption_key = decryption_key
+        self._encryption_type = encryption_type
+        self.shared_state = shared_state
+        self._records = []
         for i , pkt in enumerate(packet_list):
             if type(pkt) == Packet:
-                thePcapFile.WritePacket(pkt)
+                sec , microSec = PcapFile.GetPacketTimestamp(pkt)
+                self._records.append((pkt.GetRaw() , sec , microSec))
             elif type(pkt) == str:
                 curTime = time.time()
-                thePcapFile._WritePacket(pkt , int(curTime) , curTime-int(curTime))
+                self._records.append((pkt , int(curTime) , int((curTime-int(curTime)) * 1000000)))
             else:
                 print 'Warning, skipping %d packet - unknown format' % i
-        thePcapFile.Close()
-        super(InMemCapture, self).__init__( input_file = self.tmpFileName , display_filter=display_filter,
-                                           decryption_key=decryption_key, encryption_type=encryption_type)
-    
-    def __del__(self):
-        os.remove(self.tmpFileName)
-        
-def InMemFilterPackets(pktList , display_filter):
+
+    def _iterate_packets(self):
+        """
+        Dissect all the packets, and return them one by one.
+        See Capture._iterate_packets. timeout is ignored, as the packets are dissected in a single batch.
+        """
+        worker = GetTSharkWorker(self._get_display_filter() , self._decryption_key , self._encryption_type ,
+                                 self.fields , self.fields_type , self.layers , self.decoder , self.shared_state)
+        records = self._records
+        if self._packet_count and not self._get_display_filter() and self._where_remainder is None:
+            # every packet is passed, so the packets after packet_count can never be passed to the callback
+            records = records[:self._packet_count]
+
+        for packet in worker.Dissect(records , self.fields_type , self.lazy , self.compact):
+            yield packet
+
+    def __repr__(self):
+        return '<%s %d packets>' % (self.__class__.__name__, len(self._records))
+
+def InMemFilterPackets(pktList , display_filter , shared_state = True):
     '''
         Filter the given packet list using the given display filter.
         Return a new list with the filtered packets.
+        By default tshark keeps its state from the previous lists, so filters on state between packets
+        (eg: tcp.analysis.retransmission) may match because of packets of previous lists. With shared_state False
+        the packets are dissected with clean state, and give the same results as a file of these packets.
     '''
-    cap = InMemCapture(pktList , display_filter)
+    cap = InMemCapture(pktList , display_filter , shared_state = shared_state)
     newList = []
     cap.apply_on_packets(Callback.CB_AddPacketToList , args = newList)
     del(cap)
-    return newList
\ No newline at end of file
+    return newList
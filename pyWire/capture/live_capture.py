@@ -1,14 +1,18 @@
-from pyWire.capture.capture import Capture,PacketsSource,TSharkCrashException
+from pyWire.capture.capture import Capture,PacketsSource,TSharkCrashException,CapturePipeline,GetFromQueue,POLL_INTERVAL
 from pyWire.tshark.tshark import get_tshark_interfaces, get_tshark_path
 from pyWire.capture.fileformats.PcapFile import PcapFile
+from pyWire.capture.raw_store import StreamRawStore
 from pyWire.capture.callbacks import Callback
 
 import os
 import subprocess
+import time
+import heapq
+import Queue
 from threading import Thread
 
-# patch for pipe problem when using display_filter
-from bigPipe import bigPipe
+# buffer for the raw packets, when tshark is slower than dumpcap (eg: when using display_filter)
+from pyWire.capture.ring_buffer import RingBuffer
 
 class LiveCapture(Capture):
     """
@@ -16,7 +20,9 @@ class LiveCapture(Capture):
     """
 
     def __init__(self, interface=None, bpf_filter=None, display_filter=None, decryption_key=None,
-                 encryption_type='wpa-pwk'):
+                 encryption_type='wpa-pwk', buffer_memory_limit=RingBuffer.DEFAULT_MEMORY_LIMIT,
+                 buffer_spill_dir=None, parallel_interfaces=False, merge_ordered=True, merge_window=1.0,
+                 layers=None, decoder=None):
         """
         Creates a new live capturer on a given interface. Does not start the actual capture itself.
 
@@ -26,9 +32,30 @@ class LiveCapture(Capture):
         :param decryption_key: Optional key used to encrypt and decrypt captured traffic.
         :param encryption_type: Standard of encryption used in captured traffic (must be either 'WEP', 'WPA-PWD', or
         'WPA-PWK'. Defaults to WPA-PWK).
+        :param buffer_memory_limit: Max bytes of raw packets to keep in memory until tshark dissects them.
+        More raw packets are kept in a temporary file.
+        :param buffer_spill_dir: Directory of the temporary file (default is the temp directory).
+        :param parallel_interfaces: When capturing from several interfaces, run dumpcap and tshark for each
+        interface, so the interfaces are dissected in parallel. packet.frame_number is then the number of the
+        packet in its interface.
+        :param merge_ordered: With parallel_interfaces, pass the packets to the callback ordered by timestamp.
+        Otherwise they are passed as soon as they are dissected.
+        :param merge_window: With merge_ordered, max seconds to hold a packet while waiting for packets of
+        other (idle) interfaces. Packets which arrive later than that may be out of order.
+        :param layers: Dissect only these protocols (eg: ['ip', 'tcp', 'http']), the other layers are not in the
+        packets. The frame layer is kept only if it is listed. Requires tshark 2.2 or newer, and can not be used with
+        fields (raises ValueError).
+        :param decoder: Format of tshark output and its decoder - 'pdml' (default) or 'json' (faster to parse,
+        requires tshark 2.2 or newer). JSON packets are always compact, and their fields have no raw value.
         """
-        super(LiveCapture, self).__init__(display_filter=display_filter, decryption_key=decryption_key, encryption_type=encryption_type)
+        super(LiveCapture, self).__init__(display_filter=display_filter, decryption_key=decryption_key, encryption_type=encryption_type,
+                                          layers=layers, decoder=decoder)
         self.bpf_filter = bpf_filter
+        self.buffer_memory_limit = buffer_memory_limit
+        self.buffer_spill_dir = buffer_spill_dir
+        self.parallel_interfaces = parallel_interfaces
+        self.merge_ordered = merge_ordered
+        self.merge_window = merge_window
         
         if interface is None:
             interfacesList = get_tshark_interfaces()
@@ -38,17 +65,90 @@ class LiveCapture(Capture):
                 self.interfaces = interface
             else:
                 self.interfaces = [interface]
-        # BUG
-        # dump cap write to standard output in PCAPNG format when capturing from multiple interfaces
-        # tshark can only read pcap format from standard input.
-        if len(self.interfaces) > 1:
-            raise NotImplementedError("Capturing from multiple interfaces doesn't work currently, sorry!")
+        # dumpcap writes pcapng when capturing from multiple interfaces, which both tshark and PcapFile read.
        
        
     @staticmethod
     def GetInterfaces():
         return get_tshark_interfaces()
 
+    def _iterate_packets(self):
+        """
+        See Capture._iterate_packets.
+        With parallel_interfaces, the packets of all the interfaces are merged (see LiveCapture.__init__), and
+        packet_count and timeout limit the whole capture.
+        """
+        if not self.parallel_interfaces or len(self.interfaces) < 2:
+            return super(LiveCapture, self)._iterate_packets()
+        return self._IterateInterfacesPipelines()
+
+    def _IterateInterfacesPipelines(self):
+        packetsQueue = Queue.Queue()
+        pipelines = [InterfacePipeline(self , interfaceIndex) for interfaceIndex in xrange(len(self.interfaces))]
+        try:
+            for pipeline in pipelines:
+                pipeline.Start(packetsQueue)
+            if self.merge_ordered:
+                packets = self._IterateOrdered(packetsQueue , pipelines)
+            else:
+                packets = self._IterateUnordered(packetsQueue , pipelines)
+            for packet in packets:
+                yield packet
+        finally:
+            for pipeline in pipelines:
+                pipeline.Stop()
+
+    def _IterateUnordered(self , packetsQueue , pipelines):
+        running = len(pipelines)
+        while running:
+            item = GetFromQueue(packetsQueue)
+            if item is None:
+                continue
+            interfaceIndex , packet = item
+            if packet is None:
+                running -= 1
+                pipelines[interfaceIndex].RaiseError()
+                continue
+            yield packet
+
+    def _IterateOrdered(self , packetsQueue , pipelines):
+        '''
+        k-way merge of the packets of the pipelines by their timestamp.
+        The first packet is passed when every running pipeline has a packet waiting (each pipeline is ordered),
+        or when it waited merge_window seconds.
+        '''
+        heap = []           # (timestamp , sequence , arrival time , pipeline index , packet)
+        waiting = [0] * len(pipelines)
+        running = set(xrange(len(pipelines)))
+        sequence = 0
+        while running or heap:
+            while heap:
+                arrivalTime , interfaceIndex , packet = heap[0][2:]
+                if time.time() < arrivalTime + self.merge_window and \
+                   any(waiting[index] == 0 for index in running):
+                    break
+                heapq.heappop(heap)
+                waiting[interfaceIndex] -= 1
+                yield packet
+            if not running:
+                continue
+
+            timeout = POLL_INTERVAL
+            if heap:
+                timeout = max(0 , heap[0][2] + self.merge_window - time.time())
+            item = GetFromQueue(packetsQueue , timeout)
+            if item is None:
+                continue
+            interfaceIndex , packet = item
+            if packet is None:
+                running.discard(interfaceIndex)
+                pipelines[interfaceIndex].RaiseError()
+                continue
+            timestamp = packet.timestamp if self.fields else float(packet.sniff_timestamp)
+            heapq.heappush(heap , (timestamp , sequence , time.time() , interfaceIndex , packet))
+            sequence += 1
+            waiting[interfaceIndex] += 1
+
     def GetPacketsSource(self):
         '''
         This function should return PacketsSource object, which should implement:
@@ -57,14 +157,17 @@ class LiveCapture(Capture):
             GetNextRawPacket
             ClosePacketsSource
         '''
-        return LivePacketsSource(self.interfaces , self.bpf_filter , self._packet_count , self._timeout)
+        return LivePacketsSource(self.interfaces , self.bpf_filter , self._get_stop_count() , self._timeout ,
+                                 self.buffer_memory_limit , self.buffer_spill_dir)
         
 class LivePacketsSource(PacketsSource):
-    _BATCH_SIZE = 4096
-    _MAX_INTERNAL_BUFFER = 4096*5000 # 200M
-    def __init__(self , interfaces , bpf_filter , packetCount , timeout):
+    _BATCH_SIZE = 64 * 1024
+    def __init__(self , interfaces , bpf_filter , packetCount , timeout ,
+                 bufferMemoryLimit = RingBuffer.DEFAULT_MEMORY_LIMIT , bufferSpillDir = None):
         self._interfaces = interfaces
         self._bpf_filter = bpf_filter
+        self._bufferMemoryLimit = bufferMemoryLimit
+        self._bufferSpillDir = bufferSpillDir
         
         self._packet_count = packetCount
         self._timeout = timeout
@@ -79,7 +182,7 @@ class LivePacketsSource(PacketsSource):
         
         self._feeder = os.fdopen(self._tsharkFeeder,'rb')
         self._pcapFile = PcapFile(self._pcapFeeder)
-        self._pktGen = self._pcapFile.ReadPackets()
+        self._rawStore = StreamRawStore(self._pcapFile)
         self._curPktNum = 0
     
     def _StartDistributeThread(self):
@@ -87,10 +190,10 @@ class LivePacketsSource(PacketsSource):
         self._tsharkFeeder , input1 = os.pipe()
         #self._pcapFeeder , input2 = os.pipe()
         
-        ##########  patch for using display filter, because pipe may fill before relevant packet arrive
-        self._pcapFeeder = bigPipe(LivePacketsSource._MAX_INTERNAL_BUFFER)
+        # the raw packets are buffered until tshark dissects them, because the pipe may fill before relevant
+        # packet arrive (when using display filter). it never blocks dumpcap, and spills to disk when big.
+        self._pcapFeeder = RingBuffer(self._bufferMemoryLimit , self._bufferSpillDir)
         input2 = self._pcapFeeder
-        ##########
         
         args = (source, input1 , input2)
         return Thread(target = LivePacketsSource._DistributeWorker , args = args)
@@ -98,20 +201,20 @@ class LivePacketsSource(PacketsSource):
     @staticmethod
     def _DistributeWorker(source, input1 , input2):
         '''
-        This thread takes input from a single pipe, and copy it to two pipes.
+        This thread takes input from a single pipe, and copy it to a pipe and a buffer.
         '''
-        data = source.read(LivePacketsSource._BATCH_SIZE)
+        # os.read returns whatever is available, so packets are not delayed until a whole batch arrives
+        sourceFd = source.fileno()
+        data = os.read(sourceFd , LivePacketsSource._BATCH_SIZE)
         while data is not None and data != '':
             os.write(input1 , data)
-            #os.write(input2 , data)
             input2.write(data)
 
-            data = source.read(LivePacketsSource._BATCH_SIZE)
+            data = os.read(sourceFd , LivePacketsSource._BATCH_SIZE)
 
         # thread will exit when the source is closed
         os.close(input1)    # will stop thsark feed
-        #os.close(input2)    # will stop the pcap object feed
-        pass
+        input2.EndOfWrite() # will stop the pcap object feed
     
     def _GetDumpcapProcess(self):
         tsharkPath = get_tshark_path()
@@ -119,9 +222,12 @@ class LivePacketsSource(PacketsSource):
         thsarkBinName = os.path.basename(tsharkPath)
         dumpcapBinName = thsarkBinName.replace('tshark','dumpcap')
         dumpcapPath = os.path.join(wiresharkDir , dumpcapBinName)
-        parameters = [dumpcapPath, '-P', '-q' , '-t' , '-w' , '-']
-        # -P = pcap format, -q = dont print packet counts, -t = use thread per interface
+        parameters = [dumpcapPath, '-q' , '-t' , '-w' , '-']
+        # -q = dont print packet counts, -t = use thread per interface
         # -w - = write to standard output
+        if not self._interfaces or len(self._interfaces) == 1:
+            # -P = pcap format. pcapng is needed for multiple interfaces (the interface of each packet)
+            parameters += ['-P']
         
         if self._packet_count:
             parameters += ['-c', str(self._packet_count)]
@@ -146,13 +252,13 @@ class LivePacketsSource(PacketsSource):
         
     def GetNextRawPacket(self , packetNumber = None):
         if packetNumber is None:
-            self._curPktNum += 1
-            return self._pktGen.next().raw
-        else:
-            while self._curPktNum < packetNumber:
-                curRawPkt = self._pktGen.next().raw
-                self._curPktNum += 1
-            return curRawPkt
+            packetNumber = self._curPktNum + 1
+        self._curPktNum = packetNumber
+        return self._rawStore.GetRawPacket(packetNumber)
+
+    def ReleaseRawPackets(self , packetNumber):
+        # the raw packets are buffered until they are read
+        self.GetNextRawPacket(packetNumber)
         
     def ClosePacketsSource(self):
         if self._feeder:
@@ -167,6 +273,25 @@ class LivePacketsSource(PacketsSource):
             self._outputText = self._dumpcap_process.stderr.read()
             print self._outputText
 
+class InterfacePipeline(CapturePipeline):
+    '''
+    dumpcap and tshark of a single interface of a LiveCapture with parallel_interfaces.
+    '''
+    def __init__(self , liveCapture , interfaceIndex):
+        self.interface = liveCapture.interfaces[interfaceIndex]
+        packetsSource = LivePacketsSource([self.interface] , liveCapture.bpf_filter , liveCapture._get_stop_count() ,
+                                          liveCapture._timeout , liveCapture.buffer_memory_limit ,
+                                          liveCapture.buffer_spill_dir)
+        super(InterfacePipeline, self).__init__(liveCapture , packetsSource , interfaceIndex)
+
+    def PreparePacket(self , packet):
+        # the number of the interface in the LiveCapture, as in pcapng of all the interfaces (records have none)
+        if self.fields is None:
+            packet.interface_captured = str(self.pipelineIndex)
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.interface)
+
 def GetSamplePackets(interface = '1' , timeout = 10 , packet_count = 50):
     pktList = []
     cap = LiveCapture(interface)
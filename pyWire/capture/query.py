@@ -0,0 +1,325 @@
+'''
+Predicates over the fields and protocols of packets, for Capture.where.
+
+Usage:
+    cap.where(Field('udp.port') == 53 , Protocol('dns') , Field('dns.qry.name').Contains('example'))
+    cap.where((Field('ip.src') == '10.0.0.1') | (Field('ip.dst') == '10.0.0.1'))
+    cap.where(lambda pkt: len(pkt.layers) > 4)
+
+The predicates (and the parts of a conjunction) which can be written as a display filter are passed to tshark,
+so packets which do not match are not written by tshark nor parsed. The rest (eg: python functions) are evaluated
+on the packets, which are created in lazy mode so only the fields they access are created.
+'''
+import re
+
+from pyWire.packet.field_path import compile_path
+
+# values which are written to the display filter without quotes - numbers and addresses (ip, ipv6, ether)
+_BARE_VALUE = re.compile(r'^[0-9A-Fa-f:.\-/]+$')
+
+class Predicate(object):
+    '''
+    Base class of the predicates. Predicates are combined with & (and), | (or) and ~ (not).
+    '''
+    def __and__(self , other):
+        return And(self , MakePredicate(other))
+
+    def __or__(self , other):
+        return Or(self , MakePredicate(other))
+
+    def __invert__(self):
+        return Not(self)
+
+    def GetDisplayFilter(self):
+        '''
+        return the predicate as display filter, or None if it can not be written as one.
+        '''
+        return None
+
+    def Match(self , packet):
+        '''
+        return whether the packet matches the predicate.
+        '''
+        raise NotImplementedError()
+
+    def CanMatch(self):
+        '''
+        return whether the predicate can be evaluated on packets (see DisplayFilter).
+        '''
+        return True
+
+    def Split(self):
+        '''
+        return (display filter , remainder) - the display filter of the parts of the predicate which can be
+        written as one (or None), and a predicate of the rest to evaluate on the packets (or None).
+        '''
+        displayFilter = self.GetDisplayFilter()
+        if displayFilter is not None:
+            return displayFilter , None
+        return None , self
+
+class Field(Predicate):
+    '''
+    A field by its wireshark name (eg: 'ip.src'). As predicate - the field is in the packet.
+    Compared with ==, !=, <, <=, >, >=, Contains and Matches - true if any occurrence of the field matches
+    (as in display filters). The shown value of the field is compared - as number when compared with a number.
+    '''
+    def __init__(self , name):
+        self.name = name
+        self._path = compile_path(name)
+
+    def __eq__(self , value):
+        return Comparison(self , '==' , value)
+
+    def __ne__(self , value):
+        return Not(Comparison(self , '==' , value))
+
+    def __lt__(self , value):
+        return Comparison(self , '<' , value)
+
+    def __le__(self , value):
+        return Comparison(self , '<=' , value)
+
+    def __gt__(self , value):
+        return Comparison(self , '>' , value)
+
+    def __ge__(self , value):
+        return Comparison(self , '>=' , value)
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def Contains(self , value):
+        return Comparison(self , 'contains' , value)
+
+    def Matches(self , regex):
+        return Comparison(self , 'matches' , regex)
+
+    def GetValues(self , packet):
+        '''
+        return list of the shown values of all the occurrences of the field in the packet.
+        '''
+        return self._path(packet)
+
+    def GetDisplayFilter(self):
+        return self.name
+
+    def Match(self , packet):
+        return len(self._path(packet)) > 0
+
+    def __repr__(self):
+        return '<Field %s>' % self.name
+
+class Protocol(Predicate):
+    '''
+    A protocol (layer) by its name (eg: 'dns') - the packet has a layer of this protocol.
+    '''
+    def __init__(self , name):
+        self.name = name.lower()
+
+    def GetDisplayFilter(self):
+        return self.name
+
+    def Match(self , packet):
+        return self.name in packet
+
+    def __repr__(self):
+        return '<Protocol %s>' % self.name
+
+_COMPARE = {
+    '==' : lambda show , value: show == value ,
+    '<' : lambda show , value: show < value ,
+    '<=' : lambda show , value: show <= value ,
+    '>' : lambda show , value: show > value ,
+    '>=' : lambda show , value: show >= value ,
+    'contains' : lambda show , value: value in show ,
+}
+
+class Comparison(Predicate):
+    '''
+    Comparison of the values of a field with a value, see Field.
+    '''
+    def __init__(self , field , op , value):
+        self.field = field
+        self.op = op
+        self.value = value
+        if op == 'matches':
+            regex = re.compile(value)
+            self._compare = lambda show , value: regex.search(show) is not None
+        else:
+            self._compare = _COMPARE[op]
+        if isinstance(value , bool):
+            self._convert = lambda show: show not in ('0' , 'False')
+        elif isinstance(value , (int , long)):
+            self._convert = _ShowToInt
+        elif isinstance(value , float):
+            self._convert = float
+        else:
+            self._convert = None
+
+    def GetDisplayFilter(self):
+        value = self.value
+        if isinstance(value , bool):
+            value = int(value)
+        if isinstance(value , (int , long)):
+            value = str(value)
+        elif isinstance(value , float):
+            value = repr(value)
+        elif self.op in ('contains' , 'matches') or not _BARE_VALUE.match(value):
+            value = '"%s"' % value.replace('\\' , '\\\\').replace('"' , '\\"')
+        return '%s %s %s' % (self.field.name , self.op , value)
+
+    def Match(self , packet):
+        convert = self._convert
+        for show in self.field.GetValues(packet):
+            if show is None:
+                continue
+            if convert is not None:
+                try:
+                    show = convert(show)
+                except ValueError:
+                    continue
+            if self._compare(show , self.value):
+                return True
+        return False
+
+    def __repr__(self):
+        return '<Comparison %s>' % self.GetDisplayFilter()
+
+class DisplayFilter(Predicate):
+    '''
+    A display filter as is (eg: given to where as string). It can not be evaluated on packets, so it can be
+    combined only with and.
+    '''
+    def __init__(self , displayFilter):
+        self.displayFilter = displayFilter
+
+    def GetDisplayFilter(self):
+        return self.displayFilter
+
+    def CanMatch(self):
+        return False
+
+    def Match(self , packet):
+        raise ValueError('Display filter %s can not be evaluated on packets, it can only be combined with and'
+                         % self.displayFilter)
+
+    def __repr__(self):
+        return '<DisplayFilter %s>' % self.displayFilter
+
+class PythonPredicate(Predicate):
+    '''
+    A python function of the packet, which returns whether it matches. Never passed to tshark.
+    '''
+    def __init__(self , function):
+        self.function = function
+
+    def Match(self , packet):
+        return bool(self.function(packet))
+
+    def __repr__(self):
+        return '<PythonPredicate %r>' % self.function
+
+class And(Predicate):
+    def __init__(self , *predicates):
+        self.predicates = []
+        for predicate in predicates:
+            # flatten, so every part of a conjunction which can be a display filter is passed to tshark
+            if isinstance(predicate , And):
+                self.predicates += predicate.predicates
+            else:
+                self.predicates.append(predicate)
+
+    def GetDisplayFilter(self):
+        return _JoinDisplayFilters([predicate.GetDisplayFilter() for predicate in self.predicates] , '&&')
+
+    def CanMatch(self):
+        return all(predicate.CanMatch() for predicate in self.predicates)
+
+    def Match(self , packet):
+        for predicate in self.predicates:
+            if not predicate.Match(packet):
+                return False
+        return True
+
+    def Split(self):
+        displayFilters = []
+        remainders = []
+        for predicate in self.predicates:
+            displayFilter , remainder = predicate.Split()
+            if displayFilter is not None:
+                displayFilters.append(displayFilter)
+            if remainder is not None:
+                remainders.append(remainder)
+        displayFilter = _JoinDisplayFilters(displayFilters , '&&') if displayFilters else None
+        if not remainders:
+            return displayFilter , None
+        if len(remainders) == 1:
+            return displayFilter , remainders[0]
+        return displayFilter , And(*remainders)
+
+    def __repr__(self):
+        return '<And %s>' % ' , '.join(map(repr , self.predicates))
+
+class Or(Predicate):
+    def __init__(self , *predicates):
+        self.predicates = list(predicates)
+
+    def GetDisplayFilter(self):
+        return _JoinDisplayFilters([predicate.GetDisplayFilter() for predicate in self.predicates] , '||')
+
+    def CanMatch(self):
+        return all(predicate.CanMatch() for predicate in self.predicates)
+
+    def Match(self , packet):
+        for predicate in self.predicates:
+            if predicate.Match(packet):
+                return True
+        return False
+
+    def __repr__(self):
+        return '<Or %s>' % ' , '.join(map(repr , self.predicates))
+
+class Not(Predicate):
+    def __init__(self , predicate):
+        self.predicate = predicate
+
+    def GetDisplayFilter(self):
+        displayFilter = self.predicate.GetDisplayFilter()
+        if displayFilter is None:
+            return None
+        return '!(%s)' % displayFilter
+
+    def CanMatch(self):
+        return self.predicate.CanMatch()
+
+    def Match(self , packet):
+        return not self.predicate.Match(packet)
+
+    def __repr__(self):
+        return '<Not %r>' % self.predicate
+
+def _ShowToInt(show):
+    # integer fields are shown in decimal, or in hex with 0x
+    if show.startswith('0x'):
+        return int(show , 16)
+    return int(show)
+
+def _JoinDisplayFilters(displayFilters , operator):
+    if None in displayFilters:
+        return None
+    if len(displayFilters) == 1:
+        return displayFilters[0]
+    return (' %s ' % operator).join('(%s)' % displayFilter for displayFilter in displayFilters)
+
+def MakePredicate(predicate):
+    '''
+    return predicate of a Predicate, display filter string or python function.
+    '''
+    if isinstance(predicate , Predicate):
+        return predicate
+    if isinstance(predicate , basestring):
+        return DisplayFilter(predicate)
+    if callable(predicate):
+        return PythonPredicate(predicate)
+    raise TypeError('Unknown predicate %r' % (predicate ,))
@@ -0,0 +1,93 @@
+from array import array
+from collections import deque
+
+from pyWire.capture.fileformats.PcapFile import PcapFile
+
+class FileRawStore(object):
+    '''
+    Random access to the raw packets of a pcap file by frame number.
+    The offset of every packet is indexed the first time the file is read up to it, so
+    any packet before the furthest one requested is read with a single seek, and packets
+    which are skipped (eg: by a display filter) are never read, only their headers.
+    If a PcapIndex of the file is given, its offsets are used and nothing is indexed.
+    The file is memory mapped, so reading a packet is only a copy of its bytes.
+    '''
+    def __init__(self , pcapFilePath , index = None):
+        self._pcapFile = PcapFile(pcapFilePath)
+        self._pcapFile.Map()
+        if index is None:
+            # offsets as doubles - array has no 64 bit integer type, and files may be bigger than 4GB
+            self._offsets = array('d')
+            self._nextOffset = self._pcapFile.GetFirstPacketOffset()
+        else:
+            self._offsets = index.offsets
+            self._nextOffset = PcapFile.GLOBAL_HEADER_SIZE
+            if len(index) > 0:
+                self._nextOffset = index.GetOffset(len(index)) + index.GetRecordSize(len(index))
+
+    def GetRawPacket(self , frameNumber):
+        '''
+        return the raw bytes of the given frame (starts from 1), or None if there is no such frame.
+        '''
+        rawPacket = self.GetRawPacketObject(frameNumber)
+        if rawPacket is None:
+            return None
+        return rawPacket.raw
+
+    def GetRawPacketObject(self , frameNumber):
+        '''
+        return RawPacket object of the given frame (starts from 1), or None if there is no such frame.
+        '''
+        if frameNumber < 1:
+            return None
+        while len(self._offsets) < frameNumber:
+            if not self._IndexNextPacket():
+                return None
+        return self._pcapFile.ReadPacketAt(int(self._offsets[frameNumber - 1]))
+
+    def _IndexNextPacket(self):
+        rawPacket = self._pcapFile.ReadPacketHeaderAt(self._nextOffset)
+        if rawPacket is None:
+            return False
+        # in pcapng files, the packet may be after other blocks
+        self._offsets.append(rawPacket.offset)
+        self._nextOffset = rawPacket.offset + rawPacket.recordLength
+        return True
+
+    def Close(self):
+        self._pcapFile.Close()
+
+class StreamRawStore(object):
+    '''
+    Raw packets of a pcap stream (eg: live capture) by frame number.
+    The stream is read forward up to the requested frame. The frames before it were already passed
+    by tshark, so they are evicted - only the last historySize frames are kept.
+    '''
+    DEFAULT_HISTORY_SIZE = 16
+
+    def __init__(self , pcapFile , historySize = DEFAULT_HISTORY_SIZE):
+        self._pktGen = pcapFile.ReadPackets()
+        self._historySize = historySize
+        self._window = deque()
+        self._lastFrameNumber = 0
+
+    def GetRawPacket(self , frameNumber):
+        '''
+        return the raw bytes of the given frame (starts from 1), or None if it was evicted or the stream ended.
+        '''
+        while self._lastFrameNumber < frameNumber:
+            try:
+                rawPacket = self._pktGen.next()
+            except StopIteration:
+                return None
+            self._window.append(rawPacket.raw)
+            self._lastFrameNumber += 1
+
+        # evict the frames tshark already passed
+        while len(self._window) > 1 and self._lastFrameNumber - len(self._window) + 1 < frameNumber - self._historySize:
+            self._window.popleft()
+
+        index = frameNumber - (self._lastFrameNumber - len(self._window) + 1)
+        if index < 0:
+            return None
+        return self._window[index]
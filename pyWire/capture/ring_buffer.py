@@ -0,0 +1,194 @@
+import mmap
+import tempfile
+import threading
+
+class RingBuffer(object):
+    '''
+    FIFO of bytes between a writer thread and a reader thread, used as a file object by PcapFile.
+    Writing never blocks: data is kept in a ring buffer in memory which grows up to memoryLimit,
+    and after that in a spill file on disk, which is read using mmap. The read part of the spill file is
+    reclaimed when the file is fully read, or when it is larger than spillCompactSize and than the unread part
+    (which is then moved to the start of the file), so a reader which never catches up does not fill the disk.
+    Reading blocks until the requested amount of bytes was written, or the writer ended.
+    '''
+    DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+    DEFAULT_SPILL_COMPACT_SIZE = 64 * 1024 * 1024
+    _INITIAL_SIZE = 64 * 1024
+    _COPY_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self , memoryLimit = DEFAULT_MEMORY_LIMIT , spillDir = None , spillLimit = None ,
+                 spillCompactSize = DEFAULT_SPILL_COMPACT_SIZE):
+        '''
+        memoryLimit - max bytes to keep in memory.
+        spillDir - directory of the spill file (default is the temp directory).
+        spillLimit - max bytes to keep in the spill file, None for unlimited.
+        spillCompactSize - min size of the read part of the spill file to reclaim before the file is fully read.
+        '''
+        self._memoryLimit = memoryLimit
+        self._spillDir = spillDir
+        self._spillLimit = spillLimit
+        self._spillCompactSize = spillCompactSize
+
+        self._buffer = bytearray(min(RingBuffer._INITIAL_SIZE , memoryLimit))
+        self._start = 0     # position of the first unread byte in the buffer
+        self._length = 0    # number of unread bytes in the buffer
+
+        self._spillFile = None
+        self._spillMap = None
+        self._spillRead = 0     # position of the first unread byte in the spill file
+        self._spillWrite = 0    # size of the spill file
+
+        self._condition = threading.Condition()
+        self._endOfWrite = False
+        self._closed = False
+
+    def write(self , data):
+        with self._condition:
+            if self._closed:
+                return
+            # once spilled, all data goes to the spill file until it is read, to keep the order
+            if self._spillRead < self._spillWrite or not self._WriteMemory(data):
+                self._WriteSpill(data)
+            self._condition.notify()
+
+    def EndOfWrite(self):
+        '''
+        Notify that the writer ended. Reading will return the remaining data and then ''.
+        '''
+        with self._condition:
+            self._endOfWrite = True
+            self._condition.notify()
+
+    def read(self , size):
+        with self._condition:
+            while len(self) < size and not self._endOfWrite and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return ''
+            return self._Read(size)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._buffer = None
+            self._CloseSpill()
+            self._condition.notify()
+
+    def __len__(self):
+        ''' number of bytes that were written and not read yet '''
+        return self._length + self._spillWrite - self._spillRead
+
+    def GetSpilledSize(self):
+        ''' number of bytes in the spill file '''
+        return self._spillWrite - self._spillRead
+
+    def _WriteMemory(self , data):
+        '''
+        write data to the memory ring, return False if it has no room for the data.
+        '''
+        size = len(data)
+        capacity = len(self._buffer)
+        if self._length + size > capacity:
+            if self._length + size > self._memoryLimit:
+                return False
+            self._Grow(min(max(capacity * 2 , self._length + size) , self._memoryLimit))
+            capacity = len(self._buffer)
+
+        end = (self._start + self._length) % capacity
+        first = min(size , capacity - end)
+        data = memoryview(data)
+        self._buffer[end:end + first] = data[:first]
+        if first < size:
+            self._buffer[:size - first] = data[first:]
+        self._length += size
+        return True
+
+    def _Grow(self , capacity):
+        length = self._length
+        newBuffer = bytearray(capacity)
+        newBuffer[:length] = self._ReadMemory(length)
+        self._buffer = newBuffer
+        self._start = 0
+        self._length = length
+
+    def _ReadMemory(self , size):
+        size = min(size , self._length)
+        capacity = len(self._buffer)
+        first = min(size , capacity - self._start)
+        data = bytes(self._buffer[self._start:self._start + first])
+        if first < size:
+            data += bytes(self._buffer[:size - first])
+        self._start = (self._start + size) % capacity
+        self._length -= size
+        if self._length == 0:
+            self._start = 0
+        return data
+
+    def _WriteSpill(self , data):
+        if self._spillLimit is not None and self._spillWrite - self._spillRead + len(data) > self._spillLimit:
+            raise Exception("Internal buffering limit reached!")
+        if self._spillFile is None:
+            self._spillFile = tempfile.TemporaryFile(prefix = 'pyWire_spill_' , dir = self._spillDir)
+        self._spillFile.seek(self._spillWrite)
+        self._spillFile.write(data)
+        self._spillWrite += len(data)
+
+    def _ReadSpill(self , size):
+        size = min(size , self._spillWrite - self._spillRead)
+        if size == 0:
+            return ''
+        end = self._spillRead + size
+        if self._spillMap is None or len(self._spillMap) < end:
+            # the spill file grew since it was mapped
+            if self._spillMap is not None:
+                self._spillMap.close()
+            self._spillFile.flush()
+            self._spillMap = mmap.mmap(self._spillFile.fileno() , self._spillWrite , access = mmap.ACCESS_READ)
+        data = self._spillMap[self._spillRead:end]
+        self._spillRead = end
+        if self._spillRead == self._spillWrite:
+            # all spilled data was read, start the spill file over
+            self._spillMap.close()
+            self._spillMap = None
+            self._spillFile.seek(0)
+            self._spillFile.truncate()
+            self._spillRead = self._spillWrite = 0
+        elif self._spillRead >= self._spillCompactSize and self._spillRead >= self._spillWrite - self._spillRead:
+            # the copied part is not larger than the read part, so each byte is copied O(1) times on average
+            self._CompactSpill()
+        return data
+
+    def _CompactSpill(self):
+        '''
+        move the unread part of the spill file to its start, and truncate the file after it.
+        '''
+        unread = self._spillWrite - self._spillRead
+        self._spillMap.close()
+        self._spillMap = None
+        self._spillFile.flush()
+        # the unread part is not larger than the read part, so it does not overlap its new position
+        copied = 0
+        while copied < unread:
+            self._spillFile.seek(self._spillRead + copied)
+            data = self._spillFile.read(min(RingBuffer._COPY_CHUNK_SIZE , unread - copied))
+            self._spillFile.seek(copied)
+            self._spillFile.write(data)
+            copied += len(data)
+        self._spillFile.flush()
+        self._spillFile.truncate(unread)
+        self._spillRead , self._spillWrite = 0 , unread
+
+    def _Read(self , size):
+        data = self._ReadMemory(size)
+        if len(data) < size:
+            data += self._ReadSpill(size - len(data))
+        return data
+
+    def _CloseSpill(self):
+        if self._spillMap is not None:
+            self._spillMap.close()
+            self._spillMap = None
+        if self._spillFile is not None:
+            self._spillFile.close()
+            self._spillFile = None
+        self._spillRead = self._spillWrite = 0
@@ -0,0 +1,118 @@
+'''
+Split the packets of a pcap file between several tshark processes (see FileCapture.apply_on_packets workers).
+'''
+import struct
+import zlib
+
+from pyWire.capture.fileformats.PcapFile import PcapFile
+from pyWire.capture.fileformats.PcapIndex import FrameSelection
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPES_VLAN = (0x8100 , 0x88a8 , 0x9100)
+
+IP_PROTOCOLS_WITH_PORTS = (6 , 17 , 132)    # tcp, udp, sctp
+IPV6_EXTENSION_HEADERS = (0 , 43 , 60)      # hop by hop, routing, destination options
+IPV6_FRAGMENT_HEADER = 44
+
+# the flow key is taken from the headers only
+_HEADERS_BYTES = 256
+
+def ShardByFlow(pcapPath , selection , shardsCount):
+    '''
+    split the selected frames of a pcap file to shardsCount selections, so all the packets of a flow
+    (both directions of the same addresses, ip protocol and ports) are in the same selection.
+    Packets which are not ip are all in the first selection.
+    return list of FrameSelection.
+    '''
+    shards = [FrameSelection() for i in xrange(shardsCount)]
+    selectedFrames = selection.IterateFrames()
+    nextSelected = next(selectedFrames , None)
+    pcapFile = PcapFile(pcapPath)
+    frameNumber = 0
+    linkType = None
+    for data , tsSec , tsUsec , lenData , origLenData , offset in pcapFile.ReadPacketsMapped():
+        frameNumber += 1
+        if nextSelected is None:
+            break
+        if frameNumber < nextSelected:
+            continue
+        if linkType is None:
+            linkType = pcapFile.GetLinkType()
+        flowKey = GetFlowKey(data[:_HEADERS_BYTES] , linkType)
+        shardIndex = 0
+        if flowKey is not None:
+            shardIndex = (zlib.crc32(flowKey) & 0xffffffff) % shardsCount
+        shards[shardIndex].Append(frameNumber)
+        nextSelected = next(selectedFrames , None)
+    return [shard for shard in shards if len(shard) > 0]
+
+def GetFlowKey(data , linkType):
+    '''
+    return the flow key of raw packet - the same string for both directions of a flow, or None if it is not ip.
+    Fragments have no ports in the key, so all the fragments of a datagram have the same key.
+    '''
+    etherType , offset = _GetNetworkLayer(data , linkType)
+    if etherType == ETHERTYPE_IPV4:
+        if len(data) < offset + 20:
+            return None
+        versionAndLength , flagsAndOffset , protocol = struct.unpack_from('>B5xH1xB' , data , offset)
+        source , destination = data[offset + 12:offset + 16] , data[offset + 16:offset + 20]
+        fragmented = flagsAndOffset & 0x3fff    # more fragments flag, or fragment offset
+        transportOffset = offset + (versionAndLength & 0xf) * 4
+    elif etherType == ETHERTYPE_IPV6:
+        if len(data) < offset + 40:
+            return None
+        protocol = struct.unpack_from('>B' , data , offset + 6)[0]
+        source , destination = data[offset + 8:offset + 24] , data[offset + 24:offset + 40]
+        transportOffset = offset + 40
+        while protocol in IPV6_EXTENSION_HEADERS and len(data) >= transportOffset + 2:
+            protocol , length = struct.unpack_from('>BB' , data , transportOffset)
+            transportOffset += (length + 1) * 8
+        fragmented = protocol == IPV6_FRAGMENT_HEADER
+    else:
+        return None
+
+    sourcePort = destinationPort = ''
+    if not fragmented and protocol in IP_PROTOCOLS_WITH_PORTS and len(data) >= transportOffset + 4:
+        sourcePort = data[transportOffset:transportOffset + 2]
+        destinationPort = data[transportOffset + 2:transportOffset + 4]
+    ends = sorted([source + sourcePort , destination + destinationPort])
+    return struct.pack('>B' , protocol) + ends[0] + ends[1]
+
+def _GetNetworkLayer(data , linkType):
+    '''
+    return tuple (ethertype , offset) of the network layer of raw packet, ethertype is None if unknown.
+    '''
+    if linkType == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return (None , 0)
+        etherType = struct.unpack_from('>H' , data , 12)[0]
+        offset = 14
+        while etherType in ETHERTYPES_VLAN and len(data) >= offset + 4:
+            etherType = struct.unpack_from('>H' , data , offset + 2)[0]
+            offset += 4
+        return (etherType , offset)
+    if linkType == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return (None , 0)
+        return (struct.unpack_from('>H' , data , 14)[0] , 16)
+    if linkType in (LINKTYPE_RAW , LINKTYPE_IPV4 , LINKTYPE_IPV6):
+        offset = 0
+    elif linkType in (LINKTYPE_NULL , LINKTYPE_LOOP):
+        # 4 bytes of address family, which values differ between systems
+        offset = 4
+    else:
+        return (None , 0)
+    if len(data) <= offset:
+        return (None , 0)
+    version = struct.unpack_from('>B' , data , offset)[0] >> 4
+    return ({4 : ETHERTYPE_IPV4 , 6 : ETHERTYPE_IPV6}.get(version) , offset)
@@ -0,0 +1,247 @@
+import atexit
+import os
+import subprocess
+import threading
+import Queue
+from collections import deque, OrderedDict
+
+from pyWire.capture.capture import Capture, PacketsSource, TSharkCrashException
+from pyWire.capture.fileformats.PcapFile import PcapFile
+from pyWire.tshark.decoders import get_decoder
+
+class TSharkWorker(Capture):
+    """
+    A tshark process which dissects batches of raw packets.
+    The packets are written to tshark's standard input, so no temporary files are used.
+
+    By default (shared_state) tshark is started once, and keeps its state between batches as if all batches were
+    one capture (eg: tcp reassembly, retransmissions analysis, tcp.stream numbers and relative times continue
+    from the previous batches). tshark can not reset its state, so it is restarted - with clean state - only:
+        every MAX_FRAMES_PER_PROCESS packets, to release its memory.
+        after it crashed.
+        after every batch, when shared_state is False - every batch is dissected with clean state, at the cost
+        of starting tshark for every batch (the next process is started as soon as a batch ends, so its startup
+        overlaps the processing of the batch).
+
+    After each batch a sentinel packet is written, which passes any display filter -
+    when its dissection arrives, all the packets of the batch were dissected.
+    """
+    MAX_FRAMES_PER_PROCESS = 1000000
+    # ethernet frame from a locally administered address, with the local experimental ethertype
+    _SENTINEL_SRC = '02:70:79:57:69:72'
+    _SENTINEL_TYPE = '0x88b5'
+    _SENTINEL_PACKET = '\xff\xff\xff\xff\xff\xff' + '\x02pyWir' + '\x88\xb5' + 'pyWire batch end'.ljust(46 , '\x00')
+    _SENTINEL_FILTER = 'eth.src == %s && eth.type == %s' % (_SENTINEL_SRC , _SENTINEL_TYPE)
+    _POLL_INTERVAL = 1
+
+    def __init__(self, display_filter=None, decryption_key=None, encryption_type='wpa-pwk', fields=None,
+                 fields_type=None, layers=None, decoder=None, shared_state=True):
+        """
+        Creates a new worker. tshark is started on the first batch.
+
+        :param display_filter: Display (wireshark) filter to use.
+        :param decryption_key: Key used to encrypt and decrypt captured traffic.
+        :param encryption_type: Standard of encryption used in captured traffic (must be either 'WEP', 'WPA-PWD',
+        or 'WPA-PWK'. Defaults to WPA-PWK).
+        :param fields: Fields to print instead of PDML, the batches are dissected to records
+        (see Capture.apply_on_packets).
+        :param fields_type: Types to convert the fields records by (see get_tshark_fields_type).
+        :param layers: Protocols which tshark outputs, None for all.
+        :param decoder: Decoder of the tshark output (see Capture).
+        :param shared_state: Dissect all the batches by the same tshark process, which keeps its state between
+        them (default). Otherwise each batch is dissected by a fresh process.
+        """
+        super(TSharkWorker, self).__init__(display_filter=display_filter,
+                                           decryption_key=decryption_key, encryption_type=encryption_type,
+                                           layers=layers, decoder=decoder)
+        self.user_display_filter = display_filter
+        if display_filter:
+            self.display_filter = '(%s) || (%s)' % (display_filter , TSharkWorker._SENTINEL_FILTER)
+        self._packet_count = None
+        self._timeout = None
+        self.fields = tuple(fields) if fields else None
+        self.fields_type = fields_type
+        self._packetsSource = WorkerPacketsSource()
+        self.shared_state = shared_state
+        self._tshark_process = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def Dissect(self , records , fields_type=None , lazy=False , compact=False):
+        '''
+        Dissect a batch of packets.
+        records - list of tuples (raw bytes , timestamp seconds , timestamp microseconds)
+        Return list of the packet objects that passed the display filter, with their raw bytes
+        (records of the worker fields, without raw bytes, when it has fields).
+        packet.frame_number is the number of the packet in the batch (starts from 1).
+        '''
+        with self._lock:
+            if self._tshark_process is None or self._nextFrameNumber > TSharkWorker.MAX_FRAMES_PER_PROCESS:
+                self._Restart()
+            packets = self._DissectBatch(records , fields_type , lazy , compact)
+            if self._closed:
+                # the worker was closed (evicted) while it was used, nobody else stops this process
+                self._Stop()
+            elif not self.shared_state:
+                # the next batch starts with clean state
+                self._Restart()
+            return packets
+
+    def _DissectBatch(self , records , fields_type , lazy , compact):
+        '''
+        write a batch to the running tshark process, and return its packets.
+        '''
+        firstFrameNumber = self._nextFrameNumber
+        sentinelFrameNumber = firstFrameNumber + len(records)
+        self._nextFrameNumber = sentinelFrameNumber + 1
+
+        data = [PcapFile.GetPacketRecord(raw , sec , microSec) for raw , sec , microSec in records]
+        data.append(PcapFile.GetPacketRecord(TSharkWorker._SENTINEL_PACKET , 0 , 0))
+        try:
+            self._tshark_process.stdin.write(''.join(data))
+            self._tshark_process.stdin.flush()
+        except IOError:
+            self._RaiseCrash()
+
+        packets = []
+        while True:
+            output_item = self._GetNextOutputItem()
+            if self.fields:
+                frameNumber = output_item.frame_number
+            else:
+                frameNumber = self.decoder.GetFrameNumber(output_item)
+            if frameNumber == sentinelFrameNumber:
+                return packets
+            if frameNumber < firstFrameNumber:
+                # left from a batch that failed
+                continue
+            if self.fields:
+                packets.append(output_item._replace(frame_number = frameNumber - firstFrameNumber + 1))
+                continue
+            packet = self.decoder.MakePacket(output_item, fields_type, lazy, compact)
+            packet.frame_number = frameNumber - firstFrameNumber + 1
+            packet.hasRaw = True
+            packet.raw = records[packet.frame_number - 1][0]
+            packets.append(packet)
+
+    def Close(self):
+        '''
+        Stop the tshark process. The worker can still be used - each batch is then dissected by its own process.
+        '''
+        with self._lock:
+            self._closed = True
+            self._Stop()
+
+    def _Restart(self):
+        self._Stop()
+        self._nextFrameNumber = 1
+        self._outputItems = Queue.Queue()
+        self._stderrLines = deque(maxlen = 20)
+        self._tshark_process = self._get_tshark_process()
+        self._tshark_process.stdin.write(PcapFile.GLOBAL_HEADER)
+        outputArgs = (self._tshark_process.stdout , self._get_output_parser() , self._outputItems)
+        for target , args in ((TSharkWorker._ReadOutputWorker , outputArgs) ,
+                              (TSharkWorker._ReadStderrWorker , (self._tshark_process.stderr , self._stderrLines))):
+            readThread = threading.Thread(target = target , args = args)
+            readThread.daemon = True
+            readThread.start()
+
+    def _Stop(self):
+        if self._tshark_process is not None:
+            try:
+                self._tshark_process.stdin.close()
+            except IOError:
+                pass
+            self._cleanup_subprocess(self._tshark_process)
+            self.running_processes.discard(self._tshark_process)
+            self._tshark_process = None
+
+    @staticmethod
+    def _ReadOutputWorker(stream , parser , outputItems):
+        '''
+        This thread parses tshark output (PDML packet elements, or fields records), so tshark never blocks on
+        a full pipe while a batch is written.
+        '''
+        fd = stream.fileno()
+        try:
+            data = os.read(fd, Capture.DEFAULT_BATCH_SIZE)
+            while data != '':
+                for output_item in parser.feed(data):
+                    outputItems.put(output_item)
+                data = os.read(fd, Capture.DEFAULT_BATCH_SIZE)
+            for output_item in parser.close():
+                outputItems.put(output_item)
+        finally:
+            # tshark exited, or its output could not be parsed
+            outputItems.put(None)
+
+    @staticmethod
+    def _ReadStderrWorker(stream , stderrLines):
+        for line in iter(stream.readline , ''):
+            stderrLines.append(line)
+
+    def _GetNextOutputItem(self):
+        while True:
+            try:
+                output_item = self._outputItems.get(True , TSharkWorker._POLL_INTERVAL)
+            except Queue.Empty:
+                # timeout only so KeyboardInterrupt is not blocked
+                continue
+            if output_item is None:
+                self._RaiseCrash()
+            return output_item
+
+    def _RaiseCrash(self):
+        self._Stop()
+        raise TSharkCrashException('TShark worker exited unexpectedly (display filter: %s):\n%s'
+                                   % (self.display_filter , ''.join(self._stderrLines)))
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.user_display_filter)
+
+class WorkerPacketsSource(PacketsSource):
+    '''
+    tshark reads the packets from a pipe, which the worker writes to.
+    '''
+    def __init__(self):
+        self._feeder = subprocess.PIPE
+
+# one worker for each (display filter, options), the least recently used first
+_workers = OrderedDict()
+_workersLock = threading.Lock()
+# max workers (and idle tshark processes) - the least recently used worker is closed when another one is needed
+MAX_WORKERS = 8
+
+def GetTSharkWorker(display_filter=None, decryption_key=None, encryption_type='wpa-pwk', fields=None,
+                    fields_type=None, layers=None, decoder=None, shared_state=True):
+    '''
+    Return the worker of the given display filter and options, create it if needed.
+    Workers are shared by the whole process, and closed on exit. At most MAX_WORKERS workers are kept,
+    the least recently used one is closed to make room for a new one.
+    '''
+    fields = tuple(fields) if fields else None
+    layers = tuple(layers) if layers else None
+    decoder = get_decoder(decoder)
+    key = (display_filter , decryption_key , encryption_type , fields , fields is not None and fields_type is not None ,
+           layers , decoder.name , shared_state)
+    with _workersLock:
+        worker = _workers.pop(key , None)
+        if worker is None:
+            while len(_workers) >= MAX_WORKERS:
+                evictedKey , evicted = _workers.popitem(last = False)
+                evicted.Close()
+            worker = TSharkWorker(display_filter , decryption_key , encryption_type , fields , fields_type ,
+                                  layers , decoder , shared_state)
+        _workers[key] = worker
+        return worker
+
+def CloseTSharkWorkers():
+    '''
+    Stop all the workers tshark processes.
+    '''
+    with _workersLock:
+        for worker in _workers.values():
+            worker.Close()
+        _workers.clear()
+
+atexit.register(CloseTSharkWorkers)
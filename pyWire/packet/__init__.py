@@ -13,13 +13,16 @@
             pkt.sniff_time      - as datetime object
             pkt.sniff_timestamp - as timestamp (string)
         
+        what is the number of the packet in the capture?
+            pkt.frame_number - number of the frame (int), also when reading only part of a file
+        
         what is the size of the packet?
             pkt.length - number of bytes in the packet (string)
             pkt.captured_length - number of bytes captured of packet (string)
             
-        what interface was the packet captured on? (NOT WORKING)
-            ! NOTE - Currently tshark doesn't give the right information
-            pkt.interface_captured - number of interface as string
+        what interface was the packet captured on?
+            pkt.interface_captured - number of interface as string (index in LiveCapture interfaces)
+            ! NOTE - known only for pcapng sources (eg: live capture from several interfaces), otherwise None
         
     Printing
         I want to see the packet data like in wireshark.
@@ -45,9 +48,14 @@
                 pkt['ip'] , pkt['udp'], pkt['tcp'], pkt['http']....
             pkt[i]  - retrieve layer by its index.
             
+        I want the inner layer of a tunneled packet:
+            pkt[X , n]  - the n'th layer named X (0 is the outer, -1 the inner). For example:
+                pkt['ip' , 1] - the ip layer inside the first one.
+            pkt.GetLayers(X)  - list of all the layers named X, outer first.
+            
         Special layers:
             pkt.geninfo - special general info layer
-            pkt.frame   - special frame layer
+            pkt.frame   - special frame layer (None when the capture has layers, which do not include 'frame')
         
     Fields:
         Each layer contains fields, which can contain sub fields etc...
@@ -0,0 +1,566 @@
+'''
+    compact
+
+    Memory efficient representation of a packet tree.
+
+    All the layers and fields of a packet are kept in flat parallel arrays, indexed by node number.
+    Nodes are numbered in DFS order - each layer is followed by the tree of its fields, so the
+    sub tree of node i is the range [i + 1, ends[i]).
+    Strings of all nodes are kept in a single string, and names are kept once per process in SYMBOLS.
+
+    CompactLayer and CompactLayerField are thin views over the arrays, which have the same
+    interface as Layer and LayerField. They are created only when accessed, and hold nothing but
+    the tree and the node number.
+'''
+import os
+import threading
+from array import array
+
+from pyWire.packet.layer import StripParentName, FIELD_NAMES, TabString
+
+class SymbolTable(object):
+    '''
+    Table of names, each name is kept only once and referred to by its id.
+    '''
+    def __init__(self):
+        self._names = []
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def GetId(self , name):
+        '''
+        return the id of the name, add it to the table if needed.
+        '''
+        nameId = self._ids.get(name)
+        if nameId is None:
+            with self._lock:
+                nameId = self._ids.get(name)
+                if nameId is None:
+                    if type(name) is str:
+                        name = intern(name)
+                    nameId = len(self._names)
+                    self._names.append(name)
+                    self._ids[name] = nameId
+        return nameId
+
+    def FindId(self , name):
+        '''
+        return the id of the name, or NO_VALUE if it is not in the table.
+        '''
+        return self._ids.get(name , NO_VALUE)
+
+    def GetName(self , nameId):
+        return self._names[nameId]
+
+# names of layers and fields, shared by all the packets in the process
+SYMBOLS = SymbolTable()
+
+NO_VALUE = -1
+
+# node flags
+_FLAG_HIDE = 1
+# string attributes of every node, in the order they are kept in the strings blob
+_STRING_ATTRIBUTES = ('showname' , 'show' , 'value')
+_FLAG_PRESENT = (2 , 4 , 8)
+_FLAG_UNICODE = (16 , 32 , 64)
+# attributes that are kept in the arrays, all others are kept in the extras dict
+_ARRAY_ATTRIBUTES = set(('name' , 'pos' , 'size' , 'hide') + _STRING_ATTRIBUTES)
+_DEFAULT_ATTRIBUTES = set(('unmaskedvalue' ,) + tuple(_ARRAY_ATTRIBUTES))
+
+_DATA_LAYER = 'data'
+
+class CompactTree(object):
+    '''
+    The layers and fields of a single packet.
+        names       - id of the python name of the node (layer name, or field name as in LayerField._name)
+        attrNames   - id of the name attribute of the node (NO_VALUE if missing)
+        parents     - index of the parent node (NO_VALUE for layers)
+        ends        - index after the last node in the sub tree of the node
+        pos, sizes  - the pos and size attributes (NO_VALUE if missing)
+        flags       - hide flag, and which strings are present\\unicode
+        strOffsets  - offset of the showname, show and value strings of each node in strings
+        extras      - dict of node index to dict of other attributes, for the rare nodes that have them
+        layers      - indices of the layer nodes
+    '''
+    __slots__ = ('names' , 'attrNames' , 'parents' , 'ends' , 'pos' , 'sizes' , 'flags' ,
+                 'strOffsets' , 'strings' , 'extras' , 'layers' , 'fieldsType')
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getstate__(self):
+        '''
+        The names are ids in the SYMBOLS of this process, so they are pickled as the names themselves
+        (once per tree), and mapped to the ids of the loading process in __setstate__.
+        '''
+        usedIds = set(self.names) | set(self.attrNames)
+        usedIds.discard(NO_VALUE)
+        usedIds = sorted(usedIds)
+        localIds = dict((nameId , localId) for localId , nameId in enumerate(usedIds))
+        state = dict((slot , getattr(self , slot)) for slot in CompactTree.__slots__)
+        state['names'] = array('i' , [localIds[nameId] for nameId in self.names])
+        state['attrNames'] = array('i' , [localIds.get(nameId , NO_VALUE) for nameId in self.attrNames])
+        state['symbolNames'] = [SYMBOLS.GetName(nameId) for nameId in usedIds]
+        return state
+
+    def __setstate__(self , state):
+        symbolIds = [SYMBOLS.GetId(name) for name in state.pop('symbolNames')]
+        state['names'] = array('i' , [symbolIds[localId] for localId in state['names']])
+        state['attrNames'] = array('i' , [NO_VALUE if localId == NO_VALUE else symbolIds[localId]
+                                          for localId in state['attrNames']])
+        for slot , value in state.iteritems():
+            setattr(self , slot , value)
+
+    def GetString(self , index , stringIndex):
+        '''
+        return the showname (0), show (1) or value (2) string of a node, or None if missing.
+        '''
+        flags = self.flags[index]
+        if not flags & _FLAG_PRESENT[stringIndex]:
+            return None
+        offset = index * len(_STRING_ATTRIBUTES) + stringIndex
+        value = self.strings[self.strOffsets[offset]:self.strOffsets[offset + 1]]
+        if flags & _FLAG_UNICODE[stringIndex]:
+            value = value.decode('utf-8')
+        return value
+
+    def GetAttribute(self , index , attrName):
+        '''
+        return the given attribute of a node (as found in the PDML), or None if missing.
+        '''
+        if attrName in _STRING_ATTRIBUTES:
+            value = self.GetString(index , _STRING_ATTRIBUTES.index(attrName))
+            if attrName == 'value' and value is not None and self.fieldsType is not None \
+                    and self.parents[index] != NO_VALUE:
+                fullName = self.GetFullName(index)
+                if fullName:
+                    value = self.fieldsType[fullName](value)
+            return value
+        if attrName == 'name':
+            name = self.GetFullName(index)
+            parent = self.parents[index]
+            if parent != NO_VALUE:
+                name = StripParentName(name , SYMBOLS.GetName(self.names[parent]))
+            return name
+        if attrName in ('pos' , 'size'):
+            value = (self.pos if attrName == 'pos' else self.sizes)[index]
+            if value == NO_VALUE:
+                return None
+            return str(value)
+        if attrName == 'hide':
+            if self.flags[index] & _FLAG_HIDE:
+                return 'yes'
+            return (self.extras.get(index) or {}).get('hide')
+        return (self.extras.get(index) or {}).get(attrName)
+
+    def GetAttributesNames(self , index):
+        '''
+        return list of the attributes (as found in the PDML) of a node.
+        '''
+        names = []
+        if self.attrNames[index] != NO_VALUE:
+            names.append('name')
+        for stringIndex , attrName in enumerate(_STRING_ATTRIBUTES):
+            if self.flags[index] & _FLAG_PRESENT[stringIndex]:
+                names.append(attrName)
+        if self.pos[index] != NO_VALUE:
+            names.append('pos')
+        if self.sizes[index] != NO_VALUE:
+            names.append('size')
+        if self.flags[index] & _FLAG_HIDE:
+            names.append('hide')
+        names += (self.extras.get(index) or {}).keys()
+        return names
+
+    def GetFullName(self , index):
+        '''
+        return the name attribute of a node, as given by wireshark (eg: 'dns.qry.name').
+        '''
+        attrName = self.attrNames[index]
+        if attrName == NO_VALUE:
+            return None
+        return SYMBOLS.GetName(attrName)
+
+    def IterateChildren(self , index):
+        '''
+        iterate over the indices of the direct children of a node.
+        '''
+        child = index + 1
+        end = self.ends[index]
+        ends = self.ends
+        while child < end:
+            yield child
+            child = ends[child]
+
+    def GetChildrenByName(self , index , name):
+        '''
+        return list of the indices of the direct children of a node with the given python name.
+        '''
+        nameId = SYMBOLS.FindId(name)
+        if nameId == NO_VALUE:
+            return []
+        names = self.names
+        return [child for child in self.IterateChildren(index) if names[child] == nameId]
+
+    def GetView(self , index):
+        '''
+        return view object of a node.
+        '''
+        if self.parents[index] == NO_VALUE:
+            return CompactLayer(self , index)
+        return CompactLayerField(self , index)
+
+    def GetLayers(self):
+        '''
+        return list of views of the layers of the packet.
+        '''
+        return [CompactLayer(self , index) for index in self.layers]
+
+class CompactTreeBuilder(object):
+    '''
+    Build a CompactTree node by node, in DFS order.
+    Call AddNode for a node, then add its sub tree, then call CloseNode.
+    '''
+    def __init__(self , fields_type=None):
+        self._tree = CompactTree()
+        self._tree.names = array('i')
+        self._tree.attrNames = array('i')
+        self._tree.parents = array('i')
+        self._tree.ends = array('i')
+        self._tree.pos = array('i')
+        self._tree.sizes = array('i')
+        self._tree.flags = array('B')
+        self._tree.strOffsets = array('I')
+        self._tree.extras = {}
+        self._tree.layers = array('i')
+        self._tree.fieldsType = fields_type
+        self._strings = []
+        self._stringsLength = 0
+
+    def AddNode(self , parent , attributes):
+        '''
+        add a node with the given attributes (dict of the PDML attributes) under the given parent node.
+        parent should be NO_VALUE for layers.
+        return the index of the new node.
+        '''
+        tree = self._tree
+        index = len(tree.names)
+
+        attrName = attributes.get('name')
+        show = attributes.get('show')
+        showname = attributes.get('showname')
+        pos = attributes.get('pos')
+        size = attributes.get('size')
+        hide = attributes.get('hide')
+
+        # decide on a name, the same way Layer and LayerField do
+        if parent == NO_VALUE:
+            if attrName == 'fake-field-wrapper':
+                name = _DATA_LAYER
+            else:
+                name = attrName
+            tree.layers.append(index)
+        else:
+            name = FIELD_NAMES.GetFieldName(attrName , SYMBOLS.GetName(tree.names[parent]) ,
+                                            show , showname , pos , size , hide == 'yes')[1]
+
+        tree.names.append(SYMBOLS.GetId(name))
+        tree.attrNames.append(NO_VALUE if attrName is None else SYMBOLS.GetId(attrName))
+        tree.parents.append(parent)
+        tree.ends.append(index + 1)
+        tree.pos.append(NO_VALUE if pos is None else int(pos))
+        tree.sizes.append(NO_VALUE if size is None else int(size))
+
+        flags = 0
+        if hide == 'yes':
+            flags |= _FLAG_HIDE
+        for stringIndex , stringAttr in enumerate(_STRING_ATTRIBUTES):
+            tree.strOffsets.append(self._stringsLength)
+            value = attributes.get(stringAttr)
+            if value is not None:
+                flags |= _FLAG_PRESENT[stringIndex]
+                if type(value) is unicode:
+                    flags |= _FLAG_UNICODE[stringIndex]
+                    value = value.encode('utf-8')
+                self._strings.append(value)
+                self._stringsLength += len(value)
+        tree.flags.append(flags)
+
+        extras = None
+        for extraAttr in attributes.keys():
+            if extraAttr not in _ARRAY_ATTRIBUTES or (extraAttr == 'hide' and hide != 'yes'):
+                if extras is None:
+                    extras = tree.extras[index] = {}
+                extras[extraAttr] = attributes[extraAttr]
+        return index
+
+    def CloseNode(self , index):
+        '''
+        mark the end of the sub tree of the given node.
+        '''
+        self._tree.ends[index] = len(self._tree.names)
+
+    def AddXmlNode(self , parent , xmlObj):
+        '''
+        add PDML element (proto or field) with all its sub fields.
+        '''
+        index = self.AddNode(parent , xmlObj.attrib)
+        for subFieldXml in xmlObj.iterchildren('field'):
+            self.AddXmlNode(index , subFieldXml)
+        self.CloseNode(index)
+        return index
+
+    def Finish(self):
+        '''
+        return the built tree.
+        '''
+        tree = self._tree
+        tree.strOffsets.append(self._stringsLength)
+        tree.strings = ''.join(self._strings)
+        self._tree = None
+        self._strings = None
+        return tree
+
+def BuildCompactTree(xml_pkt_obj , fields_type=None):
+    '''
+    return CompactTree of the given PDML packet element.
+    '''
+    builder = CompactTreeBuilder(fields_type)
+    for proto in xml_pkt_obj.iterchildren('proto'):
+        builder.AddXmlNode(NO_VALUE , proto)
+    return builder.Finish()
+
+class CompactNode(object):
+    """
+    Base class for views of a node in a CompactTree.
+    """
+    __slots__ = ('_tree' , '_index')
+
+    def __init__(self , tree , index):
+        self._tree = tree
+        self._index = index
+
+    def __reduce__(self):
+        return (self.__class__ , (self._tree , self._index))
+
+    def __getattr__(self , attrName):
+        ''' access sub fields by their names, and attributes by '_attr_' + attribute name '''
+        if attrName.startswith('__'):
+            raise AttributeError(attrName)
+        if attrName.startswith('_attr_'):
+            attrName = attrName[len('_attr_'):]
+            value = self._tree.GetAttribute(self._index , attrName)
+            if value is None and attrName not in _DEFAULT_ATTRIBUTES:
+                raise AttributeError('_attr_' + attrName)
+            return value
+        subFields = self._tree.GetChildrenByName(self._index , attrName)
+        if len(subFields) == 0:
+            raise AttributeError(attrName)
+        if len(subFields) == 1:
+            return CompactLayerField(self._tree , subFields[0])
+        return [CompactLayerField(self._tree , subField) for subField in subFields]
+
+    def __eq__(self , other):
+        return type(self) is type(other) and self._tree is other._tree and self._index == other._index
+
+    def __ne__(self , other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self._tree) , self._index))
+
+    @property
+    def _name(self):
+        return SYMBOLS.GetName(self._tree.names[self._index])
+
+    @property
+    def _hide(self):
+        return bool(self._tree.flags[self._index] & _FLAG_HIDE)
+
+    @property
+    def _attributesNames(self):
+        return self._tree.GetAttributesNames(self._index)
+
+    @property
+    def _subFieldsNames(self):
+        '''
+        list of tuples (sub field name , occurrence index), same as in Layer and LayerField.
+        '''
+        subFieldsNames = []
+        occurrences = {}
+        names = self._tree.names
+        for child in self._tree.IterateChildren(self._index):
+            name = SYMBOLS.GetName(names[child])
+            occurIndex = occurrences.get(name , 0)
+            occurrences[name] = occurIndex + 1
+            subFieldsNames.append((name , occurIndex))
+        return subFieldsNames
+
+    def TryGetAttribute(self , attrName):
+        ''' for internal usage '''
+        try:
+            return getattr(self , attrName)
+        except AttributeError:
+            return None
+
+    def IterateSubfieldsNames(self , dontShowHidden = True):
+        '''
+            Iterate over the sub fields names.
+            Note that some fields may share the same name.
+            In that case, the name will be returned only once.
+        '''
+        for subfieldName , subfieldOccur in self._subFieldsNames:
+            if subfieldOccur == 0:  # iterate each field name just once
+                if not (dontShowHidden and subfieldName.startswith('_hid_')):
+                    yield subfieldName
+
+    def IterateSubfields(self , dontShowHidden = True):
+        '''
+            Iterate over the sub fields of this field.
+            Each sub field will be return, even if it share its name with others.
+        '''
+        # fields which share the same name are returned together, as in Layer and LayerField
+        tree = self._tree
+        names = tree.names
+        order = []
+        sameName = {}
+        for child in tree.IterateChildren(self._index):
+            if dontShowHidden and tree.flags[child] & _FLAG_HIDE:
+                continue
+            nameId = names[child]
+            if nameId not in sameName:
+                sameName[nameId] = []
+                order.append(nameId)
+            sameName[nameId].append(child)
+        for nameId in order:
+            for child in sameName[nameId]:
+                yield CompactLayerField(tree , child)
+
+    def IterateSubFieldsTree(self , dontShowHidden = True):
+        '''
+            iterate over the sub fields tree in DFS.
+            Each sub field will be return, even if it share its name with others.
+        '''
+        for subField in self.IterateSubfields(dontShowHidden):
+            yield subField
+            for subSubField in subField.IterateSubFieldsTree(dontShowHidden):
+                yield subSubField
+
+    def StrSubFieldsTree(self , dontShowHidden = True ):
+        '''
+            return string representation of the sub fields tree.
+        '''
+        s = ''
+        for subField in self.IterateSubfields(dontShowHidden):
+            s += subField._name + '\n'
+            s += TabString(subField.StrSubFieldsTree(dontShowHidden))
+        return s
+
+    def PrintSubFieldsTree(self,dontShowHidden = True  ):
+        '''
+            print string representation of the sub fields tree.
+        '''
+        print self.StrSubFieldsTree(dontShowHidden)
+
+    def SearchSubField(self, subString ,recursive = False, dontShowHidden = True):
+        '''
+        Return list of sub fields that contains the subString in their name
+        '''
+        res = []
+
+        if recursive:
+            iterOnFields = self.IterateSubFieldsTree(dontShowHidden)
+        else:
+            iterOnFields = self.IterateSubfields(dontShowHidden)
+
+        for subField in iterOnFields:
+            if subString in subField._name:
+                res.append(subField)
+        return res
+
+    def _StrSubFields(self):
+        s = ''
+        for child in self._tree.IterateChildren(self._index):
+            s += TabString(str(CompactLayerField(self._tree , child)))
+        return s
+
+class CompactLayerField(CompactNode):
+    """
+    View of a field in a CompactTree, with the same interface as LayerField.
+    """
+    __slots__ = ()
+
+    @property
+    def val_(self):
+        """
+        Return the value of the field
+        """
+        val = self._attr_show
+        if val is None:
+            val = self._attr_value
+        if not val:
+            val = self._attr_showname
+        return val
+
+    def __str__(self):
+        ''' return string representation of the field '''
+        if self._hide:
+            return ''
+        s = ''
+        if self._attr_showname is not None:
+            s += self._attr_showname
+        elif self._attr_show is not None:
+            s += self._attr_show
+        else:
+            s += self._name + ':\t'
+            s += self._attr_value
+        s += os.linesep
+
+        s += self._StrSubFields()
+        return s
+
+    def __iter__(self):
+        '''
+            Return self.
+            This is just for convenience when trying to iterate on a sub field which
+            it is not known whether it is a list or not.
+        '''
+        yield self
+
+    def __repr__(self):
+        s = ''
+        s += '<Field %s' % (self._name)
+        if len(self.val_) < 20:
+            s += ', Value: %s' % ( self.val_)
+        s += ', #subfields %d' % len(self._subFieldsNames)
+        s += '>'
+        return s
+
+class CompactLayer(CompactNode):
+    """
+    View of a layer in a CompactTree, with the same interface as Layer.
+    """
+    __slots__ = ()
+    _DATA_LAYER = _DATA_LAYER
+
+    @property
+    def layer_name(self):
+        '''
+            return the name of this layer
+        '''
+        return self._name
+
+    def __repr__(self):
+        s = ''
+        s += '<%s Layer' % self.layer_name.upper()
+        s += ', #subfields %d' % len(self._subFieldsNames)
+        s += '>'
+        return s
+
+    def __str__(self):
+        if self.layer_name == self._DATA_LAYER:
+            return 'DATA'
+
+        s = 'Layer %s:' % self.layer_name.upper() + os.linesep
+        s += self._StrSubFields()
+        return s
@@ -0,0 +1,157 @@
+'''
+Compiled field paths - extract the values of fields by their wireshark names (eg: 'dns.qry.name'),
+without going through the sub fields of every layer by their python names.
+
+Usage:
+    names = compile_path('dns.qry.name')
+    names(pkt)              # list of the shown values of all the dns.qry.name fields in the packet
+    names.GetFirst(pkt)     # the first of them, or None
+
+    hosts = compile_path('ip.src' , 'ip.dst')
+    hosts(pkt)              # tuple of lists - (all ip.src , all ip.dst)
+    hosts.GetFirst(pkt)     # tuple of the first value of each path (None for missing)
+'''
+from pyWire.packet.layer import StripParentName
+from pyWire.packet.compact import CompactNode, SYMBOLS, NO_VALUE
+
+def compile_path(*paths , **options):
+    '''
+    return FieldPath extractor of the given wireshark field names.
+    attribute - the attribute of the fields to return (default 'show', also 'value' or 'showname').
+    '''
+    return FieldPath(paths , **options)
+
+class FieldPath(object):
+    '''
+    Extractor of the values of fields by their wireshark names, compiled once and used for many packets.
+    The values of a path are always a list of all the occurrences of the field in the packet (lower layer first),
+    also when the field appears once - unlike the sub fields attributes, which are lists only when duplicated.
+    Hidden fields are included. Only the fields under the given object are scanned, not the object itself.
+
+    Works on packets (compact packets are scanned directly, lazy layers which were not accessed yet are
+    scanned in their PDML), layers, fields, and PDML elements (packet, proto or field).
+    '''
+    def __init__(self , paths , attribute = 'show'):
+        if not paths:
+            raise ValueError('At least one field path is required')
+        self.paths = tuple(paths)
+        self.attribute = attribute
+        self._attrAttribute = '_attr_' + attribute
+        self._slots = dict((path , slot) for slot , path in reversed(list(enumerate(self.paths))))
+        self._duplicates = [(slot , self._slots[path]) for slot , path in enumerate(self.paths)
+                            if self._slots[path] != slot]
+        # symbol id -> slot, the paths that are not in SYMBOLS yet are looked up again until they are
+        self._idSlots = {}
+        self._missingIds = set(self.paths)
+        # parent python name -> {path stripped of the parent name -> slot}, see _ScanFields.
+        # only parents with a tshark name are cached, the names of text items may be different in every packet
+        self._strippedSlots = {}
+
+    def __call__(self , obj):
+        '''
+        return list of the values of the path in the object, or tuple of such lists when there are several paths.
+        '''
+        values = self._Extract(obj)
+        if len(self.paths) == 1:
+            return values[0]
+        return tuple(values)
+
+    def GetFirst(self , obj , default = None):
+        '''
+        return the value of the first occurrence of the path in the object (default if missing),
+        or tuple of such values when there are several paths.
+        '''
+        values = [slotValues[0] if slotValues else default for slotValues in self._Extract(obj)]
+        if len(self.paths) == 1:
+            return values[0]
+        return tuple(values)
+
+    def _Extract(self , obj):
+        values = [[] for path in self.paths]
+        layers = getattr(obj , 'layers' , None)
+        if layers is not None:
+            # packet
+            for layer in [obj.geninfo , obj.frame] + layers:
+                if layer is not None:
+                    self._ExtractNode(layer , values)
+        elif hasattr(obj , 'iter'):
+            self._ScanXml(obj , values)
+        else:
+            self._ExtractNode(obj , values)
+        for slot , firstSlot in self._duplicates:
+            values[slot] = values[firstSlot]
+        return values
+
+    def _ExtractNode(self , node , values):
+        if isinstance(node , CompactNode):
+            self._ScanCompact(node._tree , node._index , values)
+            return
+        xml = node.__dict__.get('_xml')
+        if xml is not None:
+            # lazy layer\field whose sub fields were not created yet
+            self._ScanXml(xml , values)
+            return
+        self._ScanFields(node , values)
+
+    def _ScanCompact(self , tree , index , values):
+        '''
+        scan the sub tree of a node in a compact tree, by the name ids of the nodes.
+        '''
+        if self._missingIds:
+            for path in list(self._missingIds):
+                nameId = SYMBOLS.FindId(path)
+                if nameId != NO_VALUE:
+                    self._idSlots[nameId] = self._slots[path]
+                    self._missingIds.discard(path)
+        idSlots = self._idSlots
+        if not idSlots:
+            return
+        attrNames = tree.attrNames
+        attribute = self.attribute
+        for nodeIndex in xrange(index + 1 , tree.ends[index]):
+            slot = idSlots.get(attrNames[nodeIndex])
+            if slot is not None:
+                values[slot].append(tree.GetAttribute(nodeIndex , attribute))
+
+    def _ScanXml(self , xmlObj , values):
+        '''
+        scan the fields under a PDML element.
+        '''
+        slots = self._slots
+        attribute = self.attribute
+        for field in xmlObj.iter('field'):
+            if field is xmlObj:
+                continue
+            slot = slots.get(field.get('name'))
+            if slot is not None:
+                values[slot].append(field.get(attribute))
+
+    def _ScanFields(self , node , values):
+        '''
+        scan the sub fields tree of a Layer\LayerField.
+        The fields keep their name stripped of the name of their parent, so the paths are stripped the same way
+        to be compared with them (once for every parent name).
+        '''
+        parentName = node._name
+        strippedSlots = self._strippedSlots.get(parentName)
+        if strippedSlots is None:
+            strippedSlots = {}
+            for path , slot in self._slots.iteritems():
+                strippedSlots.setdefault(StripParentName(path , parentName) , slot)
+            if node.__dict__.get('_attr_name'):
+                self._strippedSlots[parentName] = strippedSlots
+        for subFieldName , occurIndex in node._subFieldsNames:
+            subField = node.__dict__[subFieldName]
+            if type(subField) is list:
+                subField = subField[occurIndex]
+            slot = strippedSlots.get(subField._attr_name)
+            if slot is not None:
+                values[slot].append(getattr(subField , self._attrAttribute , None))
+            xml = subField.__dict__.get('_xml')
+            if xml is not None:
+                self._ScanXml(xml , values)
+            elif subField._subFieldsNames:
+                self._ScanFields(subField , values)
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__ , ' , '.join(self.paths))
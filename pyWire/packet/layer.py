@@ -5,7 +5,7 @@ class LayerField(object):
     """
     Holds all data about a field, its value and nice representation.
     """
-    def __init__(self, fieldXml , parentName, fields_type=None):
+    def __init__(self, fieldXml , parentName, fields_type=None, lazy=False):
         # must have attributes
         self._attr_name = None
         self._attr_showname = None
@@ -17,7 +17,7 @@ class LayerField(object):
         self._attr_hide = None
     
         # extract attributes of field
-        self._attributesNames = fieldXml.attrib.keys()
+        self._attributesNames = FIELD_NAMES.GetAttributesNames(fieldXml.attrib.keys())
         for attrName ,attrVal in fieldXml.attrib.items():
             self.__setattr__( '_attr_' + attrName, attrVal)
 
@@ -29,31 +29,22 @@ class LayerField(object):
             self._attr_value = fields_type[self._attr_name](self._attr_value)
 
         # decide on a name for this field.
-        if self._attr_name is not None:
-            parentName = parentName.replace('_' , '.') 
-            if self._attr_name.find(parentName) != -1:
-                self._attr_name = self._attr_name.split(parentName)[1]
-        self._name = MakeName(self._attr_name)
-        if self._name is None or self._name == '':
-            if self._attr_show is not None:
-                self._name = MakeName(self._attr_show.split(':')[0])
-            if self._name is None or self._name == '':
-                self._name = MakeName(self._attr_showname)
-                if self._name is None or self._name == '':
-                    self._name = 'pos_' + str(self._attr_pos) + '_size_' + str(self._attr_size)
-
-        # decide whether this field is hidden when printing
         self._hide = (self._attr_hide == 'yes')
-        if self._hide:
-            self._name = '_hid_' + self._name
-        
-        # if field name doesn't start with a letter or underscore, add 'field_'
-        firstChar = self._name[0]
-        if not (firstChar.isalpha() or firstChar == '_'):
-            self._name = 'field_' + self._name
+        self._attr_name , self._name = FIELD_NAMES.GetFieldName(self._attr_name , parentName , self._attr_show ,
+                                                                self._attr_showname , self._attr_pos ,
+                                                                self._attr_size , self._hide)
         
         # extract sub fields. notice some may have the same name or no name
-        self._subFieldsNames = AddSubFields(self , fieldXml)
+        # in lazy mode, they are extracted only when first accessed
+        if lazy:
+            self._xml = fieldXml
+            self._fields_type = fields_type
+        else:
+            self._subFieldsNames = AddSubFields(self , fieldXml, fields_type)
+
+    def __getattr__(self , attrName):
+        ''' called only for missing attributes - create the sub fields in lazy mode '''
+        return GetLazyAttribute(self , attrName)
 
     def TryGetAttribute(self , attrName):
         ''' for internal usage '''
@@ -198,7 +189,114 @@ def MakeName(someStr):
     else:
         return None
 
-def AddSubFields(obj , xmlObjWithFields, fields_type=None):
+def StripParentName(attrName , parentName):
+    '''
+    return the field name without the name of its parent (layer\field) as prefix
+    '''
+    if attrName is not None:
+        parentName = parentName.replace('_' , '.') 
+        if attrName.find(parentName) != -1:
+            attrName = attrName.split(parentName)[1]
+    return attrName
+
+def MakeFieldName(attrName , show , showname , pos , size , hide):
+    '''
+    decide on a python name for a field, according to its attributes.
+    attrName should already be stripped from its parent name.
+    '''
+    name = MakeName(attrName)
+    if name is None or name == '':
+        if show is not None:
+            name = MakeName(show.split(':')[0])
+        if name is None or name == '':
+            name = MakeName(showname)
+            if name is None or name == '':
+                name = 'pos_' + str(pos) + '_size_' + str(size)
+
+    # hidden fields are not shown when printing
+    if hide:
+        name = '_hid_' + name
+    
+    # if field name doesn't start with a letter or underscore, add 'field_'
+    firstChar = name[0]
+    if not (firstChar.isalpha() or firstChar == '_'):
+        name = 'field_' + name
+    return name
+
+def _Intern(name):
+    # only byte strings can be interned
+    if type(name) is str:
+        return intern(name)
+    return name
+
+class FieldNamesCache(object):
+    '''
+    Process wide cache of the python names of fields (see MakeFieldName), shared by all the packets.
+    The name of a field with a tshark name depends only on its parent (layer\field) name, its tshark name
+    and whether it is hidden - so the fields layout of each protocol is learnt from the first packets, and later
+    packets only look their fields up. Text items (no tshark name) are named by the prefix of their show
+    attribute, which is cached as well.
+    The names are interned, so the packets share a single string of each name.
+    '''
+    # max cached names of text items, their show prefixes may be different in every packet
+    MAX_TEXT_NAMES = 100000
+    # max cached layouts - the parents of fields are also text items, whose names may be different in every packet
+    MAX_LAYOUTS = 10000
+
+    def __init__(self):
+        # parent name -> {(tshark name , hide) : (name without the parent prefix , python name)}
+        self._layouts = {}
+        # (show prefix , hide) -> python name
+        self._textNames = {}
+        self._attributesNames = {}
+
+    def GetFieldName(self , attrName , parentName , show , showname , pos , size , hide):
+        '''
+        return (attrName stripped from its parent name , python name of the field).
+        '''
+        if attrName:
+            layout = self._layouts.get(parentName)
+            if layout is None:
+                if len(self._layouts) >= self.MAX_LAYOUTS:
+                    self._layouts.clear()
+                layout = self._layouts.setdefault(parentName , {})
+            names = layout.get((attrName , hide))
+            if names is not None:
+                return names
+            strippedName = StripParentName(attrName , parentName)
+            if MakeName(strippedName) is not None:
+                names = (_Intern(strippedName) , _Intern(MakeFieldName(strippedName , None , None , None , None , hide)))
+                layout[(attrName , hide)] = names
+                return names
+        else:
+            strippedName = attrName
+        if show is not None:
+            prefix = show.split(':')[0]
+            name = self._textNames.get((prefix , hide))
+            if name is not None:
+                return strippedName , name
+            if MakeName(prefix) is not None:
+                if len(self._textNames) >= self.MAX_TEXT_NAMES:
+                    self._textNames.clear()
+                name = _Intern(MakeFieldName(None , prefix , None , None , None , hide))
+                self._textNames[(prefix , hide)] = name
+                return strippedName , name
+        return strippedName , MakeFieldName(strippedName , show , showname , pos , size , hide)
+
+    def GetAttributesNames(self , attributesNames):
+        '''
+        return a tuple of the given attributes names, shared by all the fields with the same attributes.
+        '''
+        attributesNames = tuple(attributesNames)
+        shared = self._attributesNames.get(attributesNames)
+        if shared is None:
+            shared = self._attributesNames.setdefault(attributesNames , tuple(map(_Intern , attributesNames)))
+        return shared
+
+# names of fields, shared by all the packets in the process
+FIELD_NAMES = FieldNamesCache()
+
+def AddSubFields(obj , xmlObjWithFields, fields_type=None, lazy=False):
     '''
     iterate over xml object with fields, and add each one of them to the object.
     return list of fields names that were added
@@ -208,7 +306,7 @@ def AddSubFields(obj , xmlObjWithFields, fields_type=None):
         if getattr(xmlObjWithFields , 'field' , False) != False:
             # there are some sub fields
             for subFieldXml in xmlObjWithFields.field:
-                theField = LayerField(subFieldXml , obj._name, fields_type)
+                theField = LayerField(subFieldXml , obj._name, fields_type, lazy)
                 subFieldName = theField._name
                 occurIndex = AddSubField(obj, subFieldName , theField)
                 subFieldsNames.append((subFieldName , occurIndex))
@@ -220,6 +318,27 @@ def AddSubFields(obj , xmlObjWithFields, fields_type=None):
             # print xmlObjWithFields.proto[0].attrib
     return subFieldsNames
 
+def MaterializeSubFields(obj):
+    '''
+    create the sub fields of a layer\field that was created in lazy mode.
+    does nothing if they were already created.
+    '''
+    xmlObjWithFields = obj.__dict__.get('_xml')
+    if xmlObjWithFields is not None:
+        # must be cleared first - AddSubField checks which attributes already exist
+        obj._xml = None
+        obj._subFieldsNames = AddSubFields(obj , xmlObjWithFields, obj._fields_type, lazy=True)
+
+def GetLazyAttribute(obj , attrName):
+    '''
+    return attribute of a layer\field which is missing because its sub fields were not created yet.
+    raise AttributeError if the sub fields were already created.
+    '''
+    if attrName.startswith('__') or obj.__dict__.get('_xml') is None:
+        raise AttributeError(attrName)
+    MaterializeSubFields(obj)
+    return obj.__getattribute__(attrName)
+
 def AddSubField(obj , subFieldName , subFieldVal):
     '''
     add sub field to an object, where theField._name will be its name.
@@ -267,7 +386,7 @@ class Layer(object):
     """
     _DATA_LAYER = 'data'
 
-    def __init__(self, xml_proto_obj=None, raw_mode=False, fields_type=None):
+    def __init__(self, xml_proto_obj=None, raw_mode=False, fields_type=None, lazy=False):
         self._raw_mode = raw_mode
         
         # extract attributes of protocol
@@ -276,10 +395,20 @@ class Layer(object):
             self.__setattr__( '_attr_' + attrName, attrVal)
         self._name = self.layer_name
         # extract subfields. notice some may have the same name or no name
-        self._subFieldsNames = AddSubFields(self , xml_proto_obj, fields_type)
+        # in lazy mode, they are extracted only when first accessed
+        if lazy:
+            self._xml = xml_proto_obj
+            self._fields_type = fields_type
+        else:
+            self._subFieldsNames = AddSubFields(self , xml_proto_obj, fields_type)
+
+    def __getattr__(self , attrName):
+        ''' called only for missing attributes - create the sub fields in lazy mode '''
+        return GetLazyAttribute(self , attrName)
 
     def TryGetAttribute(self , attrName):
         ''' for internal usage '''
+        MaterializeSubFields(self)
         if self.__dict__.has_key(attrName):
             return self.__getattribute__(attrName)
         else:
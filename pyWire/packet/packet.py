@@ -3,6 +3,7 @@ import os
 
 from pyWire.packet import consts
 from pyWire.packet.layer import Layer
+from pyWire.packet.compact import BuildCompactTree
 
 class Packet(object):
     """
@@ -10,15 +11,26 @@ class Packet(object):
     Layers can be accessed via index or name.
     """
  
-    def __init__(self, xml_pkt_obj, fields_type=None):
+    def __init__(self, xml_pkt_obj, fields_type=None, lazy=False, compact=False, tree=None):
         """
         Creates a Packet object with the given layers and info.
 
         :param xml_pkt_obj: An xml object which contains the packet data.
+        :param lazy: Keep the xml of each layer, and create its fields only when they are first accessed.
+        :param compact: Keep all layers and fields in a CompactTree, which use much less memory.
+        :param tree: CompactTree of the packet, instead of xml_pkt_obj (eg: built from tshark JSON).
         """
         # create layer for each protocol
-        layers = [Layer(proto, fields_type=fields_type) for proto in xml_pkt_obj.proto]
-        geninfo, frame, layers = layers[0], layers[1], layers[2:]
+        if tree is not None:
+            layers = tree.GetLayers()
+        elif compact:
+            layers = BuildCompactTree(xml_pkt_obj, fields_type).GetLayers()
+        else:
+            layers = [Layer(proto, fields_type=fields_type, lazy=lazy) for proto in xml_pkt_obj.proto]
+        # geninfo is always first, frame is missing when tshark outputs only some layers (see Capture layers)
+        geninfo, frame, layers = layers[0], None, layers[1:]
+        if layers and layers[0].layer_name == 'frame':
+            frame, layers = layers[0], layers[1:]
         # frame.raw_mode = True
         
         if layers is None:
@@ -27,27 +39,71 @@ class Packet(object):
             self.layers = layers
         self.geninfo = geninfo
         self.frame = frame
-        self.interface_captured = frame.TryGetAttribute('interface_id')
+        self.interface_captured = None
+        if frame is not None:
+            self.interface_captured = frame.TryGetAttribute('interface_id')
         if self.interface_captured is not None:
             self.interface_captured = self.interface_captured.val_
         self.captured_length = geninfo.caplen.val_
         self.length = geninfo.len.val_
         self.sniff_timestamp = geninfo.timestamp._attr_value
+        # number of the frame in the capture source (may differ from geninfo.num when only part of it is read)
+        self.frame_number = int(geninfo.num.val_)
         self.hasRaw = False
-        
+        self._IndexLayers()
+
+    def _IndexLayers(self):
+        '''
+        build the index of the layers by name (every name to its layers, lower first), and the
+        transport and highest layers, so they are not searched on every access.
+        '''
+        self._layersByName = {}
+        for layer in self.layers:
+            self._layersByName.setdefault(layer.layer_name, []).append(layer)
+        self._highest_layer = self.layers[-1].layer_name.upper() if self.layers else None
+        self._transport_layer = None
+        for layer_name in consts.TRANSPORT_LAYERS:
+            if layer_name.lower() in self._layersByName:
+                self._transport_layer = layer_name
+                break
+
     def __getitem__(self, item):
         """
         Gets a layer according to its index or its name
 
-        :param item: layer index or name
+        :param item: layer index, name, or (name, occurrence) - eg: pkt['ip', 1] is the inner ip layer of
+        a tunneled packet (see GetLayer).
         :return: Layer object.
         """
         if isinstance(item, int):
             return self.layers[item]
-        for layer in self.layers:
-            if layer.layer_name == item.lower():
-                return layer
-        raise KeyError('Layer does not exist in packet')
+        if isinstance(item, tuple):
+            return self.GetLayer(*item)
+        return self.GetLayer(item)
+
+    def GetLayer(self, name, occurrence=0):
+        '''
+        return the layer of the given name (case insensitive).
+        occurrence - which of the layers of this name, when there are several (eg: tunneled ip) - 0 is the
+        lowest (outer), 1 the next one, and -1 the highest (inner).
+        raise KeyError if there is no such layer.
+        '''
+        layers = self._layersByName.get(name)
+        if layers is None:
+            layers = self._layersByName.get(name.lower())
+        try:
+            return layers[occurrence]
+        except (TypeError, IndexError):
+            raise KeyError('Layer does not exist in packet')
+
+    def GetLayers(self, name):
+        '''
+        return list of all the layers of the given name (case insensitive), lower first.
+        '''
+        layers = self._layersByName.get(name)
+        if layers is None:
+            layers = self._layersByName.get(name.lower(), [])
+        return list(layers)
 
     def __contains__(self, item):
         """
@@ -55,6 +111,8 @@ class Packet(object):
 
         :param item: name of the layer
         """
+        if isinstance(item, basestring):
+            return item in self._layersByName or item.lower() in self._layersByName
         try:
             self[item]
             return True
@@ -129,16 +187,14 @@ class Packet(object):
         '''
             return the highest layer in the packet.
         '''
-        return self.layers[-1].layer_name.upper()
+        return self._highest_layer
 
     @property
     def transport_layer(self):
         '''
             return the transport layer in the packet.
         '''
-        for layer in consts.TRANSPORT_LAYERS:
-            if layer in self:
-                return layer
+        return self._transport_layer
                 
 def TabString(theStr):
     theStr = '\t' + theStr.replace('\n' , '\n\t')
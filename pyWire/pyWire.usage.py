@@ -90,6 +90,7 @@ pkt = myList[0]
 pkt.layers          # list of layers object, from lower layer to top
 pkt['UDP']          # will return the lowest layer with this name (if tunneled)
 pkt[3]              # will return the 4th layer
+pkt['IP' , -1]      # will return the highest (inner) layer with this name
 pkt.transport_layer # the name of the transport layer of the packet
 pkt.highest_layer   # the name of the top layer parsed
 pkt.sniff_time      # datetime object, of when the packet was captured
@@ -127,7 +128,7 @@ nbnsLayer.Queries.WPAD_00_  # access to nested subfield, may contain more nestin
  This mode is great, as you can access each layer and field raw bytes.
  This mode also allows you to save packets into new pcap File, which mean you can
  write very complex Filtering script with more flexibility compared to display filter.
-  NOTE: due to tshark limitation, using display filter isn't supported while getting raw bytes. 
+  The raw bytes are looked up by frame number, so they are available when using display filter as well.
 '''
 # to get the whole packet raw bytes
 pkt.GetRaw()
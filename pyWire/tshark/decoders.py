@@ -0,0 +1,107 @@
+"""
+Decoders of the tshark output - each one selects the output format of tshark, parses it and builds the packets.
+A capture uses the PDML decoder unless another one is given (see Capture decoder).
+"""
+from distutils.version import LooseVersion
+
+from pyWire.tshark.tshark import get_tshark_version
+from pyWire.tshark.tshark_xml import PdmlStreamParser, packet_from_xml_element
+from pyWire.tshark.tshark_json import JsonStreamParser, packet_from_json_packet, get_json_packet_number
+
+class PacketDecoder(object):
+    '''
+    Interface of a decoder of tshark output.
+    '''
+    name = None
+    # layers which the decoder needs, even when the capture outputs only some layers
+    REQUIRED_LAYERS = ()
+
+    def GetParameters(self):
+        '''
+        return the tshark parameters of the output format.
+        '''
+        raise NotImplementedError()
+
+    def CreateParser(self):
+        '''
+        return a new parser of the output stream, with feed(data) and close() methods which return lists
+        of the packets items that were completed.
+        '''
+        raise NotImplementedError()
+
+    def MakePacket(self, item, fields_type=None, lazy=False, compact=False):
+        '''
+        return Packet of an item of the parser.
+        '''
+        raise NotImplementedError()
+
+    def GetFrameNumber(self, item):
+        '''
+        return the tshark frame number of an item of the parser, without creating a packet.
+        '''
+        raise NotImplementedError()
+
+    def __repr__(self):
+        return '<%s>' % self.__class__.__name__
+
+class PdmlDecoder(PacketDecoder):
+    '''
+    tshark -T pdml, parsed by lxml (the default).
+    '''
+    name = 'pdml'
+
+    def GetParameters(self):
+        return ['-T', 'pdml']
+
+    def CreateParser(self):
+        return PdmlStreamParser()
+
+    def MakePacket(self, item, fields_type=None, lazy=False, compact=False):
+        return packet_from_xml_element(item, fields_type, lazy, compact)
+
+    def GetFrameNumber(self, item):
+        for field in item.proto[0].iterchildren('field'):
+            if field.get('name') == 'num':
+                return int(field.get('show'))
+        return None
+
+class JsonDecoder(PacketDecoder):
+    '''
+    tshark -T json (tshark 2.2 or newer), parsed by the json module - faster than PDML.
+    The packets are always compact (lazy is ignored), and their fields have no value, pos and size attributes
+    (so values are not converted by parse_types, and GetRaw works only for the whole packet).
+    '''
+    name = 'json'
+    REQUIRED_LAYERS = ('frame',)
+
+    def GetParameters(self):
+        if LooseVersion(get_tshark_version()) < LooseVersion("2.2.0"):
+            raise ValueError('The json decoder requires tshark 2.2 or newer')
+        return ['-T', 'json']
+
+    def CreateParser(self):
+        return JsonStreamParser()
+
+    def MakePacket(self, item, fields_type=None, lazy=False, compact=False):
+        return packet_from_json_packet(item, fields_type)
+
+    def GetFrameNumber(self, item):
+        return get_json_packet_number(item)
+
+DECODERS = {
+    PdmlDecoder.name: PdmlDecoder,
+    JsonDecoder.name: JsonDecoder,
+}
+
+def get_decoder(decoder=None):
+    '''
+    Return decoder object of the given decoder name ('pdml' or 'json'), or the given decoder object.
+    The default is PDML.
+    '''
+    if decoder is None:
+        return PdmlDecoder()
+    if isinstance(decoder, PacketDecoder):
+        return decoder
+    if decoder not in DECODERS:
+        raise ValueError('Unknown decoder %s, the decoders are: %s' % (decoder, ', '.join(sorted(DECODERS))))
+    return DECODERS[decoder]()
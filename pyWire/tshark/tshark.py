@@ -31,8 +31,17 @@ def get_tshark_path():
     raise TSharkNotFoundException('TShark not found in the following locations: ' + ', '.join(possible_paths) +
                                   ' Either place tshark there or add more paths to this file.')
 
+# tshark version of each tshark path, so tshark is executed only once per process
+_tshark_versions = {}
+
 def get_tshark_version():
-    parameters = [get_tshark_path(), '-v']
+    tshark_path = get_tshark_path()
+    if tshark_path not in _tshark_versions:
+        _tshark_versions[tshark_path] = _run_tshark_version(tshark_path)
+    return _tshark_versions[tshark_path]
+
+def _run_tshark_version(tshark_path):
+    parameters = [tshark_path, '-v']
     
     # this one works only in 2.7
     # version_output = subprocess.check_output(parameters).decode("ascii")
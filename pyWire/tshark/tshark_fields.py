@@ -0,0 +1,121 @@
+"""
+This module turns the output of tshark -T fields into records (see Capture.apply_on_packets fields).
+"""
+import re
+from collections import namedtuple
+
+from pyWire.tshark.tshark_types import TSHARK_SHOW_TYPES, string_converter, show_int_converter, float_converter
+
+# separators of the printed values, which do not appear in the values themselves
+FIELDS_SEPARATOR = '\x1e'
+OCCURRENCES_SEPARATOR = '\x1f'
+
+# printed before the requested fields of every packet, and their names in the record
+RECORD_FIELDS = ('frame.number', 'frame.time_epoch')
+RECORD_NAMES = ('frame_number', 'timestamp')
+
+def get_fields_parameters(fields):
+    '''
+    Return the tshark parameters which print the given fields of each packet, as FieldsStreamParser expects.
+    All the occurrences of a field are printed (eg: ip.src of tunneled packets).
+    '''
+    params = ['-T', 'fields',
+              '-E', 'separator=' + FIELDS_SEPARATOR,
+              '-E', 'aggregator=' + OCCURRENCES_SEPARATOR,
+              '-E', 'occurrence=a']
+    for field_name in RECORD_FIELDS + tuple(fields):
+        params += ['-e', field_name]
+    return params
+
+def record_field_name(field_name):
+    '''
+    Return the attribute name of a field in the records (eg: ip.src -> ip_src).
+    '''
+    return re.sub(r'\W', '_', field_name)
+
+_record_classes = {}
+
+def get_record_class(fields):
+    '''
+    Return the record class of the given fields - a namedtuple of frame_number, timestamp and the fields
+    (named by record_field_name). Names which are not valid attributes are replaced by their position (eg: _3).
+    '''
+    fields = tuple(fields)
+    record_class = _record_classes.get(fields)
+    if record_class is None:
+        names = RECORD_NAMES + tuple(record_field_name(field_name) for field_name in fields)
+        record_class = namedtuple('FieldsRecord', names, rename=True)
+        record_class.tshark_fields = fields
+        record_class.__reduce__ = _reduce_record
+        record_class = _record_classes.setdefault(fields, record_class)
+    return record_class
+
+def _reduce_record(record):
+    # the record classes are created at runtime, so records are pickled by their fields (eg: to worker processes)
+    return (_make_record, (record.tshark_fields, tuple(record)))
+
+def _make_record(fields, values):
+    return get_record_class(fields)._make(values)
+
+def get_show_converter(fields_type, field_name):
+    '''
+    Return the converter of the printed value of the given field, by its tshark type.
+    Without fields_type (see get_tshark_fields_type) the values are kept as strings.
+    '''
+    if fields_type is None:
+        return string_converter
+    return TSHARK_SHOW_TYPES.get(fields_type.get_type_name(field_name), string_converter)
+
+class FieldsStreamParser(object):
+    '''
+    Incremental parser for the output of tshark -T fields (see get_fields_parameters).
+    Data is fed in chunks of any size, and every record is returned as soon as its line was completed.
+
+    Each value is converted by the type of its field - a field which is missing in the packet is None,
+    and a field with several occurrences is a list.
+    '''
+    def __init__(self, fields, fields_type=None):
+        self._record_class = get_record_class(fields)
+        self._converters = [show_int_converter, float_converter] + \
+                           [get_show_converter(fields_type, field_name) for field_name in fields]
+        self._pending = ''
+
+    def feed(self, data):
+        '''
+        Feed another chunk of tshark output.
+        Return list of the records that were completed by this chunk.
+        '''
+        lines = (self._pending + data).split('\n')
+        self._pending = lines.pop()
+        return self._ParseLines(lines)
+
+    def close(self):
+        '''
+        Notify the parser that the stream ended.
+        Return list of the records that were still pending.
+        '''
+        lines = [self._pending]
+        self._pending = ''
+        return self._ParseLines(lines)
+
+    def _ParseLines(self, lines):
+        records = []
+        converters = self._converters
+        for line in lines:
+            values = line.rstrip('\r').split(FIELDS_SEPARATOR)
+            if len(values) != len(converters):
+                # empty, or cut when tshark was killed
+                continue
+            records.append(self._record_class._make(map(_convert_value, converters, values)))
+        return records
+
+def _convert_value(converter, value):
+    if value == '':
+        return None
+    if OCCURRENCES_SEPARATOR in value:
+        return [_convert_value(converter, occurrence) for occurrence in value.split(OCCURRENCES_SEPARATOR)]
+    try:
+        return converter(value)
+    except ValueError:
+        # printed as text by the field's dissector
+        return value
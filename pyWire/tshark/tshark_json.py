@@ -0,0 +1,212 @@
+"""
+This module contains functions to turn TShark JSON output (tshark -T json) into Packet objects.
+The packets are built directly as CompactTree (see pyWire.packet.compact), so they have the same interface as
+the packets of PDML.
+"""
+import json
+import re
+
+from pyWire.packet.packet import Packet
+from pyWire.packet.compact import CompactTreeBuilder, NO_VALUE
+
+# the fields of the frame layer which the geninfo layer of PDML is built from
+GENINFO_FIELDS = (('num', 'frame.number'), ('len', 'frame.len'), ('caplen', 'frame.cap_len'),
+                  ('timestamp', 'frame.time_epoch'))
+_TREE_SUFFIX = '_tree'
+# a string (the closing quote is missing if it was not read yet), or a brace
+_JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*(")?|[{}]')
+_SEPARATORS = '[],\r\n\t '
+
+def packet_from_json_packet(json_pkt, fields_type=None):
+    '''
+    Return Packet of a packet parsed by JsonStreamParser.
+    '''
+    return Packet(None, tree=tree_from_json_packet(json_pkt, fields_type))
+
+def tree_from_json_packet(json_pkt, fields_type=None):
+    '''
+    Return CompactTree of a packet parsed by JsonStreamParser (list of (key, value) pairs).
+    The fields have the show attribute only (JSON has no value, pos and size).
+    '''
+    layers = _GetPairsValue(_GetPairsValue(json_pkt, '_source'), 'layers') or []
+    builder = CompactTreeBuilder(fields_type)
+    frame = dict((layer_name, layer) for layer_name, layer in layers).get('frame') or []
+    _AddGeninfo(builder, dict(pair for pair in frame if not isinstance(pair[1], list)))
+    for layer_name, layer in layers:
+        index = builder.AddNode(NO_VALUE, {'name': layer_name})
+        if isinstance(layer, list):
+            _AddJsonFields(builder, index, layer)
+        builder.CloseNode(index)
+    return builder.Finish()
+
+def get_json_packet_number(json_pkt):
+    '''
+    Return the frame number of a packet parsed by JsonStreamParser, without creating a packet object.
+    '''
+    frame = _GetPairsValue(_GetPairsValue(_GetPairsValue(json_pkt, '_source'), 'layers'), 'frame')
+    number = _GetPairsValue(frame, 'frame.number')
+    if number is None:
+        return None
+    return int(number)
+
+def _GetPairsValue(pairs, key):
+    for pairKey, value in pairs or []:
+        if pairKey == key:
+            return value
+    return None
+
+def _AddGeninfo(builder, frameFields):
+    # PDML writes the packet info as the first layer
+    index = builder.AddNode(NO_VALUE, {'name': 'geninfo'})
+    for name, frame_field in GENINFO_FIELDS:
+        show = frameFields.get(frame_field)
+        if show is not None:
+            attributes = {'name': name, 'show': show}
+            if name == 'timestamp':
+                attributes['value'] = show
+            else:
+                attributes['value'] = '%x' % int(show)
+            builder.CloseNode(builder.AddNode(index, attributes))
+    builder.CloseNode(index)
+
+def _AddJsonFields(builder, parent, pairs):
+    '''
+    add the fields of a layer or a field - a subtree of field X is given after it as X_tree.
+    '''
+    lastName = lastIndex = None
+    for key, value in pairs:
+        if lastIndex is not None and key == lastName + _TREE_SUFFIX:
+            _AddJsonFields(builder, lastIndex, value)
+            builder.CloseNode(lastIndex)
+            lastName = lastIndex = None
+            continue
+        if lastIndex is not None:
+            builder.CloseNode(lastIndex)
+            lastName = lastIndex = None
+        # repeated fields are lists when tshark does not write duplicate keys
+        for occurrence in (value if isinstance(value, list) and value and not isinstance(value[0], tuple)
+                           else [value]):
+            if lastIndex is not None:
+                builder.CloseNode(lastIndex)
+            lastName, lastIndex = key, _AddJsonField(builder, parent, key, occurrence)
+    if lastIndex is not None:
+        builder.CloseNode(lastIndex)
+
+def _AddJsonField(builder, parent, key, value):
+    '''
+    add a field node, and the subtree of text items (which have no field name). return the node index.
+    '''
+    if ' ' in key or ':' in key:
+        # text item, the key is its label
+        index = builder.AddNode(parent, {'show': key, 'showname': key})
+    else:
+        attributes = {'name': key}
+        if isinstance(value, list):
+            # a field which has only subfields (eg: tcp.analysis), JSON has no label for it
+            attributes['show'] = ''
+            attributes['showname'] = key
+        else:
+            attributes['show'] = value
+            attributes['showname'] = '%s: %s' % (key, value)
+        index = builder.AddNode(parent, attributes)
+    if isinstance(value, list):
+        _AddJsonFields(builder, index, value)
+    return index
+
+class JsonStreamParser(object):
+    '''
+    Incremental parser for the JSON stream written by tshark -T json (an array of packet objects).
+    Data is fed in chunks of any size, and every packet is returned as soon as its object was completed,
+    as list of (key, value) pairs - objects keep their order and repeated keys.
+    Only the new data is scanned for the braces (outside strings) which end a packet, and each packet is
+    decoded once, when it was completed.
+    '''
+    def __init__(self):
+        self._decoder = json.JSONDecoder(object_pairs_hook=list)
+        self._buffer = ''
+        # start of the current packet in the buffer, or None between packets
+        self._start = None
+        # position in the buffer which was scanned up to, and the depth of the objects there
+        self._position = 0
+        self._depth = 0
+
+    def feed(self, data):
+        '''
+        Feed another chunk of JSON.
+        Return list of the packets that were completed by this chunk.
+        Raise ValueError if the data is not a JSON array of objects.
+        '''
+        buf = self._buffer = self._buffer + data
+        packets = []
+        while True:
+            if self._start is None:
+                position = self._SkipSeparators(buf, self._position)
+                if position == len(buf):
+                    break
+                if buf[position] != '{':
+                    raise ValueError('Invalid JSON packet at %r' % buf[position:position + 40])
+                self._start = self._position = position
+                self._depth = 0
+            end = self._ScanPacket(buf)
+            if end is None:
+                break
+            try:
+                json_pkt = self._decoder.decode(buf[self._start:end])
+            except ValueError as e:
+                raise ValueError('Invalid JSON packet: %s' % e)
+            packets.append(json_pkt)
+            self._start = None
+            self._position = end
+        # drop the data of the returned packets
+        offset = self._position if self._start is None else self._start
+        self._buffer = buf[offset:]
+        self._position -= offset
+        if self._start is not None:
+            self._start -= offset
+        return packets
+
+    def close(self):
+        '''
+        Notify the parser that the stream ended.
+        Return list of the packets that were still pending.
+        Raise ValueError if the stream ended in the middle of a packet, or with data which is not JSON.
+        '''
+        rest = self._buffer[self._position if self._start is None else self._start:]
+        self._buffer = ''
+        self._start = None
+        self._position = self._depth = 0
+        if rest.strip(_SEPARATORS):
+            raise ValueError('The JSON stream ended with incomplete data: %r' % rest[:40])
+        return []
+
+    def _ScanPacket(self, buf):
+        '''
+        scan the new data of the current packet.
+        return the end of the packet, or None if it was not completed yet.
+        '''
+        depth = self._depth
+        position = self._position
+        for match in _JSON_TOKEN.finditer(buf, position):
+            token = match.group()
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+                if depth == 0:
+                    return match.end()
+            elif match.group(1) is None:
+                # the string is not completed yet, it is scanned again from its start
+                break
+            position = match.end()
+        else:
+            position = len(buf)
+        self._depth = depth
+        self._position = position
+        return None
+
+    @staticmethod
+    def _SkipSeparators(buf, position):
+        ''' skip the array brackets, commas and white space between the packets '''
+        while position < len(buf) and buf[position] in _SEPARATORS:
+            position += 1
+        return position
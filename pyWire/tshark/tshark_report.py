@@ -2,11 +2,40 @@
 This module parses generated Tshark reports
 """
 
+import hashlib
+import marshal
+import os
+import struct
 import subprocess
-from pyWire.tshark.tshark import get_tshark_path
+import tempfile
+import threading
+from pyWire.tshark.tshark import get_tshark_path, get_tshark_version
 from pyWire.tshark.tshark_types import TSHARK_TYPES, int_converter, date_converter, string_converter
 
+# fields which are not reported by tshark -G fields (geninfo layer)
+SPECIAL_FIELDS_TYPE = {
+    "num":          int_converter,
+    "len":          int_converter,
+    "caplen":       int_converter,
+    "timestamp":    date_converter,
+    "data":         string_converter,
+}
+
 def parse_tshark_fields():
+    '''
+    Run tshark -G fields, and return dict of field name to its type converter.
+    Slow - it takes a few seconds. see get_tshark_fields_type for the cached version.
+    '''
+    fields_type = {}
+    for field_name, field_type in _run_tshark_fields():
+        fields_type[field_name] = TSHARK_TYPES.get(field_type, string_converter)
+    fields_type.update(SPECIAL_FIELDS_TYPE)
+    return fields_type
+
+def _run_tshark_fields():
+    '''
+    Run tshark -G fields, and return list of tuples (field name, tshark type name).
+    '''
     parameters = [get_tshark_path(), '-G', 'fields']
 
     tshark_process = subprocess.Popen(parameters,
@@ -17,25 +46,198 @@ def parse_tshark_fields():
         raise Exception(
             'TShark seems to have crashed. Try updating it. (command ran: "%s")' % ' '.join(parameters))
 
-    fields_type = {}
-
-    while True:
-        field_line = tshark_process.stdout.readline()
-        if field_line == '':
-            break
-
+    fields = []
+    for field_line in tshark_process.communicate()[0].splitlines():
         # parsing according to https://www.wireshark.org/docs/man-pages/tshark.html
 
         if not field_line.startswith('F\t'):
             continue
 
-        fields = field_line.split('\t')
-        fields_type[fields[2]] = TSHARK_TYPES[fields[3]]
+        field_info = field_line.split('\t')
+        fields.append((field_info[2], field_info[3]))
+    return fields
 
-    fields_type["num"] = int_converter
-    fields_type["len"] = int_converter
-    fields_type["caplen"] = int_converter
-    fields_type["timestamp"] = date_converter
-    fields_type["data"] = string_converter
+class FieldsTypeCache(object):
+    '''
+    Mapping of field name to its type converter, loaded from the on disk cache.
+    The converters of each protocol are loaded only when a field of this protocol is first looked up.
+    Fields which are unknown to tshark are converted as strings.
 
-    return fields_type
+    The cache file holds a header (see _WriteCacheFile), followed by a marshaled dict of
+    field name to type index for each protocol.
+    '''
+    def __init__(self, cache_data, protocols_offset, protocols_index, type_names):
+        self._cache_data = cache_data
+        self._protocols_offset = protocols_offset
+        self._protocols_index = protocols_index
+        self._type_names = type_names
+        self._converters = [TSHARK_TYPES.get(type_name, string_converter) for type_name in type_names]
+        self._protocols = {}
+        self._protocols_types = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, field_name):
+        converter = self.get(field_name)
+        if converter is None:
+            return string_converter
+        return converter
+
+    def __contains__(self, field_name):
+        return self.get(field_name) is not None
+
+    def get(self, field_name, default=None):
+        if field_name in SPECIAL_FIELDS_TYPE:
+            return SPECIAL_FIELDS_TYPE[field_name]
+        protocol = field_name.split('.', 1)[0]
+        protocol_fields = self._protocols.get(protocol)
+        if protocol_fields is None:
+            protocol_fields = self.LoadProtocol(protocol)
+        return protocol_fields.get(field_name, default)
+
+    def LoadProtocol(self, protocol):
+        '''
+        load the converters of all fields of the given protocol, and return dict of field name to converter.
+        '''
+        with self._lock:
+            if protocol not in self._protocols:
+                protocol_fields = {}
+                types_index = {}
+                if protocol in self._protocols_index:
+                    offset, length = self._protocols_index[protocol]
+                    offset += self._protocols_offset
+                    types_index = marshal.loads(self._cache_data[offset:offset + length])
+                    for field_name, type_index in types_index.iteritems():
+                        protocol_fields[field_name] = self._converters[type_index]
+                self._protocols_types[protocol] = types_index
+                self._protocols[protocol] = protocol_fields
+        return self._protocols[protocol]
+
+    def get_type_name(self, field_name):
+        '''
+        return the tshark type name of the given field (eg: FT_UINT16), or None if it is unknown to tshark.
+        '''
+        protocol = field_name.split('.', 1)[0]
+        if protocol not in self._protocols:
+            self.LoadProtocol(protocol)
+        type_index = self._protocols_types[protocol].get(field_name)
+        if type_index is None:
+            return None
+        return self._type_names[type_index]
+
+    def GetLoadedProtocols(self):
+        '''
+        return list of protocols which converters were loaded.
+        '''
+        return self._protocols.keys()
+
+    def __reduce__(self):
+        # pickled by reference - the loading process uses its own cache (eg: packets sent to worker processes)
+        return (get_tshark_fields_type, ())
+
+# changed whenever the format of the cache file changes
+_CACHE_FORMAT_VERSION = 1
+_CACHE_HEADER_LENGTH = struct.Struct('<I')
+_fields_type_caches = {}
+_fields_type_caches_lock = threading.Lock()
+
+def get_tshark_fields_type(cache_dir=None):
+    '''
+    Return FieldsTypeCache of the current tshark.
+    The fields types are built only once per tshark binary (by path, version and modification time), and
+    saved in a cache file in cache_dir (default ~/.pyWire, or PYWIRE_CACHE_DIR if set).
+    The same object is returned for all the captures in the process.
+    '''
+    tshark_path = get_tshark_path()
+    tshark_stat = os.stat(tshark_path)
+    cache_key = (os.path.abspath(tshark_path), get_tshark_version(), int(tshark_stat.st_mtime), tshark_stat.st_size)
+
+    with _fields_type_caches_lock:
+        if cache_key not in _fields_type_caches:
+            _fields_type_caches[cache_key] = _LoadFieldsTypeCache(cache_key, cache_dir)
+        return _fields_type_caches[cache_key]
+
+def _GetCacheDir(cache_dir):
+    if cache_dir is None:
+        cache_dir = os.environ.get('PYWIRE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.pyWire'))
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            cache_dir = tempfile.gettempdir()
+    return cache_dir
+
+def _LoadFieldsTypeCache(cache_key, cache_dir):
+    cache_path = os.path.join(_GetCacheDir(cache_dir),
+                              'tshark_fields_%s.cache' % hashlib.sha1(repr(cache_key)).hexdigest())
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            cache = _ParseCacheData(cache_file.read(), cache_key)
+    except IOError:
+        cache = None
+    if cache is None:
+        cache_data = _BuildCacheData(cache_key, _run_tshark_fields())
+        _WriteCacheFile(cache_path, cache_data)
+        cache = _ParseCacheData(cache_data, cache_key)
+    return cache
+
+def _ParseCacheData(cache_data, cache_key):
+    '''
+    return FieldsTypeCache of the given cache file content, or None if it is invalid or of another tshark.
+    '''
+    try:
+        header_length, = _CACHE_HEADER_LENGTH.unpack_from(cache_data)
+        header_end = _CACHE_HEADER_LENGTH.size + header_length
+        format_version, file_key, protocols_index, type_names = \
+            marshal.loads(cache_data[_CACHE_HEADER_LENGTH.size:header_end])
+    except (EOFError, ValueError, TypeError, struct.error):
+        return None
+    if format_version != _CACHE_FORMAT_VERSION or file_key != cache_key:
+        return None
+    return FieldsTypeCache(cache_data, header_end, protocols_index, type_names)
+
+def _BuildCacheData(cache_key, fields):
+    '''
+    return the cache file content for the given fields types (list of tuples (field name, tshark type name)).
+    '''
+    type_names = []
+    type_indices = {}
+    protocols = {}
+    for field_name, type_name in fields:
+        if type_name not in type_indices:
+            type_indices[type_name] = len(type_names)
+            type_names.append(type_name)
+        protocol = field_name.split('.', 1)[0]
+        protocols.setdefault(protocol, {})[field_name] = type_indices[type_name]
+
+    # offsets of the protocols are relative to the end of the header
+    blobs = []
+    protocols_index = {}
+    offset = 0
+    for protocol, types_index in protocols.iteritems():
+        blob = marshal.dumps(types_index)
+        protocols_index[protocol] = (offset, len(blob))
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = marshal.dumps((_CACHE_FORMAT_VERSION, cache_key, protocols_index, type_names))
+    return _CACHE_HEADER_LENGTH.pack(len(header)) + header + ''.join(blobs)
+
+def _WriteCacheFile(cache_path, cache_data):
+    '''
+    write the cache file. failing to write it is not an error, the cache will be built again next time.
+    '''
+    # write to temporary file first, so other processes never read a partial cache
+    try:
+        tmp_fd, tmp_path = tempfile.mkstemp(prefix='tshark_fields_', dir=os.path.dirname(cache_path))
+        with os.fdopen(tmp_fd, 'wb') as cache_file:
+            cache_file.write(cache_data)
+    except (IOError, OSError):
+        return
+    try:
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        # another process wrote it meanwhile
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
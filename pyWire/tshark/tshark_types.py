@@ -67,4 +67,28 @@ TSHARK_TYPES = {
     "FT_SYSTEM_ID":		string_converter,
     "FT_STRINGZPAD":	string_converter,
     "FT_FCWWN":			string_converter,
-}
\ No newline at end of file
+}
+
+# tshark -T fields prints the displayed values, not the hex values of PDML
+def show_int_converter(val):
+    # integers are printed in their display base (eg: flags in hex)
+    if val.startswith('0x'):
+        return int(val, base=16)
+    return int(val)
+
+
+def show_bool_converter(val):
+    return val not in ('0', 'False', '')
+
+
+_SHOW_CONVERTERS = {
+    int_converter:      show_int_converter,
+    bool_converter:     show_bool_converter,
+    # absolute times are printed as text (eg: "Jan  1, 2016 10:00:00.000000000 UTC")
+    date_converter:     string_converter,
+}
+
+TSHARK_SHOW_TYPES = dict((type_name, _SHOW_CONVERTERS.get(converter, converter))
+                         for type_name, converter in TSHARK_TYPES.iteritems())
+TSHARK_SHOW_TYPES["FT_RELATIVE_TIME"] = float_converter
+TSHARK_SHOW_TYPES["FT_FRAMENUM"] = show_int_converter
@@ -2,6 +2,7 @@
 This module contains functions to turn TShark XML parts into Packet objects.
 """
 # might be able to use xml.etree.cElementTree instead
+import lxml.etree
 import lxml.objectify
 
 from pyWire.packet.packet import Packet
@@ -10,3 +11,51 @@ def packet_from_xml_packet(xml_pkt, fields_type):
     #return xml_pkt
     xml_pkt_obj = lxml.objectify.fromstring(xml_pkt)
     return Packet(xml_pkt_obj, fields_type=fields_type)
+
+def packet_from_xml_element(xml_pkt_obj, fields_type, lazy=False, compact=False):
+    '''
+    Same as packet_from_xml_packet, for a packet element that was already parsed.
+    '''
+    return Packet(xml_pkt_obj, fields_type=fields_type, lazy=lazy, compact=compact)
+
+class PdmlStreamParser(object):
+    '''
+    Incremental parser for the PDML stream written by tshark.
+    Data is fed in chunks of any size (they do not have to end on a tag boundary),
+    and every <packet> element is returned as soon as its closing tag was parsed.
+    '''
+    def __init__(self):
+        self._parser = lxml.etree.XMLPullParser(events = ('end',) , tag = 'packet' ,
+                                                remove_blank_text = True)
+        # build objectify elements, as lxml.objectify.fromstring would
+        self._parser.set_element_class_lookup(lxml.objectify.ObjectifyElementClassLookup())
+
+    def feed(self , data):
+        '''
+        Feed another chunk of PDML.
+        Return list of the packet elements that were completed by this chunk.
+        '''
+        self._parser.feed(data)
+        return self._ReadPackets()
+
+    def close(self):
+        '''
+        Notify the parser that the stream ended.
+        Return list of the packet elements that were still pending.
+        '''
+        try:
+            self._parser.close()
+        except lxml.etree.XMLSyntaxError:
+            # tshark was killed in the middle of the document
+            pass
+        return self._ReadPackets()
+
+    def _ReadPackets(self):
+        packets = []
+        for event, xml_pkt_obj in self._parser.read_events():
+            # detach the packet from the <pdml> root, so the document does not grow
+            parent = xml_pkt_obj.getparent()
+            if parent is not None:
+                parent.remove(xml_pkt_obj)
+            packets.append(xml_pkt_obj)
+        return packets
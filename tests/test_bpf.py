@@ -0,0 +1,171 @@
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+
+from pyWire.capture.bpf import BpfFilter, BpfFilterError, FilterFrames
+from pyWire.capture.fileformats.PcapFile import PcapFile
+from pyWire.capture.fileformats.PcapIndex import FrameSelection
+
+LINKTYPE_ETHERNET = 1
+
+def Ethernet(etherType):
+    return b'\x00\x11\x22\x33\x44\x55' + b'\xaa\xbb\xcc\xdd\xee\xff' + struct.pack('>H' , etherType)
+
+def IPv4(src , dst , proto , payload , fragment = 0):
+    return struct.pack('>BBHHHBBH4s4s' , 0x45 , 0 , 20 + len(payload) , 0 , fragment , 64 , proto , 0 ,
+                       socket.inet_aton(src) , socket.inet_aton(dst)) + payload
+
+def IPv6(src , dst , nextHeader , payload):
+    return struct.pack('>IHBB16s16s' , 6 << 28 , len(payload) , nextHeader , 64 ,
+                       socket.inet_pton(socket.AF_INET6 , src) , socket.inet_pton(socket.AF_INET6 , dst)) + payload
+
+def Ports(srcPort , dstPort):
+    return struct.pack('>HH' , srcPort , dstPort) + b'\x00' * 16
+
+def Arp(senderIP , targetIP):
+    return struct.pack('>HHBBH6s4s6s4s' , 1 , 0x800 , 6 , 4 , 1 , b'\x00' * 6 , socket.inet_aton(senderIP) ,
+                       b'\x00' * 6 , socket.inet_aton(targetIP))
+
+# frame number -> frame
+FRAMES = [None ,
+          Ethernet(0x800) + IPv4('10.0.0.1' , '8.8.8.8' , 17 , Ports(5555 , 53)) ,                       # 1 dns query
+          Ethernet(0x800) + IPv4('10.0.0.2' , '1.1.1.1' , 6 , Ports(40000 , 80)) ,                       # 2 http
+          Ethernet(0x86dd) + IPv6('2001:db8::1' , '2001:db8::2' , 17 , Ports(53 , 1234)) ,               # 3 ipv6 dns reply
+          Ethernet(0x806) + Arp('10.0.0.1' , '10.0.0.9') ,                                               # 4 arp
+          Ethernet(0x800) + IPv4('10.0.0.1' , '8.8.8.8' , 17 , Ports(53 , 53) , fragment = 5) ,          # 5 ipv4 fragment
+          # 6 ipv6 first fragment of tcp, behind a fragment header
+          Ethernet(0x86dd) + IPv6('::1' , '::2' , 44 , struct.pack('>BBHI' , 6 , 0 , 0 , 0) + Ports(22 , 53)) ,
+          # 7 ipv6 tcp behind hop-by-hop options
+          Ethernet(0x86dd) + IPv6('::1' , '::2' , 0 , struct.pack('>BB6s' , 6 , 0 , b'\x00' * 6) + Ports(22 , 80)) ,
+          Ethernet(0x800) + IPv4('10.0.0.2' , '1.1.1.1' , 1 , b'\x08\x00' + b'\x00' * 600)]             # 8 big icmp
+
+class BpfFilterTest(unittest.TestCase):
+    def _Matching(self , expression):
+        bpfFilter = BpfFilter(expression)
+        return [frameNumber for frameNumber in range(1 , len(FRAMES))
+                if bpfFilter.Match(FRAMES[frameNumber] , LINKTYPE_ETHERNET)]
+
+    def _AssertMatching(self , cases):
+        for expression , frameNumbers in cases:
+            self.assertEqual(self._Matching(expression) , frameNumbers , expression)
+
+    def test_primitives(self):
+        self._AssertMatching([('' , [1 , 2 , 3 , 4 , 5 , 6 , 7 , 8]) ,
+                              ('ip' , [1 , 2 , 5 , 8]) ,
+                              ('ip6' , [3 , 6 , 7]) ,
+                              ('arp' , [4]) ,
+                              ('icmp' , [8]) ,
+                              ('udp' , [1 , 3 , 5]) ,
+                              ('tcp' , [2 , 6 , 7]) ,
+                              ('port 53' , [1 , 3 , 6]) ,
+                              ('udp port 53' , [1 , 3]) ,
+                              ('src port 53' , [3]) ,
+                              ('dst port 53' , [1 , 6]) ,
+                              ('port domain' , [1 , 3 , 6]) ,
+                              ('portrange 50-60' , [1 , 3 , 6]) ,
+                              ('host 10.0.0.1' , [1 , 4 , 5]) ,
+                              ('ip host 10.0.0.1' , [1 , 5]) ,
+                              ('dst host 1.1.1.1' , [2 , 8]) ,
+                              ('host 2001:db8::2' , [3]) ,
+                              ('ether src aa:bb:cc:dd:ee:ff' , [1 , 2 , 3 , 4 , 5 , 6 , 7 , 8]) ,
+                              ('ether host 00:00:00:00:00:01' , []) ,
+                              ('proto 17' , [1 , 3 , 5]) ,
+                              ('ip proto \\tcp' , [2]) ,
+                              ('ip6 proto 6' , [6 , 7])])
+
+    def test_inherited_qualifiers(self):
+        self._AssertMatching([('port 53 or 80' , [1 , 2 , 3 , 6 , 7]) ,
+                              ('tcp port 53 or 80' , [2 , 6 , 7]) ,
+                              ('src 10.0.0.2 and (port 80 or 443)' , [2]) ,
+                              ('host 8.8.8.8 or 1.1.1.1' , [1 , 2 , 5 , 8]) ,
+                              ('port 80 or not 53' , [2 , 4 , 5 , 7 , 8])])
+
+    def test_not_precedence(self):
+        self._AssertMatching([('not tcp and udp' , [1 , 3 , 5]) ,
+                              ('!tcp and udp' , [1 , 3 , 5]) ,
+                              ('not (tcp or udp)' , [4 , 8]) ,
+                              ('not port 53' , [2 , 4 , 5 , 7 , 8]) ,
+                              ('!port 53' , [2 , 4 , 5 , 7 , 8]) ,
+                              ('(tcp or udp) and !port 53' , [2 , 5 , 7]) ,
+                              ('udp and not src host 10.0.0.1' , [3]) ,
+                              ('not not arp' , [4])])
+
+    def test_and_or_left_to_right(self):
+        # as in libpcap, and and or have the same precedence
+        self._AssertMatching([('arp or icmp and ip' , [8]) ,
+                              ('icmp and ip or arp' , [4 , 8]) ,
+                              ('arp or (icmp and ip)' , [4 , 8]) ,
+                              ('arp || icmp && ip' , [8])])
+
+    def test_ipv4_fragments(self):
+        # ports are only in the first fragment
+        self._AssertMatching([('udp' , [1 , 3 , 5]) ,
+                              ('port 53 and ip' , [1]) ,
+                              ('host 8.8.8.8 and udp' , [1 , 5])])
+
+    def test_ipv6_extension_headers(self):
+        self._AssertMatching([('tcp port 22' , [6 , 7]) ,
+                              ('ip6 and dst port 80' , [7]) ,
+                              ('ip6 and dst port 53' , [6])])
+
+    def test_length(self):
+        self._AssertMatching([('greater 500' , [8]) ,
+                              ('less 100 and tcp' , [2 , 6 , 7]) ,
+                              ('less 60' , [1 , 2 , 4 , 5]) ,
+                              ('less 54' , [1 , 2 , 4 , 5]) ,
+                              ('less 53' , [4])])
+        self.assertTrue(BpfFilter('greater 1000').Match(FRAMES[1] , LINKTYPE_ETHERNET , length = 1500))
+
+    def test_net_masks(self):
+        self._AssertMatching([('net 10.0.0.0/24' , [1 , 2 , 4 , 5 , 8]) ,
+                              ('net 10.0' , [1 , 2 , 4 , 5 , 8]) ,
+                              ('src net 10.0.0.0 mask 255.255.255.254' , [1 , 4 , 5]) ,
+                              ('ip src net 10.0.0.0 mask 255.255.255.254' , [1 , 5]) ,
+                              ('dst net 2001:db8::/32' , [3]) ,
+                              ('net ::/120' , [6 , 7])])
+
+    def test_unsupported(self):
+        for expression in ('vlan' , 'vlan and tcp' , 'port 53 or vlan' , 'tcp[13] & 2 != 0' , 'host example.com' ,
+                           'port 53 and host example.com' , 'mpls' , 'broadcast'):
+            self.assertRaises(BpfFilterError , BpfFilter , expression)
+
+    def test_invalid(self):
+        for expression in ('port' , '(port 53' , 'port 53)' , 'ip host 2001::1' , 'icmp port 1' ,
+                           'net 10.0.0.0/40' , 'port 53 and' , 'portrange 60-50' ,
+                           'net 10.0.0.0 mask 255.0' , 'net 2001:db8:: mask 255.255.0.0'):
+            self.assertRaises(BpfFilterError , BpfFilter , expression)
+
+class FilterFramesTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _Write(self , name , pcapng):
+        path = os.path.join(self._dir , name)
+        pcapFile = PcapFile(path , pcapng = pcapng)
+        if pcapng:
+            pcapFile.AddInterface(LINKTYPE_ETHERNET)
+        for frameNumber in range(1 , len(FRAMES)):
+            pcapFile._WritePacket(FRAMES[frameNumber] , 1500000000 + frameNumber , 0)
+        pcapFile.Close()
+        return path
+
+    def test_filter_selection(self):
+        path = self._Write('frames.pcap' , False)
+        filtered = FilterFrames(path , FrameSelection([(1 , len(FRAMES) - 1)]) , BpfFilter('port 53'))
+        self.assertEqual(list(filtered.IterateFrames()) , [1 , 3 , 6])
+        filtered = FilterFrames(path , FrameSelection([(2 , 5)]) , BpfFilter('port 53'))
+        self.assertEqual(list(filtered.IterateFrames()) , [3])
+
+    def test_pcapng_rejected(self):
+        path = self._Write('frames.pcapng' , True)
+        self.assertRaises(ValueError , FilterFrames , path , FrameSelection([(1 , len(FRAMES) - 1)]) ,
+                          BpfFilter('port 53'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from pyWire.capture import capture
+from pyWire.capture.inmem_capture import InMemCapture
+
+class LayersParametersTest(unittest.TestCase):
+    def setUp(self):
+        self._get_tshark_version = capture.get_tshark_version
+        self._capture = InMemCapture([] , layers = ['ip' , 'udp'])
+        self._capture._packet_count = None
+        self._capture._timeout = None
+
+    def tearDown(self):
+        capture.get_tshark_version = self._get_tshark_version
+
+    def _SetTSharkVersion(self , version):
+        capture.get_tshark_version = lambda: version
+
+    def test_layers(self):
+        self._SetTSharkVersion('2.6.10')
+        parameters = self._capture.get_parameters()
+        self.assertEqual(parameters[parameters.index('-J') + 1] , 'ip udp')
+
+    def test_old_tshark(self):
+        self._SetTSharkVersion('2.0.16')
+        self.assertRaises(ValueError , self._capture.get_parameters)
+
+    def test_fields(self):
+        self._SetTSharkVersion('2.6.10')
+        self._capture.fields = ('ip.src' ,)
+        self.assertRaises(ValueError , self._capture.get_parameters)
+
+    def test_no_layers(self):
+        self._SetTSharkVersion('2.0.16')
+        self._capture.layers = None
+        self.assertFalse('-J' in self._capture.get_parameters())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import socket
+import struct
+import unittest
+
+from pyWire.capture import tshark_worker
+from pyWire.capture.inmem_capture import InMemCapture
+from pyWire.capture.callbacks import Callback
+from pyWire.packet.field_path import compile_path
+from pyWire.tshark.tshark import get_tshark_path, TSharkNotFoundException
+
+def _Checksum(data):
+    if len(data) % 2:
+        data += '\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) / 2) , data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def _TcpPacket(seq , payload , srcPort = 40000 , dstPort = 80):
+    src = socket.inet_aton('10.0.0.1')
+    dst = socket.inet_aton('10.0.0.2')
+    tcp = struct.pack('!HHIIBBHHH' , srcPort , dstPort , seq , 1 , 5 << 4 , 0x18 , 8192 , 0 , 0) + payload
+    pseudo = src + dst + struct.pack('!BBH' , 0 , 6 , len(tcp))
+    tcp = tcp[:16] + struct.pack('!H' , _Checksum(pseudo + tcp)) + tcp[18:]
+    ip = struct.pack('!BBHHHBBH4s4s' , 0x45 , 0 , 20 + len(tcp) , 1 , 0 , 64 , 6 , 0 , src , dst)
+    ip = ip[:10] + struct.pack('!H' , _Checksum(ip)) + ip[12:]
+    ether = '\x02\x00\x00\x00\x00\x02' + '\x02\x00\x00\x00\x00\x01' + '\x08\x00'
+    return ether + ip + tcp
+
+def _HasTShark():
+    try:
+        get_tshark_path()
+        return True
+    except TSharkNotFoundException:
+        return False
+
+@unittest.skipUnless(_HasTShark() , 'tshark is not installed')
+class InMemCaptureTest(unittest.TestCase):
+    # the second packet is a retransmission of the first
+    BATCH = [_TcpPacket(1000 , 'GET / HTTP/1.0\r\n\r\n') , _TcpPacket(1000 , 'GET / HTTP/1.0\r\n\r\n') ,
+             _TcpPacket(1018 , 'x' * 10)]
+    STATE_FIELDS = compile_path('frame.number' , 'tcp.stream' , 'tcp.seq' , 'tcp.analysis.retransmission')
+
+    def _Dissect(self , packets , **kwargs):
+        cap = InMemCapture(packets , **kwargs)
+        dissected = []
+        cap.apply_on_packets(Callback.CB_AddPacketToList , args = dissected)
+        return [self.STATE_FIELDS(pkt) for pkt in dissected]
+
+    def test_same_batch_twice(self):
+        first = self._Dissect(self.BATCH , shared_state = False)
+        second = self._Dissect(self.BATCH , shared_state = False)
+        self.assertEqual(first , second)
+        self.assertEqual(len(first) , 3)
+        self.assertFalse(first[0][3])
+        self.assertTrue(first[1][3])
+
+    def test_shared_state(self):
+        self._Dissect(self.BATCH)
+        second = self._Dissect(self.BATCH)
+        # the packets continue the stream of the first batch, so they are all retransmissions
+        self.assertTrue(second[0][3])
+
+    def test_packet_count_with_display_filter(self):
+        cap = InMemCapture(self.BATCH , display_filter = 'tcp.analysis.retransmission')
+        dissected = []
+        cap.apply_on_packets(Callback.CB_AddPacketToList , packet_count = 1 , args = dissected)
+        self.assertEqual([pkt.frame_number for pkt in dissected] , [2])
+
+class _FakeWorker(object):
+    def __init__(self , *args):
+        self.closed = False
+
+    def Close(self):
+        self.closed = True
+
+class WorkersRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self._worker = tshark_worker.TSharkWorker
+        self._maxWorkers = tshark_worker.MAX_WORKERS
+        tshark_worker.TSharkWorker = _FakeWorker
+        tshark_worker.MAX_WORKERS = 2
+        tshark_worker._workers.clear()
+
+    def tearDown(self):
+        tshark_worker.TSharkWorker = self._worker
+        tshark_worker.MAX_WORKERS = self._maxWorkers
+        tshark_worker._workers.clear()
+
+    def test_same_options_same_worker(self):
+        self.assertIs(tshark_worker.GetTSharkWorker('udp') , tshark_worker.GetTSharkWorker('udp'))
+        self.assertIsNot(tshark_worker.GetTSharkWorker('udp') , tshark_worker.GetTSharkWorker('tcp'))
+
+    def test_least_recently_used_evicted(self):
+        udp = tshark_worker.GetTSharkWorker('udp')
+        tcp = tshark_worker.GetTSharkWorker('tcp')
+        tshark_worker.GetTSharkWorker('udp')
+        dns = tshark_worker.GetTSharkWorker('dns')
+        self.assertTrue(tcp.closed)
+        self.assertFalse(udp.closed)
+        self.assertFalse(dns.closed)
+        self.assertEqual(len(tshark_worker._workers) , 2)
+        # an evicted worker is created again
+        newTcp = tshark_worker.GetTSharkWorker('tcp')
+        self.assertIsNot(newTcp , tcp)
+        self.assertTrue(udp.closed)
+
+if __name__ == '__main__':
+    unittest.main()
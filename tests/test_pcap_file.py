@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from pyWire.capture.fileformats.PcapFile import PcapFile
+from pyWire.capture.raw_store import FileRawStore, StreamRawStore
+from pyWire.capture.ring_buffer import RingBuffer
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+
+# (data , seconds , microseconds , interface id)
+PACKETS = [(b'\x01' * 60 , 1500000000 , 1 , 0) ,
+           (b'\x45' + b'\x02' * 39 , 1500000000 , 999999 , 1) ,
+           (b'\x03' * 1514 , 1500000001 , 500000 , 0) ,
+           (b'\x45' + b'\x04' * 21 , 1500000002 , 0 , 1) ,
+           (b'\x05' * 61 , 1500000003 , 123456 , 0)]
+
+def WritePcapng(path , packets = PACKETS):
+    pcapFile = PcapFile(path , pcapng = True)
+    pcapFile.AddInterface(LINKTYPE_ETHERNET , name = b'eth0')
+    pcapFile.AddInterface(LINKTYPE_RAW , name = b'tun0')
+    for data , sec , microSec , interfaceId in packets:
+        pcapFile._WritePacket(data , sec , microSec , interfaceId)
+    pcapFile.Close()
+
+class PcapngTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir , 'two_interfaces.pcapng')
+        WritePcapng(self._path)
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _AssertPacket(self , rawPacket , expected , withData = True):
+        data , sec , microSec , interfaceId = expected
+        if withData:
+            self.assertEqual(rawPacket.raw , data)
+        self.assertEqual(rawPacket.lenData , len(data))
+        self.assertEqual((rawPacket.captureTimestampSec , rawPacket.captureTimestampMicrosec) , (sec , microSec))
+        self.assertEqual(rawPacket.interfaceId , interfaceId)
+        self.assertEqual(rawPacket.linkType , LINKTYPE_RAW if interfaceId else LINKTYPE_ETHERNET)
+
+    def test_round_trip(self):
+        rawPackets = list(PcapFile(self._path).ReadPackets())
+        self.assertEqual(len(rawPackets) , len(PACKETS))
+        for rawPacket , expected in zip(rawPackets , PACKETS):
+            self._AssertPacket(rawPacket , expected)
+
+    def test_read_headers(self):
+        rawPackets = list(PcapFile(self._path).ReadPacketHeaders())
+        self.assertEqual(len(rawPackets) , len(PACKETS))
+        for rawPacket , expected in zip(rawPackets , PACKETS):
+            self._AssertPacket(rawPacket , expected , withData = False)
+
+    def test_random_access_on_fresh_file(self):
+        offsets = [rawPacket.offset for rawPacket in PcapFile(self._path).ReadPackets()]
+        for mapped in (False , True):
+            # last packet first, so nothing was read sequentially before it
+            for packetIndex in reversed(range(len(PACKETS))):
+                pcapFile = PcapFile(self._path)
+                if mapped:
+                    pcapFile.Map()
+                self._AssertPacket(pcapFile.ReadPacketAt(offsets[packetIndex]) , PACKETS[packetIndex])
+                self._AssertPacket(pcapFile.ReadPacketHeaderAt(offsets[packetIndex]) , PACKETS[packetIndex] ,
+                                   withData = False)
+                pcapFile.Close()
+
+    def test_file_raw_store(self):
+        rawStore = FileRawStore(self._path)
+        self.assertEqual(rawStore.GetRawPacket(4) , PACKETS[3][0])
+        self.assertEqual(rawStore.GetRawPacket(2) , PACKETS[1][0])
+        self.assertEqual(rawStore.GetRawPacket(len(PACKETS) + 1) , None)
+        rawStore.Close()
+
+    def test_multi_interface_stream(self):
+        # dumpcap writes pcapng to the ring buffer when capturing from several interfaces
+        ringBuffer = RingBuffer(memoryLimit = 256)
+        with open(self._path , 'rb') as pcapngFile:
+            data = pcapngFile.read()
+        def Write():
+            for position in range(0 , len(data) , 100):
+                ringBuffer.write(data[position:position + 100])
+            ringBuffer.EndOfWrite()
+        writeThread = threading.Thread(target = Write)
+        writeThread.start()
+        rawStore = StreamRawStore(PcapFile(ringBuffer))
+        for frameNumber , expected in enumerate(PACKETS , 1):
+            self.assertEqual(rawStore.GetRawPacket(frameNumber) , expected[0])
+        self.assertEqual(rawStore.GetRawPacket(len(PACKETS) + 1) , None)
+        writeThread.join()
+        ringBuffer.close()
+
+@unittest.skipUnless(os.environ.get('PYWIRE_TEST_INTERFACES') , 'set PYWIRE_TEST_INTERFACES to two interfaces, eg: lo,eth0')
+class MultiInterfaceLiveCaptureTest(unittest.TestCase):
+    def test_capture(self):
+        from pyWire.capture.live_capture import LiveCapture
+        interfaces = os.environ['PYWIRE_TEST_INTERFACES'].split(',')
+        for parallel in (False , True):
+            capture = LiveCapture(interfaces , parallel_interfaces = parallel)
+            packets = []
+            capture.apply_on_packets(lambda packet , args: packets.append(packet) , timeout = 5)
+            for packet in packets:
+                self.assertIn(int(packet.interface_captured) , range(len(interfaces)))
+                self.assertTrue(packet.GetRaw())
+
+if __name__ == '__main__':
+    unittest.main()
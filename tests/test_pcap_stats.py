@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyWire.capture.fileformats import PcapStats
+from pyWire.capture.fileformats.PcapFile import PcapFile
+from pyWire.capture.fileformats.PcapIndex import PcapIndex
+
+@unittest.skipIf(PcapStats.np is None , 'NumPy is not installed')
+class ScanPcapHeadersTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir , 'packets.pcap')
+        pcapFile = PcapFile(self._path)
+        for packetNumber in range(3):
+            pcapFile._WritePacket(b'\x00' * (60 + packetNumber) , 1500000000 + packetNumber , 1000)
+        pcapFile.Close()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_no_index_written_by_default(self):
+        headers = PcapStats.ScanPcapHeaders(self._path)
+        self.assertEqual(list(headers['incl_len']) , [60 , 61 , 62])
+        self.assertEqual(list(headers['ts_sec']) , [1500000000 , 1500000001 , 1500000002])
+        self.assertEqual(os.listdir(self._dir) , ['packets.pcap'])
+
+    def test_save_index(self):
+        PcapStats.ScanPcapHeaders(self._path , save_index = True)
+        self.assertTrue(os.path.exists(self._path + PcapIndex.INDEX_SUFFIX))
+
+if __name__ == '__main__':
+    unittest.main()
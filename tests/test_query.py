@@ -0,0 +1,125 @@
+import unittest
+
+from pyWire.capture.query import Field, Protocol, DisplayFilter, PythonPredicate, And, Or, Not, \
+    MakePredicate
+
+def IsBig(packet):
+    return len(packet) > 100
+
+class DisplayFilterStringTest(unittest.TestCase):
+    def test_field_and_protocol(self):
+        self.assertEqual(Field('ip.src').GetDisplayFilter() , 'ip.src')
+        self.assertEqual(Protocol('DNS').GetDisplayFilter() , 'dns')
+
+    def test_comparison(self):
+        cases = [(Field('udp.port') == 53 , 'udp.port == 53') ,
+                 (Field('ip.src') == '10.0.0.1' , 'ip.src == 10.0.0.1') ,
+                 (Field('ipv6.dst') == '2001:db8::1' , 'ipv6.dst == 2001:db8::1') ,
+                 (Field('eth.src') == 'aa:bb:cc:dd:ee:ff' , 'eth.src == aa:bb:cc:dd:ee:ff') ,
+                 (Field('ip.src') == '10.0.0.0/8' , 'ip.src == 10.0.0.0/8') ,
+                 (Field('http.host') == 'example.com' , 'http.host == "example.com"') ,
+                 (Field('http.host') == 'a "b" \\c' , 'http.host == "a \\"b\\" \\\\c"') ,
+                 (Field('frame.len') < 100 , 'frame.len < 100') ,
+                 (Field('frame.len') <= 100 , 'frame.len <= 100') ,
+                 (Field('frame.len') > 100 , 'frame.len > 100') ,
+                 (Field('frame.len') >= 100 , 'frame.len >= 100') ,
+                 (Field('frame.time_delta') > 0.5 , 'frame.time_delta > 0.5') ,
+                 (Field('tcp.flags.syn') == True , 'tcp.flags.syn == 1') ,
+                 (Field('tcp.flags.syn') == False , 'tcp.flags.syn == 0') ,
+                 (Field('dns.qry.name').Contains('example') , 'dns.qry.name contains "example"') ,
+                 (Field('dns.qry.name').Contains('123') , 'dns.qry.name contains "123"') ,
+                 (Field('http.host').Matches('^www\\.') , 'http.host matches "^www\\\\."')]
+        for predicate , displayFilter in cases:
+            self.assertEqual(predicate.GetDisplayFilter() , displayFilter)
+
+    def test_not_equal(self):
+        predicate = Field('udp.port') != 53
+        self.assertTrue(isinstance(predicate , Not))
+        self.assertEqual(predicate.GetDisplayFilter() , '!(udp.port == 53)')
+
+    def test_and(self):
+        predicate = (Field('udp.port') == 53) & Protocol('dns') & Field('dns.qry.name')
+        # flattened
+        self.assertEqual(len(predicate.predicates) , 3)
+        self.assertEqual(predicate.GetDisplayFilter() , '(udp.port == 53) && (dns) && (dns.qry.name)')
+
+    def test_or(self):
+        predicate = (Field('ip.src') == '10.0.0.1') | (Field('ip.dst') == '10.0.0.1')
+        self.assertEqual(predicate.GetDisplayFilter() , '(ip.src == 10.0.0.1) || (ip.dst == 10.0.0.1)')
+
+    def test_not(self):
+        self.assertEqual((~Protocol('arp')).GetDisplayFilter() , '!(arp)')
+        predicate = ~(Protocol('arp') | Protocol('icmp'))
+        self.assertEqual(predicate.GetDisplayFilter() , '!((arp) || (icmp))')
+        predicate = Protocol('ip') & ~(Protocol('tcp') | (Field('udp.port') == 53))
+        self.assertEqual(predicate.GetDisplayFilter() , '(ip) && (!((tcp) || (udp.port == 53)))')
+
+    def test_python_predicate(self):
+        self.assertEqual(PythonPredicate(IsBig).GetDisplayFilter() , None)
+        self.assertEqual((Protocol('ip') & IsBig).GetDisplayFilter() , None)
+        self.assertEqual((Protocol('ip') | IsBig).GetDisplayFilter() , None)
+        self.assertEqual((~PythonPredicate(IsBig)).GetDisplayFilter() , None)
+
+class SplitTest(unittest.TestCase):
+    def test_display_filter_only(self):
+        predicate = (Field('udp.port') == 53) & Protocol('dns')
+        self.assertEqual(predicate.Split() , ('(udp.port == 53) && (dns)' , None))
+        self.assertEqual(Protocol('dns').Split() , ('dns' , None))
+
+    def test_python_only(self):
+        predicate = PythonPredicate(IsBig)
+        self.assertEqual(predicate.Split() , (None , predicate))
+
+    def test_and_splits(self):
+        predicate = MakePredicate(IsBig) & (Field('udp.port') == 53) & Protocol('dns')
+        displayFilter , remainder = predicate.Split()
+        self.assertEqual(displayFilter , '(udp.port == 53) && (dns)')
+        self.assertTrue(isinstance(remainder , PythonPredicate))
+        self.assertEqual(remainder.function , IsBig)
+
+    def test_and_several_remainders(self):
+        isSmall = lambda packet: len(packet) < 1000
+        predicate = Protocol('dns') & IsBig & isSmall
+        displayFilter , remainder = predicate.Split()
+        self.assertEqual(displayFilter , 'dns')
+        self.assertTrue(isinstance(remainder , And))
+        self.assertEqual([part.function for part in remainder.predicates] , [IsBig , isSmall])
+
+    def test_or_with_python_not_split(self):
+        predicate = Protocol('dns') | IsBig
+        self.assertEqual(predicate.Split() , (None , predicate))
+
+    def test_not_over_or_with_python_not_split(self):
+        predicate = Protocol('ip') & ~(Protocol('tcp') | IsBig)
+        displayFilter , remainder = predicate.Split()
+        self.assertEqual(displayFilter , 'ip')
+        self.assertTrue(isinstance(remainder , Not))
+        self.assertTrue(isinstance(remainder.predicate , Or))
+
+    def test_display_filter_string(self):
+        predicate = MakePredicate('tcp.port == 80') & IsBig
+        displayFilter , remainder = predicate.Split()
+        self.assertEqual(displayFilter , 'tcp.port == 80')
+        self.assertTrue(remainder.CanMatch())
+        self.assertFalse(DisplayFilter('tcp').CanMatch())
+        self.assertFalse((DisplayFilter('tcp') | IsBig).CanMatch())
+        self.assertFalse((~DisplayFilter('tcp')).CanMatch())
+        self.assertRaises(ValueError , DisplayFilter('tcp').Match , None)
+
+    def test_make_predicate(self):
+        self.assertTrue(isinstance(MakePredicate('tcp') , DisplayFilter))
+        self.assertTrue(isinstance(MakePredicate(IsBig) , PythonPredicate))
+        field = Field('ip.src')
+        self.assertTrue(MakePredicate(field) is field)
+        self.assertRaises(TypeError , MakePredicate , 53)
+
+class MatchTest(unittest.TestCase):
+    def test_python_predicates(self):
+        predicate = MakePredicate(IsBig) & (lambda packet: packet[0] == 'a')
+        self.assertTrue(predicate.Match('a' * 200))
+        self.assertFalse(predicate.Match('b' * 200))
+        self.assertFalse(predicate.Match('a'))
+        self.assertTrue((~MakePredicate(IsBig) | IsBig).Match('a'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import struct
+import unittest
+
+from pyWire.capture.ring_buffer import RingBuffer
+
+CHUNK_SIZE = 1000
+
+def Chunk(chunkNumber):
+    return struct.pack('>I' , chunkNumber) * (CHUNK_SIZE // 4)
+
+class RingBufferTest(unittest.TestCase):
+    def _SpillFileSize(self , ringBuffer):
+        if ringBuffer._spillFile is None:
+            return 0
+        ringBuffer._spillFile.flush()
+        return os.fstat(ringBuffer._spillFile.fileno()).st_size
+
+    def test_in_memory(self):
+        ringBuffer = RingBuffer(memoryLimit = 10 * CHUNK_SIZE)
+        for chunkNumber in range(5):
+            ringBuffer.write(Chunk(chunkNumber))
+        self.assertEqual(len(ringBuffer) , 5 * CHUNK_SIZE)
+        self.assertEqual(ringBuffer.GetSpilledSize() , 0)
+        for chunkNumber in range(5):
+            self.assertEqual(ringBuffer.read(CHUNK_SIZE) , Chunk(chunkNumber))
+        ringBuffer.close()
+
+    def test_end_of_write(self):
+        ringBuffer = RingBuffer(memoryLimit = CHUNK_SIZE)
+        ringBuffer.write(Chunk(0))
+        ringBuffer.write(Chunk(1))
+        ringBuffer.EndOfWrite()
+        self.assertEqual(ringBuffer.read(3 * CHUNK_SIZE) , Chunk(0) + Chunk(1))
+        self.assertEqual(len(ringBuffer.read(CHUNK_SIZE)) , 0)
+        ringBuffer.close()
+
+    def test_spill_limit(self):
+        ringBuffer = RingBuffer(memoryLimit = CHUNK_SIZE , spillLimit = 2 * CHUNK_SIZE)
+        for chunkNumber in range(3):
+            ringBuffer.write(Chunk(chunkNumber))
+        self.assertRaises(Exception , ringBuffer.write , Chunk(3))
+        ringBuffer.close()
+
+    def test_reader_never_catches_up(self):
+        # the reader stays 20 chunks behind the writer, so the spill file is never fully read
+        compactSize = 10 * CHUNK_SIZE
+        ringBuffer = RingBuffer(memoryLimit = 2 * CHUNK_SIZE , spillCompactSize = compactSize)
+        backlog = 20
+        for chunkNumber in range(backlog):
+            ringBuffer.write(Chunk(chunkNumber))
+        maxSpillFileSize = 0
+        for chunkNumber in range(backlog , 1000):
+            ringBuffer.write(Chunk(chunkNumber))
+            self.assertEqual(ringBuffer.read(CHUNK_SIZE) , Chunk(chunkNumber - backlog))
+            self.assertTrue(ringBuffer.GetSpilledSize() > 0)
+            maxSpillFileSize = max(maxSpillFileSize , self._SpillFileSize(ringBuffer))
+        # the read part is reclaimed once it reaches compactSize and the unread part
+        self.assertTrue(maxSpillFileSize <= 2 * (compactSize + backlog * CHUNK_SIZE))
+        for chunkNumber in range(1000 - backlog , 1000):
+            self.assertEqual(ringBuffer.read(CHUNK_SIZE) , Chunk(chunkNumber))
+        self.assertEqual(len(ringBuffer) , 0)
+        ringBuffer.close()
+
+if __name__ == '__main__':
+    unittest.main()